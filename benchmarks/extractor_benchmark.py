@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""Compares the fast extractor with the PyQuery based parser on the test fixtures.
+
+Run from the project root with: python -m benchmarks.extractor_benchmark
+"""
+import os
+import timeit
+
+import geizhals.core
+from geizhals.entities import EntityType
+
+project_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+fixtures_path = os.path.join(project_path, "geizhals", "tests")
+fixtures = [("test_product.html", EntityType.PRODUCT), ("test_wishlist.html", EntityType.WISHLIST)]
+
+
+def main(rounds=50):
+    print("{:<20} {:>12} {:>12} {:>9}".format("fixture", "pyquery [ms]", "fast [ms]", "speedup"))
+
+    for file_name, entity_type in fixtures:
+        with open(os.path.join(fixtures_path, file_name), "r", encoding="utf8") as f:
+            html_str = f.read()
+
+        fast = geizhals.core.parse_entity(html_str, entity_type, fast=True)
+        slow = geizhals.core.parse_entity(html_str, entity_type, fast=False)
+        if fast != slow:
+            raise AssertionError("Fast path returned {} but PyQuery returned {}!".format(fast, slow))
+
+        slow_time = timeit.timeit(lambda: geizhals.core.parse_entity(html_str, entity_type, fast=False), number=rounds) / rounds
+        fast_time = timeit.timeit(lambda: geizhals.core.parse_entity(html_str, entity_type, fast=True), number=rounds) / rounds
+
+        print("{:<20} {:>12.3f} {:>12.3f} {:>8.1f}x".format(file_name, slow_time * 1000, fast_time * 1000, slow_time / fast_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Measures how the throughput of the PyQuery parser scales with the number of parse worker processes.
+
+The pages are handed to the parsers by fetch threads, the same way the FetchEngine does it. Without a parse pool the
+threads compete for the GIL, with a pool the parsing runs in separate processes.
+
+Run from the project root with: python -m benchmarks.parse_pool_benchmark
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import geizhals.core
+from geizhals.entities import EntityType
+from geizhals.util import ParsePool
+
+project_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+fixtures_path = os.path.join(project_path, "geizhals", "tests")
+fixtures = [("test_product.html", EntityType.PRODUCT), ("test_wishlist.html", EntityType.WISHLIST)]
+
+
+def _parse_all(pages, parse_func, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(lambda page: parse_func(*page), pages))
+    return len(pages) / (time.perf_counter() - start)
+
+
+def main(page_count=400, threads=8):
+    pages = []
+    for file_name, entity_type in fixtures:
+        with open(os.path.join(fixtures_path, file_name), "rb") as f:
+            pages.append((f.read(), entity_type))
+    pages = [pages[i % len(pages)] for i in range(page_count)]
+
+    print("{} pages, {} fetch threads, {} cpu cores".format(page_count, threads, os.cpu_count()))
+    print("{:<20} {:>12} {:>9}".format("parse workers", "pages/s", "speedup"))
+
+    baseline = _parse_all(pages, lambda html_str, entity_type: geizhals.core.parse_entity(html_str, entity_type, fast=False), threads)
+    print("{:<20} {:>12.1f} {:>8.1f}x".format("none (threads)", baseline, 1.0))
+
+    workers = 1
+    while workers <= (os.cpu_count() or 1):
+        pool = ParsePool(workers)
+        try:
+            throughput = _parse_all(pages, lambda html_str, entity_type: pool.run(geizhals.core.parse_entity, html_str, entity_type, False), threads)
+        finally:
+            pool.shutdown()
+
+        print("{:<20} {:>12.1f} {:>8.1f}x".format(workers, throughput, throughput / baseline))
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,19 @@
 """Core file for the business logic to interact with the backend"""
 # -*- coding: utf-8 -*-
 
-import re
+from datetime import datetime
 
+from bot.scheduler import EntityStats
+from database.batch_writer import BatchWriter
 from database.db_wrapper import DBwrapper
-from geizhals.entities import EntityType, Product, Wishlist
+from geizhals.canonical import canonicalize
+from geizhals.entities import EntityType
 from util.exceptions import AlreadySubscribedException, WishlistNotFoundException, ProductNotFoundException, \
     InvalidURLException
 
+# (last_changed, since, change count) of the entities with subscribers, see get_entities_check_stats
+_change_counts = {}
+
 
 def add_user_if_new(user):
     """Save a user to the database, if the user is not already stored"""
@@ -62,19 +68,17 @@ def is_user_wishlist_subscriber(user, wishlist):
 def subscribe_entity(user, entity):
     """Subscribe to an entity as a user"""
     db = DBwrapper.get_instance()
+    # The unique index on the subscriptions makes the insert fail, if the user already subscribed
     if entity.TYPE == EntityType.WISHLIST:
-        if not db.is_user_wishlist_subscriber(user.user_id, entity.entity_id):
-            db.subscribe_wishlist(entity.entity_id, user.user_id)
-        else:
-            raise AlreadySubscribedException
+        subscribed = db.subscribe_wishlist(entity.entity_id, user.user_id)
     elif entity.TYPE == EntityType.PRODUCT:
-        if not db.is_user_product_subscriber(user.user_id, entity.entity_id):
-            db.subscribe_product(entity.entity_id, user.user_id)
-        else:
-            raise AlreadySubscribedException
+        subscribed = db.subscribe_product(entity.entity_id, user.user_id)
     else:
         raise ValueError("Unknown EntityType")
 
+    if not subscribed:
+        raise AlreadySubscribedException
+
 
 def unsubscribe_entity(user, entity):
     db = DBwrapper.get_instance()
@@ -108,6 +112,119 @@ def get_all_entities_with_subscribers():
     return entities
 
 
+def get_entity_key(entity):
+    """Returns the key which identifies an entity in the scheduler"""
+    return entity.TYPE, entity.entity_id
+
+
+def get_entities_check_stats(volatility_window, refresh_interval=3600):
+    """Returns a dict mapping the keys of all entities with subscribers to (entity, EntityStats).
+    The volatility is the number of price changes per day within the last volatility_window seconds. Counting the changes
+    reads the price history, so the counts are cached and only recounted for entities whose price changed since - or
+    after refresh_interval seconds, when older changes have left the window."""
+    global _change_counts
+    db = DBwrapper.get_instance()
+    since = int(datetime.utcnow().timestamp()) - volatility_window
+    days = volatility_window / 86400
+
+    check_stats = db.get_wishlist_check_stats() + db.get_product_check_stats()
+    stale_ids = {EntityType.WISHLIST: [], EntityType.PRODUCT: []}
+    for entity, _, last_changed, _ in check_stats:
+        cached = _change_counts.get(get_entity_key(entity))
+        if cached is None or cached[0] != last_changed or since - cached[1] >= refresh_interval:
+            stale_ids[entity.TYPE].append(entity.entity_id)
+
+    recounted = {}
+    for entity_type, entity_ids in stale_ids.items():
+        if entity_ids:
+            for entity_id, change_count in db.get_price_change_counts(entity_type, entity_ids, since).items():
+                recounted[(entity_type, entity_id)] = change_count
+
+    change_counts = {}
+    entity_stats = {}
+    for entity, last_checked, last_changed, subscribers in check_stats:
+        key = get_entity_key(entity)
+        if key in recounted:
+            change_counts[key] = (last_changed, since, recounted[key])
+        else:
+            change_counts[key] = _change_counts[key]
+
+        volatility = change_counts[key][2] / days
+        entity_stats[key] = (entity, EntityStats(last_checked=last_checked, last_changed=last_changed,
+                                                 subscribers=subscribers, volatility=volatility))
+
+    # Entities without subscribers are dropped from the cache
+    _change_counts = change_counts
+    return entity_stats
+
+
+def claim_entities(worker_id, entity_stats, lease_time):
+    """Claim the entities for a sweep worker. entity_stats maps entity keys to the EntityStats read before.
+    Entities held by another worker or checked in the meantime are not claimed. Returns the claimed keys."""
+    db = DBwrapper.get_instance()
+    entities = [(entity_type, entity_id, stats.last_checked) for (entity_type, entity_id), stats in entity_stats.items()]
+    return db.claim_leases(worker_id, entities, lease_time)
+
+
+def release_entities(worker_id, keys):
+    """Release the entities claimed by a sweep worker"""
+    db = DBwrapper.get_instance()
+    db.release_leases(worker_id, keys)
+
+
+def get_batch_writer():
+    """Returns a BatchWriter which stores the results of a sweep in batches"""
+    return BatchWriter(DBwrapper.get_instance())
+
+
+def start_sweep(worker_id, keys):
+    """Persist the entities of a new sweep and return the sweep id"""
+    db = DBwrapper.get_instance()
+    return db.start_sweep(worker_id, keys)
+
+
+def finish_sweep(sweep_id):
+    db = DBwrapper.get_instance()
+    db.finish_sweep(sweep_id)
+
+
+def resume_sweeps(worker_id, max_age):
+    """Returns the keys of the entities which were not processed by interrupted sweeps and closes those sweeps.
+    Sweeps of other workers are only taken over when they are older than max_age seconds, the others might still run."""
+    db = DBwrapper.get_instance()
+    started_before = int(datetime.utcnow().timestamp()) - max_age
+    keys = []
+    for sweep_id in db.get_unfinished_sweeps(worker_id, started_before):
+        keys.extend(key for key in db.get_unprocessed_sweep_entities(sweep_id) if key not in keys)
+        db.finish_sweep(sweep_id)
+
+    return keys
+
+
+def claim_pending_notifications(worker_id, claim_time):
+    """Claims the pending notifications which no other worker is sending for claim_time seconds.
+    Returns (notification_id, user_id, entity, old_price) tuples - the entity has the new price"""
+    db = DBwrapper.get_instance()
+    notifications = []
+    for notification_id, user_id, entity_type, entity_id, old_price, new_price in db.claim_pending_notifications(worker_id, claim_time):
+        try:
+            entity = get_entity(entity_id, entity_type)
+        except (WishlistNotFoundException, ProductNotFoundException):
+            # The entity was removed in the meantime
+            db.rm_pending_notification(notification_id)
+            continue
+
+        entity.price = new_price
+        notifications.append((notification_id, user_id, entity, old_price))
+
+    return notifications
+
+
+def rm_pending_notification(notification_id):
+    db = DBwrapper.get_instance()
+    db.rm_pending_notification(notification_id)
+
+
 def get_all_wishlists_with_subscribers():
     db = DBwrapper.get_instance()
     return db.get_all_subscribed_wishlists()
@@ -178,37 +295,63 @@ def get_user_by_id(user_id):
 
 
 def get_wl_url(text):
-    if re.match(Wishlist.url_pattern, text):
-        return text
-    else:
-        raise InvalidURLException
+    return get_e_url(text, EntityType.WISHLIST)
 
 
 def get_p_url(text):
-    if re.match(Product.url_pattern, text):
-        return text
-    else:
+    return get_e_url(text, EntityType.PRODUCT)
+
+
+def get_canonical_entity(text, entity_type=None):
+    """Returns the CanonicalEntity for the url in a text, optionally making sure that it's of the given type"""
+    entity = canonicalize(text)
+    if entity is None or (entity_type is not None and entity.entity_type != entity_type):
         raise InvalidURLException
 
+    return entity
+
 
 def get_e_url(text, entity_type):
+    """Returns the canonical url of the entity in a text"""
+    return get_canonical_entity(text, entity_type).url
+
+
+def get_type_by_url(text):
+    return get_canonical_entity(text).entity_type
+
+
+def get_entity_id(url, entity_type):
+    """Returns the id of an entity which is part of its url"""
+    return get_canonical_entity(url, entity_type).entity_id
+
+
+def get_region(url):
+    """Returns the region (de, at or eu) of an entity url or None if the url is invalid"""
+    entity = canonicalize(url)
+    return entity.region if entity is not None else None
+
+
+def get_fresh_entity(entity_id, entity_type, max_age):
+    """Returns the stored entity, if its price was checked within the last max_age seconds - otherwise None"""
+    db = DBwrapper.get_instance()
     if entity_type == EntityType.WISHLIST:
-        if re.match(Wishlist.url_pattern, text):
-            return text
+        last_update = db.get_wishlist_last_update(entity_id)
     elif entity_type == EntityType.PRODUCT:
-        if re.match(Product.url_pattern, text):
-            return text
+        last_update = db.get_product_last_update(entity_id)
+    else:
+        raise ValueError("Unknown EntityType")
 
-    raise InvalidURLException
+    if last_update is None:
+        return None
 
+    utc_timestamp_now = int(datetime.utcnow().timestamp())
+    if utc_timestamp_now - last_update > max_age:
+        return None
 
-def get_type_by_url(text):
-    if re.match(Wishlist.url_pattern, text):
-        return EntityType.WISHLIST
-    elif re.match(Product.url_pattern, text):
-        return EntityType.PRODUCT
-    else:
-        raise InvalidURLException
+    try:
+        return get_entity(entity_id, entity_type)
+    except (WishlistNotFoundException, ProductNotFoundException):
+        return None
 
 
 def get_entity_subscribers(entity):
@@ -222,6 +365,13 @@ def get_entity_subscribers(entity):
         raise ValueError("Unknown EntityType")
 
 
+def get_subscriber_map(entities):
+    """Returns a dict mapping the keys of the given entities to the User objects of their subscribers.
+    Entities without subscribers are missing in the dict."""
+    db = DBwrapper.get_instance()
+    return db.get_subscribers(get_entity_key(entity) for entity in entities)
+
+
 def update_entity_price(entity, price):
     """Update the price of an entity"""
     db = DBwrapper.get_instance()
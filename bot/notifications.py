@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""Combining the price change notifications of a user into as few messages as possible"""
+from collections import OrderedDict
+
+from util.formatter import bold, link, price
+
+# Telegram rejects longer messages. The html tags count here as well, so the actual text is always a bit shorter.
+MAX_MESSAGE_LENGTH = 4096
+BATCH_HEADER = "Die Preise deiner Preisagenten haben sich geändert:"
+
+
+def get_change_text(entity, old_price):
+    """Returns the emoji and the formatted price difference of a price change"""
+    diff = entity.price - old_price
+
+    if diff > 0:
+        emoji = "📈"
+        change = "teurer"
+    else:
+        emoji = "📉"
+        change = "billiger"
+
+    return "{emoji} {diff} {change}".format(emoji=emoji, diff=bold(price(diff)), change=change)
+
+
+def format_price_change(entity, old_price):
+    """Generates the message for a single price change"""
+    return "Der Preis von {link_name} hat sich geändert: {price}\n\n" \
+           "{change}".format(link_name=link(entity.url, entity.name),
+                             price=bold(price(entity.price, signed=False)),
+                             change=get_change_text(entity, old_price))
+
+
+def format_batch_entry(entity, old_price):
+    """Generates the part of a combined message for a single price change"""
+    return "{link_name}: {price}\n{change}".format(link_name=link(entity.url, entity.name),
+                                                  price=bold(price(entity.price, signed=False)),
+                                                  change=get_change_text(entity, old_price))
+
+
+def merge_notifications(notifications):
+    """Merge (notification_id, entity, old_price) tuples about the same entity into a single change from the first old
+    price to the latest price. Returns (notification_ids, entity, old_price) tuples."""
+    merged = OrderedDict()
+    for notification_id, entity, old_price in notifications:
+        key = (entity.TYPE, entity.entity_id)
+        if key in merged:
+            notification_ids, _, first_old_price = merged[key]
+            merged[key] = (notification_ids + [notification_id], entity, first_old_price)
+        else:
+            merged[key] = ([notification_id], entity, old_price)
+
+    return list(merged.values())
+
+
+def build_messages(notifications, max_length=MAX_MESSAGE_LENGTH):
+    """Combine the (notification_id, entity, old_price) tuples of a single user into messages below max_length.
+    Returns a list of (message, notification_ids) tuples. Notifications without a net price change are returned with
+    an empty message, they don't need to be sent."""
+    messages = []
+    changes = []
+    for notification_ids, entity, old_price in merge_notifications(notifications):
+        if entity.price == old_price:
+            messages.append(("", notification_ids))
+        else:
+            changes.append((notification_ids, entity, old_price))
+
+    if len(changes) == 1:
+        notification_ids, entity, old_price = changes[0]
+        messages.append((format_price_change(entity, old_price), notification_ids))
+        return messages
+
+    text, text_ids = BATCH_HEADER, []
+    for notification_ids, entity, old_price in changes:
+        entry = format_batch_entry(entity, old_price)
+        if text_ids and len(text) + 2 + len(entry) > max_length:
+            messages.append((text, text_ids))
+            text, text_ids = BATCH_HEADER, []
+
+        text += "\n\n" + entry
+        text_ids = text_ids + notification_ids
+
+    if text_ids:
+        messages.append((text, text_ids))
+
+    return messages
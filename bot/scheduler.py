@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""Adaptive scheduling of the price checks of entities"""
+import heapq
+import itertools
+import logging
+import math
+import threading
+import zlib
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# volatility is the number of price changes per day, last_checked and last_changed are utc timestamps (0 = never)
+EntityStats = namedtuple("EntityStats", ["last_checked", "last_changed", "subscribers", "volatility"])
+
+
+class AdaptiveScheduler(object):
+    """Priority queue of entity keys ordered by the time of their next check.
+    Volatile entities, entities with many subscribers and entities which changed recently are checked more often."""
+
+    def __init__(self, min_interval, max_interval, recent_change_window=86400):
+        if min_interval <= 0 or max_interval < min_interval:
+            raise ValueError("Intervals must fulfill 0 < min_interval <= max_interval!")
+
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.recent_change_window = recent_change_window
+
+        self._heap = []
+        self._due_times = {}
+        # Tie breaker, so that keys never have to be compared
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def get_interval(self, stats, now):
+        """Returns the seconds until the next check of an entity with the given stats"""
+        score = 1 + max(0.0, stats.volatility)
+        # Doubling the subscribers increases the priority by the same amount each time
+        score *= 1 + math.log2(max(1, stats.subscribers))
+
+        if stats.last_changed > 0:
+            # Prices which changed recently are likely to change again soon
+            last_change_age = max(0, now - stats.last_changed)
+            score *= 2 - min(1.0, last_change_age / self.recent_change_window)
+
+        return min(self.max_interval, max(self.min_interval, self.max_interval / score))
+
+    def schedule(self, key, due_time):
+        """Schedule (or reschedule) the next check of an entity"""
+        with self._lock:
+            self._due_times[key] = due_time
+            heapq.heappush(self._heap, (due_time, next(self._counter), key))
+
+    def schedule_next(self, key, stats, now):
+        """Schedule the next check of an entity based on its stats"""
+        self.schedule(key, now + self.get_interval(stats, now))
+
+    def remove(self, key):
+        with self._lock:
+            # Heap entries of removed keys are dropped lazily when they are popped
+            self._due_times.pop(key, None)
+
+    def sync(self, entity_stats, now):
+        """Add new entities, scheduled relative to their last check, and remove the ones which are not tracked anymore"""
+        added = 0
+        with self._lock:
+            removed_keys = set(self._due_times) - set(entity_stats)
+
+        for key in removed_keys:
+            self.remove(key)
+
+        for key, stats in entity_stats.items():
+            if key in self:
+                continue
+
+            self.schedule(key, stats.last_checked + self.get_interval(stats, now))
+            added += 1
+
+        return added
+
+    def pop_due(self, now, limit=None):
+        """Remove and return the keys of all entities which are due, the most overdue ones first"""
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now and (limit is None or len(due) < limit):
+                due_time, _, key = heapq.heappop(self._heap)
+                if self._due_times.get(key) != due_time:
+                    # Outdated entry of a removed or rescheduled key
+                    continue
+
+                del self._due_times[key]
+                due.append(key)
+
+        return due
+
+    def next_due_time(self):
+        """Returns the time of the next check or None if nothing is scheduled"""
+        with self._lock:
+            while self._heap and self._due_times.get(self._heap[0][2]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+
+            return self._heap[0][0] if self._heap else None
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._due_times
+
+    def __len__(self):
+        with self._lock:
+            return len(self._due_times)
+
+
+class SlottedScheduler(object):
+    """Spreads the checks of all entities evenly across an interval to avoid request bursts.
+    Each entity is hashed into one of interval / tick slots and on each tick the entities of the current slot are due."""
+
+    def __init__(self, interval, tick):
+        if tick <= 0 or interval < tick:
+            raise ValueError("Intervals must fulfill 0 < tick <= interval!")
+
+        self.interval = interval
+        self.tick = tick
+        self.slot_count = int(interval // tick)
+
+        self._slots = {}
+        self._stats = {}
+        self._last_tick = None
+        self._lock = threading.Lock()
+
+    def get_slot(self, key):
+        """Returns the slot of an entity - the built in hash() differs between processes, crc32 doesn't"""
+        return zlib.crc32(str(key).encode("utf-8")) % self.slot_count
+
+    def schedule_next(self, key, stats, now):
+        """The slot of an entity never changes, so there is nothing to do"""
+        pass
+
+    def remove(self, key):
+        with self._lock:
+            self._stats.pop(key, None)
+            self._slots.get(self.get_slot(key), set()).discard(key)
+
+    def sync(self, entity_stats, now):
+        """Add new entities to their slots, remove the ones which are not tracked anymore and update the stats"""
+        with self._lock:
+            added_keys = set(entity_stats) - set(self._stats)
+            removed_keys = set(self._stats) - set(entity_stats)
+
+            for key in removed_keys:
+                self._slots[self.get_slot(key)].discard(key)
+
+            for key in added_keys:
+                self._slots.setdefault(self.get_slot(key), set()).add(key)
+
+            self._stats = dict(entity_stats)
+
+        return len(added_keys)
+
+    def pop_due(self, now):
+        """Return the keys of the entities in all slots since the last call - at most one full interval.
+        Entities which were checked within the last half interval, e.g. through a wishlist page, are skipped."""
+        current_tick = int(now // self.tick)
+        due = []
+
+        with self._lock:
+            if self._last_tick is None:
+                first_tick = current_tick
+            else:
+                first_tick = max(self._last_tick + 1, current_tick - self.slot_count + 1)
+
+            for tick in range(first_tick, current_tick + 1):
+                for key in self._slots.get(tick % self.slot_count, set()):
+                    stats = self._stats.get(key)
+                    if stats is not None and now - stats.last_checked < self.interval / 2:
+                        continue
+                    due.append(key)
+
+            self._last_tick = current_tick
+
+        return due
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._stats
+
+    def __len__(self):
+        with self._lock:
+            return len(self._stats)
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""Central queue for all outgoing Telegram messages which respects the flood limits of Telegram"""
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from enum import IntEnum
+
+from telegram.error import RetryAfter, TelegramError
+from telegram.ext import ExtBot
+
+from geizhals.util import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class SendPriority(IntEnum):
+    """Lanes of the send queue - lower values are sent first"""
+    INTERACTIVE = 0
+    NOTIFICATION = 1
+    BROADCAST = 2
+
+
+class _QueuedCall(object):
+
+    def __init__(self, priority, chat_id, func, args, kwargs):
+        self.priority = priority
+        self.chat_id = chat_id
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.queued = time.monotonic()
+        self.attempts = 0
+
+
+class SendQueue(object):
+    """Sends messages from a few worker threads, limited by a global and a per chat token bucket.
+    Interactive replies are sent before notifications and those before broadcasts. When Telegram answers with
+    RetryAfter, all sending is paused for the requested time and the message is sent again."""
+    # Seconds between removing the buckets of chats which did not get messages recently
+    bucket_eviction_interval = 60
+
+    def __init__(self, global_rate=30, chat_rate=1, workers=4, max_retries=3):
+        if workers < 1:
+            raise ValueError("The number of send workers must be at least 1!")
+
+        self.chat_rate = chat_rate
+        self.max_retries = max_retries
+
+        self._global_bucket = TokenBucket(global_rate)
+        self._chat_buckets = {}
+        self._lanes = {priority: deque() for priority in SendPriority}
+        self._paused_until = 0
+        self._last_eviction = time.monotonic()
+        self._running = False
+        self._stopped = False
+        self._condition = threading.Condition()
+        self._workers = [threading.Thread(target=self._work, name="send_queue_{}".format(i), daemon=True) for i in range(workers)]
+
+        self._sent = 0
+        self._failed = 0
+        self._retried = 0
+        self._total_latency = 0.0
+        self._sent_times = deque()
+
+    def start(self):
+        with self._condition:
+            self._running = True
+
+        for worker in self._workers:
+            worker.start()
+
+    def stop(self):
+        """Stop the workers - the messages which were not sent yet fail with a TelegramError"""
+        with self._condition:
+            self._running = False
+            self._stopped = True
+            queued_calls = [call for lane in self._lanes.values() for call in lane]
+            for lane in self._lanes.values():
+                lane.clear()
+            self._condition.notify_all()
+
+        for call in queued_calls:
+            call.future.set_exception(TelegramError("The send queue was stopped"))
+
+    def send(self, priority, chat_id, func, *args, **kwargs):
+        """Queue the call func(*args, **kwargs) which sends a message to the given chat. Returns a Future of its result.
+        Calls can be queued before the queue is started."""
+        call = _QueuedCall(priority, chat_id, func, args, kwargs)
+
+        with self._condition:
+            if self._stopped:
+                call.future.set_exception(TelegramError("The send queue was stopped"))
+                return call.future
+
+            self._lanes[priority].append(call)
+            self._condition.notify()
+
+        return call.future
+
+    def _get_chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            # No bursts within a chat
+            bucket = TokenBucket(self.chat_rate, capacity=1)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _evict_chat_buckets(self):
+        """Forget the full buckets - a new bucket would be full as well. Must hold the condition."""
+        self._chat_buckets = {chat_id: bucket for chat_id, bucket in self._chat_buckets.items() if not bucket.is_full()}
+
+    def _take_next(self):
+        """Return the next call which may be sent now or the seconds to wait for one - must hold the condition"""
+        if time.monotonic() - self._last_eviction >= self.bucket_eviction_interval:
+            self._evict_chat_buckets()
+            self._last_eviction = time.monotonic()
+
+        wait_time = max(self._paused_until - time.monotonic(), self._global_bucket.get_wait_time())
+        if wait_time > 0:
+            return None, wait_time
+
+        wait_time = None
+        for priority in SendPriority:
+            lane = self._lanes[priority]
+            for index, call in enumerate(lane):
+                chat_bucket = self._get_chat_bucket(call.chat_id)
+                chat_wait_time = chat_bucket.get_wait_time()
+                if chat_wait_time > 0:
+                    wait_time = chat_wait_time if wait_time is None else min(wait_time, chat_wait_time)
+                    continue
+
+                # Only the workers take tokens and they hold the condition, so the tokens are still there
+                chat_bucket.try_acquire()
+                self._global_bucket.try_acquire()
+                del lane[index]
+                return call, 0
+
+        return None, wait_time
+
+    def _work(self):
+        while True:
+            with self._condition:
+                call = None
+                while self._running:
+                    call, wait_time = self._take_next()
+                    if call is not None:
+                        break
+                    self._condition.wait(wait_time)
+
+                if call is None:
+                    return
+
+            self._run(call)
+
+    def _run(self, call):
+        # Retried calls are already running
+        if call.attempts == 0 and not call.future.set_running_or_notify_cancel():
+            return
+
+        call.attempts += 1
+        try:
+            result = call.func(*call.args, **call.kwargs)
+        except RetryAfter as e:
+            if call.attempts <= self.max_retries:
+                logger.warning("Flood limit reached, pausing all messages for {} seconds".format(e.retry_after))
+                self._retry(call, e.retry_after)
+                return
+
+            self._record(call, failed=True)
+            call.future.set_exception(e)
+        except Exception as e:
+            self._record(call, failed=True)
+            call.future.set_exception(e)
+        else:
+            self._record(call, failed=False)
+            call.future.set_result(result)
+
+    def _retry(self, call, retry_after):
+        with self._condition:
+            self._retried += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            if not self._running:
+                call.future.set_exception(TelegramError("The send queue was stopped"))
+                return
+
+            # The message is sent first, once the pause is over
+            self._lanes[call.priority].appendleft(call)
+            self._condition.notify_all()
+
+    def _record(self, call, failed):
+        now = time.monotonic()
+        with self._condition:
+            if failed:
+                self._failed += 1
+                return
+
+            self._sent += 1
+            self._total_latency += now - call.queued
+            self._sent_times.append(now)
+            while self._sent_times and self._sent_times[0] < now - 60:
+                self._sent_times.popleft()
+
+    def get_stats(self):
+        """Returns the counters of the queue and the throughput of the last minute"""
+        with self._condition:
+            now = time.monotonic()
+            while self._sent_times and self._sent_times[0] < now - 60:
+                self._sent_times.popleft()
+
+            return {"sent": self._sent,
+                    "failed": self._failed,
+                    "retried": self._retried,
+                    "queued": {priority.name.lower(): len(lane) for priority, lane in self._lanes.items()},
+                    "messages_per_second": len(self._sent_times) / 60,
+                    "avg_latency": self._total_latency / self._sent if self._sent else 0.0}
+
+
+class QueuedBot(ExtBot):
+    """Bot which sends all messages through a SendQueue. send_message blocks until the message was sent and raises
+    the same errors as before - the priority defaults to interactive replies."""
+
+    def __init__(self, token, send_queue, **kwargs):
+        super().__init__(token, **kwargs)
+        self.send_queue = send_queue
+
+    def queue_message(self, chat_id, text, priority=SendPriority.INTERACTIVE, **kwargs):
+        """Queue a message without waiting for it - returns a Future of the sent message"""
+        return self.send_queue.send(priority, chat_id, super().send_message, chat_id, text, **kwargs)
+
+    def send_message(self, chat_id, text, *args, priority=SendPriority.INTERACTIVE, **kwargs):
+        return self.send_queue.send(priority, chat_id, super().send_message, chat_id, text, *args, **kwargs).result()
+
+    # The camel case alias of the base class would bypass the queue
+    sendMessage = send_message
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""Stopping the bot on SIGINT/SIGTERM without waiting for the running sweep to check all of its entities"""
+import logging
+import signal
+
+logger = logging.getLogger(__name__)
+
+
+def wait_for_shutdown(shutdown_event, sweep_supervisor, updater, stop_signals=(signal.SIGINT, signal.SIGTERM)):
+    """Block until one of the stop signals is received, then stop the updater.
+    Updater.idle() would stop the updater - and wait for the running sweep - before notifying anyone, so the sweep is
+    stopped first here. It finishes at the next entity boundary and the updater doesn't have to wait for it long."""
+    def handle_signal(signum, frame):
+        logger.info("Received signal {}, stopping the price checks".format(signum))
+        shutdown_event.set()
+        sweep_supervisor.stop()
+
+    previous_handlers = {stop_signal: signal.signal(stop_signal, handle_signal) for stop_signal in stop_signals}
+    try:
+        while not shutdown_event.wait(1):
+            pass
+    finally:
+        for stop_signal, previous_handler in previous_handlers.items():
+            signal.signal(stop_signal, previous_handler)
+
+    logger.info("Stopping the updater")
+    updater.stop()
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""Protection of the price check sweeps against overlapping and overrunning"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Sweep(object):
+    """A single running sweep. Its stop_event is set once the time budget is used up or the supervisor is stopped."""
+
+    def __init__(self, time_budget):
+        self.time_budget = time_budget
+        self.started = time.monotonic()
+        self.stop_event = threading.Event()
+
+        self._timer = threading.Timer(time_budget, self.stop_event.set)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def get_duration(self):
+        return time.monotonic() - self.started
+
+    def is_over_budget(self):
+        return self.get_duration() >= self.time_budget
+
+    def cancel(self):
+        self._timer.cancel()
+
+
+class SweepSupervisor(object):
+    """Makes sure that only one sweep runs at a time and that it does not exceed its time budget.
+    Entities which were not checked within the budget are deferred to the next sweep, in the order they were due."""
+
+    def __init__(self, time_budget):
+        if time_budget <= 0:
+            raise ValueError("The time budget must be greater than 0!")
+
+        self.time_budget = time_budget
+        self.current_sweep = None
+        self.skipped_ticks = 0
+        self.overruns = 0
+
+        self._deferred_keys = []
+        self._stopped = False
+        self._sweep_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start a new sweep and return it - returns None if the previous sweep is still running or after stop()"""
+        if self._stopped:
+            return None
+
+        if not self._sweep_lock.acquire(blocking=False):
+            with self._lock:
+                self.skipped_ticks += 1
+            logger.warning("Previous sweep is still running, skipping this tick ({} skipped so far)".format(self.skipped_ticks))
+            return None
+
+        with self._lock:
+            self.current_sweep = Sweep(self.time_budget)
+        return self.current_sweep
+
+    def finish(self, sweep, unfinished_keys=None):
+        """Finish the sweep and defer the keys of the entities it did not check to the next sweep"""
+        sweep.cancel()
+        duration = sweep.get_duration()
+        unfinished_keys = list(unfinished_keys or [])
+
+        with self._lock:
+            if unfinished_keys:
+                self._deferred_keys = unfinished_keys + [key for key in self._deferred_keys if key not in unfinished_keys]
+
+            if sweep.is_over_budget():
+                self.overruns += 1
+            self.current_sweep = None
+
+        if sweep.stop_event.is_set() and not self._stopped:
+            logger.warning("Sweep overran its budget: duration={:.1f}s budget={}s deferred={} overruns={} skipped_ticks={}".format(
+                duration, self.time_budget, len(unfinished_keys), self.overruns, self.skipped_ticks))
+        else:
+            logger.info("Sweep finished: duration={:.1f}s budget={}s deferred={}".format(duration, self.time_budget, len(unfinished_keys)))
+
+        self._sweep_lock.release()
+
+    def defer(self, keys):
+        """Check the entities with the given keys first in the next sweep"""
+        with self._lock:
+            self._deferred_keys.extend(key for key in keys if key not in self._deferred_keys)
+
+    def take_deferred(self):
+        """Return and forget the keys of the deferred entities"""
+        with self._lock:
+            deferred_keys, self._deferred_keys = self._deferred_keys, []
+        return deferred_keys
+
+    def stop(self):
+        """Stop the running sweep and don't start new ones"""
+        self._stopped = True
+        with self._lock:
+            if self.current_sweep is not None:
+                self.current_sweep.stop_event.set()
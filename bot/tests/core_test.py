@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+from unittest import mock
+
+import bot.core
+from geizhals.entities import EntityType, Product, Wishlist
+
+
+class BotCoreTest(unittest.TestCase):
+
+    def setUp(self):
+        bot.core._change_counts = {}
+        self.p = Product(entity_id=1, name="Product", url="https://geizhals.de/a1.html", price=10.0)
+        self.wl = Wishlist(entity_id=2, name="Wishlist", url="https://geizhals.de/?cat=WL-2", price=99.0)
+
+        self.db = mock.Mock()
+        self.db.get_wishlist_check_stats.return_value = [(self.wl, 0, 0, 1)]
+        self.db.get_product_check_stats.return_value = [(self.p, 0, 0, 2)]
+        self.db.get_price_change_counts.side_effect = lambda entity_type, entity_ids, since: {entity_id: 7 for entity_id in entity_ids}
+
+        patcher = mock.patch("bot.core.DBwrapper.get_instance", return_value=self.db)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        bot.core._change_counts = {}
+
+    def test_get_entities_check_stats(self):
+        """Test to check if the price changes are only counted again for entities whose price changed"""
+        entity_stats = bot.core.get_entities_check_stats(volatility_window=7 * 86400)
+        self.assertEqual(1, entity_stats[(EntityType.PRODUCT, 1)][1].volatility)
+        self.assertEqual(2, entity_stats[(EntityType.PRODUCT, 1)][1].subscribers)
+        self.assertEqual(1, entity_stats[(EntityType.WISHLIST, 2)][1].volatility)
+        self.assertEqual(2, self.db.get_price_change_counts.call_count)
+
+        # Nothing changed - the cached counts are used
+        self.db.get_price_change_counts.reset_mock()
+        entity_stats = bot.core.get_entities_check_stats(volatility_window=7 * 86400)
+        self.assertEqual(1, entity_stats[(EntityType.PRODUCT, 1)][1].volatility)
+        self.db.get_price_change_counts.assert_not_called()
+
+        # Only the changed product is counted again
+        self.db.get_product_check_stats.return_value = [(self.p, 100, 100, 2)]
+        bot.core.get_entities_check_stats(volatility_window=7 * 86400)
+        self.db.get_price_change_counts.assert_called_once_with(EntityType.PRODUCT, [1], mock.ANY)
+
+        # Once the refresh interval passed, all counts are refreshed
+        self.db.get_price_change_counts.reset_mock()
+        bot.core.get_entities_check_stats(volatility_window=7 * 86400, refresh_interval=0)
+        self.assertEqual(2, self.db.get_price_change_counts.call_count)
+
+        # Entities without subscribers are dropped from the cache
+        self.db.get_wishlist_check_stats.return_value = []
+        entity_stats = bot.core.get_entities_check_stats(volatility_window=7 * 86400)
+        self.assertEqual([(EntityType.PRODUCT, 1)], list(entity_stats))
+        self.assertEqual([(EntityType.PRODUCT, 1)], list(bot.core._change_counts))
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from bot.notifications import BATCH_HEADER, build_messages, format_price_change
+from geizhals.entities import Product, Wishlist
+
+
+class NotificationsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.products = [Product(entity_id=i, name="Product {}".format(i), url="https://geizhals.de/a{}.html".format(i), price=10.0)
+                         for i in range(100)]
+        self.wishlist = Wishlist(entity_id=2, name="Wishlist", url="https://geizhals.de/?cat=WL-2", price=99.0)
+
+    def tearDown(self):
+        del self.products
+
+    def test_single_change(self):
+        """Test to check if a single change is sent as the usual message"""
+        messages = build_messages([(1, self.wishlist, 100.0)])
+
+        self.assertEqual([(format_price_change(self.wishlist, 100.0), [1])], messages)
+        self.assertIn("📉", messages[0][0])
+        self.assertIn("billiger", messages[0][0])
+
+    def test_combined_changes(self):
+        """Test to check if all changes of a user are combined into one message"""
+        messages = build_messages([(1, self.wishlist, 100.0), (2, self.products[0], 5.0), (3, self.products[1], 5.0)])
+
+        self.assertEqual(1, len(messages))
+        message, notification_ids = messages[0]
+        self.assertEqual([1, 2, 3], notification_ids)
+        self.assertTrue(message.startswith(BATCH_HEADER))
+        self.assertEqual(1, message.count("Wishlist"))
+        self.assertEqual(2, message.count("teurer"))
+
+    def test_merge_same_entity(self):
+        """Test to check if multiple changes of the same entity are merged and cancelled out changes are not sent"""
+        product = self.products[0]
+        messages = build_messages([(1, product, 8.0), (2, product, 9.0)])
+        self.assertEqual([(format_price_change(product, 8.0), [1, 2])], messages)
+
+        messages = build_messages([(3, product, 10.0)])
+        self.assertEqual([("", [3])], messages)
+
+    def test_message_length(self):
+        """Test to check if long messages are split below the length limit without losing changes"""
+        notifications = [(i, product, 5.0) for i, product in enumerate(self.products)]
+        messages = build_messages(notifications, max_length=1000)
+
+        self.assertGreater(len(messages), 1)
+        self.assertLess(len(messages), len(notifications))
+
+        notification_ids = []
+        for message, ids in messages:
+            self.assertLessEqual(len(message), 1000)
+            self.assertTrue(message.startswith(BATCH_HEADER))
+            notification_ids.extend(ids)
+
+        self.assertEqual(list(range(100)), notification_ids)
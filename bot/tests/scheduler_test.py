@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from bot.scheduler import AdaptiveScheduler, EntityStats, SlottedScheduler
+from geizhals.entities import EntityType
+
+
+class AdaptiveSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = AdaptiveScheduler(min_interval=600, max_interval=7200, recent_change_window=86400)
+        self.now = 1000000
+        self.stats = EntityStats(last_checked=0, last_changed=0, subscribers=1, volatility=0)
+
+    def tearDown(self):
+        del self.scheduler
+
+    def test_invalid_intervals(self):
+        """Test to check if invalid intervals are rejected"""
+        with self.assertRaises(ValueError):
+            AdaptiveScheduler(min_interval=0, max_interval=10)
+
+        with self.assertRaises(ValueError):
+            AdaptiveScheduler(min_interval=20, max_interval=10)
+
+    def test_get_interval(self):
+        """Test to check if volatile, popular and recently changed entities are checked more often"""
+        quiet = self.scheduler.get_interval(self.stats, self.now)
+        self.assertEqual(7200, quiet)
+
+        volatile = self.scheduler.get_interval(self.stats._replace(volatility=2), self.now)
+        popular = self.scheduler.get_interval(self.stats._replace(subscribers=8), self.now)
+        recently_changed = self.scheduler.get_interval(self.stats._replace(last_changed=self.now - 3600), self.now)
+        long_ago_changed = self.scheduler.get_interval(self.stats._replace(last_changed=self.now - 10 * 86400), self.now)
+
+        self.assertLess(volatile, quiet)
+        self.assertLess(popular, quiet)
+        self.assertLess(recently_changed, long_ago_changed)
+        self.assertEqual(quiet, long_ago_changed)
+
+        # The interval never falls below the min. interval
+        hot = self.scheduler.get_interval(EntityStats(last_checked=0, last_changed=self.now, subscribers=1000, volatility=50), self.now)
+        self.assertEqual(600, hot)
+
+    def test_pop_due(self):
+        """Test to check if due entities are returned in order of their due time"""
+        self.scheduler.schedule((EntityType.PRODUCT, 1), self.now + 10)
+        self.scheduler.schedule((EntityType.PRODUCT, 2), self.now - 10)
+        self.scheduler.schedule((EntityType.WISHLIST, 2), self.now - 10)
+        self.scheduler.schedule((EntityType.WISHLIST, 3), self.now)
+
+        self.assertEqual([(EntityType.PRODUCT, 2), (EntityType.WISHLIST, 2), (EntityType.WISHLIST, 3)], self.scheduler.pop_due(self.now))
+        self.assertEqual([], self.scheduler.pop_due(self.now))
+        self.assertEqual(1, len(self.scheduler))
+        self.assertEqual(self.now + 10, self.scheduler.next_due_time())
+
+        self.assertEqual([(EntityType.PRODUCT, 1)], self.scheduler.pop_due(self.now + 10, limit=5))
+        self.assertIsNone(self.scheduler.next_due_time())
+
+    def test_reschedule_and_remove(self):
+        """Test to check if rescheduled and removed entities are not returned with their old due time"""
+        self.scheduler.schedule("a", self.now - 10)
+        self.scheduler.schedule("b", self.now - 5)
+        self.scheduler.schedule("a", self.now + 100)
+        self.scheduler.remove("b")
+
+        self.assertEqual([], self.scheduler.pop_due(self.now))
+        self.assertNotIn("b", self.scheduler)
+        self.assertEqual(["a"], self.scheduler.pop_due(self.now + 100))
+
+        self.scheduler.schedule("c", self.now)
+        self.scheduler.schedule_next("c", self.stats, self.now)
+        self.assertEqual([], self.scheduler.pop_due(self.now + 599))
+        self.assertEqual(["c"], self.scheduler.pop_due(self.now + 7200))
+
+    def test_sync(self):
+        """Test to check if syncing adds new entities relative to their last check and removes untracked ones"""
+        self.scheduler.schedule("old", self.now)
+        added = self.scheduler.sync({"new": self.stats, "checked": self.stats._replace(last_checked=self.now)}, self.now)
+
+        self.assertEqual(2, added)
+        self.assertNotIn("old", self.scheduler)
+
+        # Never checked entities are due immediately
+        self.assertEqual(["new"], self.scheduler.pop_due(self.now))
+        self.assertEqual(["checked"], self.scheduler.pop_due(self.now + 7200))
+
+        # Entities which are already scheduled keep their due time
+        self.scheduler.schedule("new", self.now + 50)
+        self.assertEqual(0, self.scheduler.sync({"new": self.stats}, self.now))
+        self.assertEqual(self.now + 50, self.scheduler.next_due_time())
+
+
+class SlottedSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = SlottedScheduler(interval=1800, tick=60)
+        self.stats = EntityStats(last_checked=0, last_changed=0, subscribers=1, volatility=0)
+        self.entity_stats = {(EntityType.PRODUCT, entity_id): self.stats for entity_id in range(3000)}
+        # Start of an interval
+        self.now = 1800 * 1000
+
+    def tearDown(self):
+        del self.scheduler
+
+    def test_invalid_intervals(self):
+        """Test to check if invalid intervals are rejected"""
+        with self.assertRaises(ValueError):
+            SlottedScheduler(interval=1800, tick=0)
+
+        with self.assertRaises(ValueError):
+            SlottedScheduler(interval=30, tick=60)
+
+    def test_get_slot(self):
+        """Test to check if entities are spread evenly and stable across the slots"""
+        self.assertEqual(30, self.scheduler.slot_count)
+        self.assertEqual(self.scheduler.get_slot((EntityType.PRODUCT, 1)), SlottedScheduler(1800, 60).get_slot((EntityType.PRODUCT, 1)))
+
+        slot_sizes = [0] * self.scheduler.slot_count
+        for key in self.entity_stats:
+            slot_sizes[self.scheduler.get_slot(key)] += 1
+
+        # On average there are 100 entities per slot
+        self.assertGreater(min(slot_sizes), 50)
+        self.assertLess(max(slot_sizes), 150)
+
+    def test_pop_due(self):
+        """Test to check if every entity is due exactly once per interval in small batches"""
+        self.assertEqual(3000, self.scheduler.sync(self.entity_stats, self.now))
+
+        due = []
+        for tick in range(30):
+            batch = self.scheduler.pop_due(self.now + tick * 60)
+            self.assertLess(len(batch), 150)
+            due.extend(batch)
+
+        self.assertEqual(3000, len(due))
+        self.assertEqual(set(self.entity_stats), set(due))
+
+        # Ticks within the same slot don't return the entities again
+        self.assertEqual([], self.scheduler.pop_due(self.now + 29 * 60 + 30))
+
+    def test_pop_due_missed_ticks(self):
+        """Test to check if the slots of missed ticks are caught up - but at most one interval"""
+        self.scheduler.sync(self.entity_stats, self.now)
+        first = self.scheduler.pop_due(self.now)
+
+        caught_up = self.scheduler.pop_due(self.now + 5 * 60)
+        expected = [key for key in self.entity_stats if self.scheduler.get_slot(key) in range(1, 6)]
+        self.assertEqual(set(expected), set(caught_up))
+
+        self.assertEqual(3000, len(self.scheduler.pop_due(self.now + 100 * 60)))
+        self.assertGreater(len(first), 0)
+
+    def test_skip_recently_checked(self):
+        """Test to check if entities which were checked recently are skipped and untracked ones are removed"""
+        key = (EntityType.PRODUCT, 1)
+        slot_time = self.now + self.scheduler.get_slot(key) * 60
+
+        self.scheduler.sync({key: self.stats._replace(last_checked=slot_time - 60)}, slot_time)
+        self.assertEqual([], self.scheduler.pop_due(slot_time))
+
+        self.scheduler.sync({key: self.stats._replace(last_checked=slot_time - 60)}, slot_time)
+        self.assertEqual([key], self.scheduler.pop_due(slot_time + 1800))
+
+        self.scheduler.sync({}, slot_time)
+        self.assertNotIn(key, self.scheduler)
+        self.assertEqual([], self.scheduler.pop_due(slot_time + 3600))
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+import unittest
+
+from telegram.error import RetryAfter, TelegramError, Unauthorized
+
+from bot.send_queue import SendPriority, SendQueue
+
+
+class SendQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sent = []
+        self.lock = threading.Lock()
+        self.queue = SendQueue(global_rate=100, chat_rate=100, workers=1)
+
+    def tearDown(self):
+        self.queue.stop()
+
+    def helper_send(self, chat_id, text):
+        with self.lock:
+            self.sent.append((chat_id, text, time.monotonic()))
+        return text
+
+    def test_send(self):
+        """Test to check if the result and the errors of a call are passed to the caller"""
+        self.queue.start()
+        self.assertEqual("hello", self.queue.send(SendPriority.INTERACTIVE, 1, self.helper_send, 1, "hello").result(timeout=2))
+
+        def blocked(chat_id, text):
+            raise Unauthorized("Forbidden: bot was blocked by the user")
+
+        with self.assertRaises(Unauthorized):
+            self.queue.send(SendPriority.NOTIFICATION, 1, blocked, 1, "hello").result(timeout=2)
+
+        stats = self.queue.get_stats()
+        self.assertEqual(1, stats["sent"])
+        self.assertEqual(1, stats["failed"])
+
+        with self.assertRaises(ValueError):
+            SendQueue(workers=0)
+
+    def test_priorities(self):
+        """Test to check if interactive replies are sent before notifications and those before broadcasts"""
+        futures = [self.queue.send(SendPriority.BROADCAST, 1, self.helper_send, 1, "broadcast"),
+                   self.queue.send(SendPriority.NOTIFICATION, 2, self.helper_send, 2, "notification"),
+                   self.queue.send(SendPriority.INTERACTIVE, 3, self.helper_send, 3, "reply")]
+        self.queue.start()
+        for future in futures:
+            future.result(timeout=2)
+
+        self.assertEqual(["reply", "notification", "broadcast"], [text for _, text, _ in self.sent])
+
+    def test_chat_rate(self):
+        """Test to check if the messages to a single chat are limited without delaying other chats"""
+        queue = SendQueue(global_rate=100, chat_rate=10, workers=2)
+        queue.start()
+        try:
+            futures = [queue.send(SendPriority.NOTIFICATION, 1, self.helper_send, 1, i) for i in range(4)]
+            other_future = queue.send(SendPriority.NOTIFICATION, 2, self.helper_send, 2, "other")
+            other_future.result(timeout=2)
+            for future in futures:
+                future.result(timeout=2)
+        finally:
+            queue.stop()
+
+        chat_times = [sent_time for chat_id, _, sent_time in self.sent if chat_id == 1]
+        # After the first message the chat may get one message per 0.1 seconds
+        self.assertGreater(chat_times[-1] - chat_times[0], 0.25)
+        # The other chat does not have to wait for the messages to chat 1
+        self.assertLess([sent_time for chat_id, _, sent_time in self.sent if chat_id == 2][0], chat_times[-1])
+
+    def test_evict_chat_buckets(self):
+        """Test to check if the buckets of chats without recent messages are removed"""
+        self.queue.bucket_eviction_interval = 0.05
+        self.queue.start()
+        for chat_id in range(5):
+            self.queue.send(SendPriority.NOTIFICATION, chat_id, self.helper_send, chat_id, "hello").result(timeout=2)
+        self.assertGreater(len(self.queue._chat_buckets), 0)
+
+        # The buckets refill within 0.01 seconds and the next message triggers the eviction
+        time.sleep(0.1)
+        self.queue.send(SendPriority.NOTIFICATION, 10, self.helper_send, 10, "hello").result(timeout=2)
+        self.assertEqual([10], list(self.queue._chat_buckets))
+
+    def test_retry_after(self):
+        """Test to check if messages are sent again after the time requested by RetryAfter"""
+        attempts = []
+
+        def flood_limited(chat_id, text):
+            attempts.append(time.monotonic())
+            if len(attempts) == 1:
+                raise RetryAfter(0.2)
+            return text
+
+        self.queue.start()
+        self.assertEqual("hello", self.queue.send(SendPriority.NOTIFICATION, 1, flood_limited, 1, "hello").result(timeout=2))
+
+        self.assertEqual(2, len(attempts))
+        self.assertGreaterEqual(attempts[1] - attempts[0], 0.2)
+        self.assertEqual(1, self.queue.get_stats()["retried"])
+
+    def test_stop(self):
+        """Test to check if queued messages fail once the queue is stopped"""
+        future = self.queue.send(SendPriority.BROADCAST, 1, self.helper_send, 1, "hello")
+        self.queue.stop()
+        with self.assertRaises(TelegramError):
+            future.result(timeout=2)
+
+        with self.assertRaises(TelegramError):
+            self.queue.send(SendPriority.BROADCAST, 1, self.helper_send, 1, "hello").result(timeout=2)
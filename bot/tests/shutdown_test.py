@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+import os
+import signal
+import threading
+import unittest
+
+from bot.shutdown import wait_for_shutdown
+from bot.sweep_supervisor import SweepSupervisor
+
+
+class RecordingUpdater(object):
+    """Stands in for the telegram Updater and records the state of the sweep when it gets stopped"""
+
+    def __init__(self, shutdown_event, sweep):
+        self.shutdown_event = shutdown_event
+        self.sweep = sweep
+        self.stopped_after_sweep = None
+
+    def stop(self):
+        self.stopped_after_sweep = self.shutdown_event.is_set() and self.sweep.stop_event.is_set()
+
+
+class ShutdownTest(unittest.TestCase):
+
+    def setUp(self):
+        self.supervisor = SweepSupervisor(time_budget=60)
+        self.shutdown_event = threading.Event()
+
+    def tearDown(self):
+        self.supervisor.stop()
+
+    def test_sweep_stopped_before_updater(self):
+        """Test to check if a stop signal stops the running sweep before the updater is stopped"""
+        sweep = self.supervisor.start()
+        updater = RecordingUpdater(self.shutdown_event, sweep)
+        previous_handler = signal.getsignal(signal.SIGTERM)
+
+        timer = threading.Timer(0.1, os.kill, [os.getpid(), signal.SIGTERM])
+        timer.start()
+        wait_for_shutdown(self.shutdown_event, self.supervisor, updater)
+        timer.join()
+
+        self.assertTrue(updater.stopped_after_sweep)
+        self.assertIsNone(self.supervisor.start())
+        # The previous signal handlers are restored
+        self.assertEqual(previous_handler, signal.getsignal(signal.SIGTERM))
+        self.supervisor.finish(sweep)
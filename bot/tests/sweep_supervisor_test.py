@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import unittest
+
+from bot.sweep_supervisor import SweepSupervisor
+from geizhals.entities import EntityType
+
+
+class SweepSupervisorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.supervisor = SweepSupervisor(time_budget=0.2)
+
+    def tearDown(self):
+        del self.supervisor
+
+    def test_invalid_budget(self):
+        """Test to check if invalid time budgets are rejected"""
+        with self.assertRaises(ValueError):
+            SweepSupervisor(time_budget=0)
+
+    def test_no_overlap(self):
+        """Test to check if no second sweep is started while the first one runs"""
+        sweep = self.supervisor.start()
+        self.assertIsNotNone(sweep)
+
+        results = []
+        thread = threading.Thread(target=lambda: results.append(self.supervisor.start()))
+        thread.start()
+        thread.join()
+
+        self.assertEqual([None], results)
+        self.assertEqual(1, self.supervisor.skipped_ticks)
+
+        self.supervisor.finish(sweep)
+        next_sweep = self.supervisor.start()
+        self.assertIsNotNone(next_sweep)
+        self.supervisor.finish(next_sweep)
+
+    def test_time_budget(self):
+        """Test to check if the stop event of a sweep is set once its budget is used up"""
+        sweep = self.supervisor.start()
+        self.assertFalse(sweep.stop_event.is_set())
+
+        self.assertTrue(sweep.stop_event.wait(1))
+        self.assertTrue(sweep.is_over_budget())
+
+        self.supervisor.finish(sweep)
+        self.assertEqual(1, self.supervisor.overruns)
+
+    def test_defer(self):
+        """Test to check if unfinished entities are returned in their order and before older deferred ones"""
+        keys = [(EntityType.PRODUCT, entity_id) for entity_id in range(4)]
+        self.supervisor.defer(keys[3:])
+
+        sweep = self.supervisor.start()
+        self.supervisor.finish(sweep, unfinished_keys=keys[:3])
+        self.assertEqual(0, self.supervisor.overruns)
+
+        self.assertEqual(keys, self.supervisor.take_deferred())
+        self.assertEqual([], self.supervisor.take_deferred())
+
+    def test_stop(self):
+        """Test to check if stopping the supervisor stops the running sweep and prevents new ones"""
+        supervisor = SweepSupervisor(time_budget=60)
+        sweep = supervisor.start()
+
+        supervisor.stop()
+        self.assertTrue(sweep.stop_event.is_set())
+        supervisor.finish(sweep)
+
+        self.assertIsNone(supervisor.start())
+        self.assertEqual(0, supervisor.skipped_ticks)
@@ -10,3 +10,53 @@ ADMIN_IDs = [1234, 4321]
 
 MAX_WISHLISTS = 5
 MAX_PRODUCTS = 5
+
+# Number of parallel threads fetching entities and max. parallel requests per host
+FETCH_WORKERS = 8
+FETCH_PER_HOST_LIMIT = 4
+
+# Max. number of keep-alive connections per proxy and seconds after which unused connections get closed
+SESSION_POOL_SIZE = 10
+SESSION_IDLE_TIMEOUT = 300
+
+# Directory (relative to the project) for caching ETag/Last-Modified validators of downloaded pages - None disables the cache
+RESPONSE_CACHE_DIR = "cache"
+
+# Max. requests per second to Geizhals in total and per proxy - None disables the limit
+RATE_LIMIT = 5
+PROXY_RATE_LIMIT = 1
+
+# Entities which were checked within this many minutes are not downloaded again when a user adds them
+ENTITY_FRESHNESS_MINUTES = 30
+
+# "adaptive" checks entities depending on their price changes and subscribers (see below),
+# "slotted" checks every entity once per SLOTTED_INTERVAL_MINUTES, spread evenly across the ticks of the interval
+SCHEDULER_MODE = "adaptive"
+SLOTTED_INTERVAL_MINUTES = 30
+
+# Each entity is checked every CHECK_INTERVAL_MIN_MINUTES to CHECK_INTERVAL_MAX_MINUTES, depending on its price volatility
+# within the last VOLATILITY_WINDOW_DAYS, its subscribers and its last price change. Due entities are checked every tick.
+CHECK_INTERVAL_MIN_MINUTES = 10
+CHECK_INTERVAL_MAX_MINUTES = 120
+VOLATILITY_WINDOW_DAYS = 7
+SCHEDULER_TICK_SECONDS = 60
+
+# Sweeps running longer than SWEEP_TIME_BUDGET_SECONDS are stopped and the remaining entities are checked first on the
+# next tick. Ticks are skipped while a sweep runs. Keep the budget below LEASE_SECONDS.
+SWEEP_TIME_BUDGET_SECONDS = 300
+
+# Additional sweep workers sharing the database run with WORKER_ONLY = True - they check prices but don't handle updates.
+# Each worker leases the entities it checks for LEASE_SECONDS. WORKER_ID defaults to "<hostname>-<pid>", which changes
+# on restarts - the sweeps interrupted by a restart are then resumed after LEASE_SECONDS instead of right away.
+WORKER_ONLY = False
+WORKER_ID = None
+LEASE_SECONDS = 600
+
+# Number of processes for parsing pages which the fast extractor can't handle - 0 parses in the fetching threads
+PARSE_WORKERS = 0
+
+# Outgoing messages are limited to SEND_GLOBAL_RATE messages per second in total and SEND_CHAT_RATE per chat.
+# Telegram allows about 30 messages per second and one message per second and chat.
+SEND_GLOBAL_RATE = 30
+SEND_CHAT_RATE = 1
+SEND_WORKERS = 4
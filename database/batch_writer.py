@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class BatchWriter(object):
+    """Collects the database writes of a sweep and stores them with DBwrapper.write_batch - one transaction per batch
+    instead of one commit per entity. A batch is written once it has max_rows rows, its oldest row is older than
+    max_delay seconds - checked by flush_if_needed() after all writes of an entity - or on flush(). This way the price
+    update, processed mark and notifications of an entity always end up in the same transaction."""
+
+    def __init__(self, db, max_rows=500, max_delay=5.0):
+        self.db = db
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+
+        self._prices = []
+        self._names = []
+        self._processed = []
+        self._notifications = []
+        self._first_write = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # The collected rows are valid, even if the sweep failed afterwards
+        if exc_type is None:
+            self.flush()
+            return
+
+        # The sweep might have failed because of the database - its exception must not be replaced by the flush error
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error("Could not write the remaining rows after the sweep failed: {}".format(e))
+
+    def _get_row_count(self):
+        return len(self._prices) + len(self._names) + len(self._processed) + len(self._notifications)
+
+    def _added(self):
+        if self._first_write is None:
+            self._first_write = time.monotonic()
+
+    def update_price(self, entity_type, entity_id, price):
+        # The time of the check, not of the flush, is stored
+        self._prices.append((entity_type, entity_id, price, int(datetime.utcnow().timestamp())))
+        self._added()
+
+    def update_name(self, entity_type, entity_id, name):
+        self._names.append((entity_type, entity_id, name))
+        self._added()
+
+    def mark_processed(self, sweep_id, entity_type, entity_id):
+        self._processed.append((sweep_id, entity_type, entity_id))
+        self._added()
+
+    def add_notifications(self, user_ids, entity_type, entity_id, old_price, new_price):
+        created = int(datetime.utcnow().timestamp())
+        self._notifications.extend((user_id, entity_type, entity_id, old_price, new_price, created) for user_id in user_ids)
+        self._added()
+
+    def flush_if_needed(self):
+        """Write the batch if it is full or old enough - must only be called between the writes of two entities"""
+        if self._first_write is None:
+            return
+
+        if self._get_row_count() >= self.max_rows or time.monotonic() - self._first_write >= self.max_delay:
+            self.flush()
+
+    def flush(self):
+        """Write all collected rows in a single transaction"""
+        if self._first_write is None:
+            return
+
+        row_count = self._get_row_count()
+        start = time.monotonic()
+        self.db.write_batch(self._prices, self._names, self._processed, self._notifications)
+        logger.debug("Wrote batch of {} rows in {:.3f} seconds".format(row_count, time.monotonic() - start))
+
+        self._prices, self._names, self._processed, self._notifications = [], [], [], []
+        self._first_write = None
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""One-off compaction of the price history. Before only price changes got recorded, every price check added a row -
+this removes the repeated prices and keeps one row per price change. It is safe to run while the bot is running.
+
+Run from the project root with: python -m database.compact_history [--vacuum]
+With --vacuum the database file is shrunk afterwards, which blocks the bot from writing until it is done.
+"""
+import logging
+import sys
+
+from database.db_wrapper import DBwrapper
+
+logger = logging.getLogger(__name__)
+
+
+def main(vacuum=False):
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    db = DBwrapper.get_instance()
+
+    price_count = db.get_product_pricecount() + db.get_wishlist_pricecount()
+    removed = db.compact_price_history()
+    logger.info("Removed {} of {} stored prices".format(removed, price_count))
+
+    if vacuum:
+        db.vacuum()
+        logger.info("Database file shrunk")
+
+
+if __name__ == "__main__":
+    main(vacuum="--vacuum" in sys.argv[1:])
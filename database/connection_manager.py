@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionManager(object):
+    """Hands out one sqlite connection per thread for reading and a single lock protected connection for writing.
+    The database runs in WAL mode, so readers never wait for the writer - interactive handlers are not blocked by the
+    writes of a sweep and two threads never share a cursor."""
+
+    def __init__(self, database_path, cache_size_kib=16384, mmap_size=64 * 1024 * 1024, timeout=10.0):
+        self.database_path = database_path
+        self.cache_size_kib = cache_size_kib
+        self.mmap_size = mmap_size
+        self.timeout = timeout
+
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._write_lock = threading.RLock()
+
+        self._writer = self._connect()
+        # The journal mode is stored in the database file, the other pragmas are set per connection
+        journal_mode = self._writer.execute("PRAGMA journal_mode = WAL;").fetchone()[0]
+        if journal_mode.lower() != "wal":
+            logger.warning("Could not enable WAL mode, the journal mode is '{}'".format(journal_mode))
+        self._writer_cursor = self._writer.cursor()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.database_path, timeout=self.timeout, check_same_thread=False)
+        connection.execute("PRAGMA foreign_keys = ON;")
+        # Safe in WAL mode - a crash of the bot never loses committed transactions, only a power loss might
+        connection.execute("PRAGMA synchronous = NORMAL;")
+        connection.execute("PRAGMA cache_size = -{};".format(int(self.cache_size_kib)))
+        connection.execute("PRAGMA mmap_size = {};".format(int(self.mmap_size)))
+        connection.text_factory = lambda x: str(x, 'utf-8', "ignore")
+
+        with self._connections_lock:
+            self._connections.append(connection)
+        return connection
+
+    def _is_writing(self):
+        return getattr(self._local, "write_depth", 0) > 0
+
+    def get_connection(self):
+        """Returns the writer connection inside of writing(), the connection of the current thread otherwise"""
+        if self._is_writing():
+            return self._writer
+
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._connect()
+            self._local.connection = connection
+            self._local.cursor = connection.cursor()
+        return connection
+
+    def get_cursor(self):
+        if self._is_writing():
+            return self._writer_cursor
+
+        self.get_connection()
+        return self._local.cursor
+
+    @contextmanager
+    def writing(self):
+        """Run the enclosed statements on the writer connection - one thread at a time. An unfinished transaction is
+        rolled back on errors and committed otherwise."""
+        with self._write_lock:
+            self._local.write_depth = getattr(self._local, "write_depth", 0) + 1
+            try:
+                yield self._writer_cursor
+            except BaseException:
+                if self._local.write_depth == 1 and self._writer.in_transaction:
+                    self._writer.rollback()
+                raise
+            else:
+                if self._local.write_depth == 1 and self._writer.in_transaction:
+                    self._writer.commit()
+            finally:
+                self._local.write_depth -= 1
+
+    def close_all(self):
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+
+        for connection in connections:
+            connection.close()
@@ -1,33 +1,60 @@
 # -*- coding: utf-8 -*-
+import functools
 import logging
 import os
 import sqlite3
 from datetime import datetime
 
 from bot.user import User
-from geizhals.entities import Product, Wishlist
+from database.connection_manager import ConnectionManager
+from geizhals.canonical import canonicalize, get_canonical_url
+from geizhals.entities import EntityType, Product, Wishlist
 
 __author__ = 'Rico'
 
 
+def _migration(version):
+    """Marks a DBwrapper method as the migration to the given database version - see migrate_db"""
+    def decorator(func):
+        func.migration_version = version
+        return func
+    return decorator
+
+
+def _writes(func):
+    """Run a DBwrapper method on the single writer connection"""
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with self.connections.writing():
+            return func(self, *args, **kwargs)
+    return wrapper
+
+
 class DBwrapper(object):
     class __DBwrapper(object):
         dir_path = os.path.dirname(os.path.abspath(__file__))
         logger = logging.getLogger(__name__)
+        # Entity table, price history table and id column of each entity type
+        entity_tables = {EntityType.WISHLIST: ("wishlists", "wishlist_prices", "wishlist_id"),
+                         EntityType.PRODUCT: ("products", "product_prices", "product_id")}
 
         def __init__(self, db_name="users.db"):
             database_path = os.path.join(self.dir_path, db_name)
 
-            self.connection = None
-            self.cursor = None
+            self.connections = None
 
             self.create_database(database_path)
             self.setup_connection(database_path)
             self.create_tables()
             self.migrate_db()
 
+        @_writes
         def delete_all_tables(self):
             self.logger.info("Dropping all tables!")
+            self.cursor.execute("DROP TABLE IF EXISTS pending_notifications;")
+            self.cursor.execute("DROP TABLE IF EXISTS sweep_entities;")
+            self.cursor.execute("DROP TABLE IF EXISTS sweeps;")
+            self.cursor.execute("DROP TABLE IF EXISTS leases;")
             self.cursor.execute("DROP TABLE IF EXISTS wishlist_subscribers;")
             self.cursor.execute("DROP TABLE IF EXISTS product_subscribers;")
             self.cursor.execute("DROP TABLE IF EXISTS wishlist_prices;")
@@ -48,6 +75,7 @@ class DBwrapper(object):
                     self.logger.error("An error has occurred while creating the database!")
                     self.logger.error(e)
 
+        @_writes
         def create_tables(self):
             """Creates all the tables of the database, if they don't exist"""
             version = int(self.cursor.execute("PRAGMA user_version").fetchone()[0])
@@ -104,29 +132,139 @@ class DBwrapper(object):
             self.cursor.execute("PRAGMA user_version = 1;")
             self.connection.commit()
 
+        def get_migrations(self):
+            """Returns all migration methods ordered by the database version they migrate to"""
+            migrations = [getattr(self, name) for name in dir(type(self)) if hasattr(getattr(type(self), name), "migration_version")]
+            return sorted(migrations, key=lambda migration: migration.migration_version)
+
+        @_writes
         def migrate_db(self):
-            """Run migrations, when there needs to be specific database changes, after the software is productive"""
+            """Run migrations, when there needs to be specific database changes, after the software is productive.
+            Each migration runs in its own transaction together with the update of the user_version."""
             version = int(self.cursor.execute("PRAGMA user_version").fetchone()[0])
             self.logger.info("Using geizhalsbot database version {}".format(version))
 
-            if version < 1:
-                # Migration 1
-                # Adding last_name and first_use variables to users table
-                self.logger.info("Running migration 0!")
-                self.cursor.execute("ALTER TABLE users ADD 'last_name' TEXT;")
-                self.cursor.execute("ALTER TABLE users ADD 'first_use' INTEGER NOT NULL DEFAULT 0;")
-                self.cursor.execute("PRAGMA user_version = 1;")
-                self.connection.commit()
-                self.logger.info("Migration 0 successfully executed!")
-            # if version < 2:
-                # Migration 2
-                # self.logger.info("Running migration 2!")
+            for migration in self.get_migrations():
+                if migration.migration_version <= version:
+                    continue
+
+                self.logger.info("Running migration {}: {}".format(migration.migration_version, migration.__doc__))
+                self.cursor.execute("BEGIN;")
+                try:
+                    migration()
+                    self.cursor.execute("PRAGMA user_version = {};".format(int(migration.migration_version)))
+                    self.connection.commit()
+                except sqlite3.Error:
+                    self.logger.error("Migration {} failed, rolling back!".format(migration.migration_version))
+                    self.connection.rollback()
+                    raise
+
+                self.logger.info("Migration {} successfully executed!".format(migration.migration_version))
+
+        @_migration(1)
+        def _migrate_user_columns(self):
+            """Adding last_name and first_use variables to users table"""
+            self.cursor.execute("ALTER TABLE users ADD 'last_name' TEXT;")
+            self.cursor.execute("ALTER TABLE users ADD 'first_use' INTEGER NOT NULL DEFAULT 0;")
+
+        @_migration(2)
+        def _migrate_canonical_urls(self):
+            """Store canonical urls, so that the same entity shared through different domains or slugs is equal"""
+            for table, id_column, entity_type in [("products", "product_id", EntityType.PRODUCT),
+                                                  ("wishlists", "wishlist_id", EntityType.WISHLIST)]:
+                for entity_id, url in self.cursor.execute("SELECT {}, url FROM {};".format(id_column, table)).fetchall():
+                    entity = canonicalize(url)
+                    if entity is None or entity.entity_type != entity_type:
+                        self.logger.warning("Can't canonicalize url '{}' of {} {}!".format(url, table, entity_id))
+                        continue
+
+                    canonical_url = get_canonical_url(entity_type, entity_id, entity.region)
+                    self.cursor.execute("UPDATE {} SET url=? WHERE {}=?;".format(table, id_column), [canonical_url, entity_id])
+
+        @_migration(3)
+        def _migrate_check_bookkeeping(self):
+            """Bookkeeping of the last check and the last price change of each entity for the scheduler"""
+            for table in ["products", "wishlists"]:
+                self.cursor.execute("ALTER TABLE {} ADD 'last_checked' INTEGER NOT NULL DEFAULT 0;".format(table))
+                self.cursor.execute("ALTER TABLE {} ADD 'last_changed' INTEGER NOT NULL DEFAULT 0;".format(table))
+
+        @_migration(4)
+        def _migrate_leases(self):
+            """Leases of the entities which are currently checked by one of the sweep workers"""
+            self.cursor.execute("CREATE TABLE IF NOT EXISTS 'leases' \
+                                       ('entity_type' INTEGER NOT NULL, \
+                                       'entity_id' INTEGER NOT NULL, \
+                                       'worker_id' TEXT NOT NULL, \
+                                       'expires' INTEGER NOT NULL, \
+                                       PRIMARY KEY('entity_type', 'entity_id'));")
+
+        @_migration(5)
+        def _migrate_sweeps_and_notifications(self):
+            """Progress of running sweeps and notifications which were not sent yet, so that both survive restarts"""
+            self.cursor.execute("CREATE TABLE IF NOT EXISTS 'sweeps' \
+                                       ('sweep_id' INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT, \
+                                       'worker_id' TEXT NOT NULL, \
+                                       'started' INTEGER NOT NULL);")
+
+            self.cursor.execute("CREATE TABLE IF NOT EXISTS 'sweep_entities' \
+                                       ('sweep_id' INTEGER NOT NULL, \
+                                       'entity_type' INTEGER NOT NULL, \
+                                       'entity_id' INTEGER NOT NULL, \
+                                       'processed' INTEGER NOT NULL DEFAULT 0, \
+                                       PRIMARY KEY('sweep_id', 'entity_type', 'entity_id'), \
+                                       FOREIGN KEY('sweep_id') REFERENCES sweeps(sweep_id) ON DELETE CASCADE);")
+
+            self.cursor.execute("CREATE TABLE IF NOT EXISTS 'pending_notifications' \
+                                       ('notification_id' INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT, \
+                                       'user_id' INTEGER NOT NULL, \
+                                       'entity_type' INTEGER NOT NULL, \
+                                       'entity_id' INTEGER NOT NULL, \
+                                       'old_price' REAL NOT NULL, \
+                                       'new_price' REAL NOT NULL, \
+                                       'created' INTEGER NOT NULL, \
+                                       FOREIGN KEY('user_id') REFERENCES users(user_id) ON DELETE CASCADE);")
+
+        @_migration(6)
+        def _migrate_indexes(self):
+            """Indexes for the price history and the subscriptions of a user, unique subscriptions"""
+            for table, id_column in [("wishlist_subscribers", "wishlist_id"), ("product_subscribers", "product_id")]:
+                # Duplicate subscriptions would make the unique index fail
+                self.cursor.execute("DELETE FROM {table} WHERE rowid NOT IN "
+                                    "(SELECT MIN(rowid) FROM {table} GROUP BY {id}, user_id);".format(table=table, id=id_column))
+                self.cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS 'idx_{table}_entity_user' ON {table} ({id}, user_id);".format(table=table, id=id_column))
+                self.cursor.execute("CREATE INDEX IF NOT EXISTS 'idx_{table}_user' ON {table} (user_id, {id});".format(table=table, id=id_column))
+
+            for table, id_column in [("wishlist_prices", "wishlist_id"), ("product_prices", "product_id")]:
+                self.cursor.execute("CREATE INDEX IF NOT EXISTS 'idx_{table}_entity_timestamp' ON {table} ({id}, timestamp);".format(table=table, id=id_column))
+
+        @_migration(7)
+        def _migrate_price_last_seen(self):
+            """Store when a price was seen the last time, so unchanged prices don't need a new row"""
+            for table in ["wishlist_prices", "product_prices"]:
+                self.cursor.execute("ALTER TABLE {} ADD COLUMN 'last_seen' INTEGER NOT NULL DEFAULT 0;".format(table))
+                self.cursor.execute("UPDATE {} SET last_seen=timestamp;".format(table))
+
+        @_migration(8)
+        def _migrate_notification_claims(self):
+            """Claims of pending notifications, so that only one worker sends them"""
+            self.cursor.execute("ALTER TABLE pending_notifications ADD COLUMN 'claimed_by' TEXT;")
+            self.cursor.execute("ALTER TABLE pending_notifications ADD COLUMN 'claimed_until' INTEGER NOT NULL DEFAULT 0;")
+
+        # New migrations are added as methods decorated with @_migration(<next version>)
 
         def setup_connection(self, database_path):
-            self.connection = sqlite3.connect(database_path, check_same_thread=False)
-            self.connection.execute("PRAGMA foreign_keys = ON;")
-            self.connection.text_factory = lambda x: str(x, 'utf-8', "ignore")
-            self.cursor = self.connection.cursor()
+            if self.connections is not None:
+                self.connections.close_all()
+            self.connections = ConnectionManager(database_path)
+
+        @property
+        def connection(self):
+            """The connection of the current thread - or the writer connection within write methods"""
+            return self.connections.get_connection()
+
+        @property
+        def cursor(self):
+            return self.connections.get_cursor()
 
         def get_subscribed_wishlist_count(self, user_id):
             self.cursor.execute("SELECT COUNT(*) "
@@ -219,36 +357,50 @@ class DBwrapper(object):
             result = self.cursor.fetchone()[0]
             return result > 0
 
+        @_writes
         def add_wishlist(self, wishlist_id, name, price, url):
             self.cursor.execute("INSERT INTO wishlists (wishlist_id, name, price, url) VALUES (?, ?, ?, ?);",
                                 [str(wishlist_id), str(name), str(price), str(url)])
             self.connection.commit()
 
+        @_writes
         def add_product(self, product_id, name, price, url):
             self.cursor.execute("INSERT INTO products (product_id, name, price, url) VALUES (?, ?, ?, ?);",
                                 [str(product_id), str(name), str(price), str(url)])
             self.connection.commit()
 
+        @_writes
         def rm_wishlist(self, wishlist_id):
             self.cursor.execute("DELETE FROM wishlists WHERE wishlists.wishlist_id=?", [str(wishlist_id)])
             self.connection.commit()
 
+        @_writes
         def rm_product(self, product_id):
             self.cursor.execute("DELETE FROM products WHERE products.product_id=?", [str(product_id)])
             self.connection.commit()
 
+        @_writes
         def subscribe_wishlist(self, wishlist_id, user_id):
-            self.cursor.execute("INSERT INTO wishlist_subscribers (wishlist_id, user_id) VALUES (?, ?);", [str(wishlist_id), str(user_id)])
+            """Subscribe a user to a wishlist - returns False if the user already subscribed to it"""
+            self.cursor.execute("INSERT OR IGNORE INTO wishlist_subscribers (wishlist_id, user_id) VALUES (?, ?);", [str(wishlist_id), str(user_id)])
+            subscribed = self.cursor.rowcount > 0
             self.connection.commit()
+            return subscribed
 
+        @_writes
         def subscribe_product(self, product_id, user_id):
-            self.cursor.execute("INSERT INTO product_subscribers (product_id, user_id) VALUES (?, ?);", [str(product_id), str(user_id)])
+            """Subscribe a user to a product - returns False if the user already subscribed to it"""
+            self.cursor.execute("INSERT OR IGNORE INTO product_subscribers (product_id, user_id) VALUES (?, ?);", [str(product_id), str(user_id)])
+            subscribed = self.cursor.rowcount > 0
             self.connection.commit()
+            return subscribed
 
+        @_writes
         def unsubscribe_wishlist(self, user_id, wishlist_id):
             self.cursor.execute("DELETE FROM wishlist_subscribers WHERE user_id=? and wishlist_id=?;", [str(user_id), str(wishlist_id)])
             self.connection.commit()
 
+        @_writes
         def unsubscribe_product(self, user_id, product_id):
             self.cursor.execute("DELETE FROM product_subscribers WHERE user_id=? and product_id=?;", [str(user_id), str(product_id)])
             self.connection.commit()
@@ -287,6 +439,33 @@ class DBwrapper(object):
 
             return user_ids
 
+        def get_subscribers(self, entities, chunk_size=400):
+            """Returns a dict mapping (entity_type, entity_id) tuples to the User objects of their subscribers.
+            The subscribers of all given entities are loaded with a single query per chunk_size entities - SQLite limits
+            the number of variables per query."""
+            entities = list(entities)
+            subscribers = {}
+
+            for start in range(0, len(entities), chunk_size):
+                chunk = entities[start:start + chunk_size]
+                wishlist_ids = [entity_id for entity_type, entity_id in chunk if entity_type == EntityType.WISHLIST]
+                product_ids = [entity_id for entity_type, entity_id in chunk if entity_type == EntityType.PRODUCT]
+
+                self.cursor.execute("SELECT ?, ws.wishlist_id, u.user_id, u.first_name, u.last_name, u.username, u.lang_code "
+                                    "FROM wishlist_subscribers ws INNER JOIN users u ON u.user_id=ws.user_id "
+                                    "WHERE ws.wishlist_id IN ({}) "
+                                    "UNION ALL "
+                                    "SELECT ?, ps.product_id, u.user_id, u.first_name, u.last_name, u.username, u.lang_code "
+                                    "FROM product_subscribers ps INNER JOIN users u ON u.user_id=ps.user_id "
+                                    "WHERE ps.product_id IN ({});".format(",".join("?" * len(wishlist_ids)), ",".join("?" * len(product_ids))),
+                                    [EntityType.WISHLIST.value] + wishlist_ids + [EntityType.PRODUCT.value] + product_ids)
+
+                for line in self.cursor.fetchall():
+                    user = User(user_id=line[2], first_name=line[3], last_name=line[4], username=line[5], lang_code=line[6])
+                    subscribers.setdefault((EntityType(line[0]), line[1]), []).append(user)
+
+            return subscribers
+
         def get_wishlists_for_user(self, user_id):
             """Return all wishlists a user subscribed to"""
             self.cursor.execute(
@@ -327,59 +506,260 @@ class DBwrapper(object):
             result = self.cursor.fetchone()
             return result and len(result) > 0
 
+        @_writes
         def update_wishlist_name(self, wishlist_id, name):
             self.cursor.execute("UPDATE wishlists SET name=? WHERE wishlist_id=?;", [str(name), str(wishlist_id)])
             self.connection.commit()
 
+        @_writes
         def update_product_name(self, product_id, name):
             self.cursor.execute("UPDATE products SET name=? WHERE product_id=?;", [str(name), str(product_id)])
             self.connection.commit()
 
+        def _store_prices(self, entity_type, prices):
+            """Update the price and check bookkeeping of entities from (entity_id, price, timestamp) tuples. The price
+            history only gets a new row if the price differs from the latest one, otherwise its last_seen is updated.
+            Must be called from a write method."""
+            table, price_table, id_column = self.entity_tables[entity_type]
+            prices = [(entity_id, float(price), timestamp) for entity_id, price, timestamp in prices]
+            latest_row = "SELECT rowid FROM {price_table} WHERE {id}=?1 ORDER BY timestamp DESC, rowid DESC LIMIT 1".format(price_table=price_table, id=id_column)
+
+            # The right hand sides refer to the row before the update, so last_changed is only set if the price differs
+            self.cursor.executemany("UPDATE {table} SET last_changed=CASE WHEN price!=?2 THEN ?3 ELSE last_changed END, price=?2, "
+                                    "last_checked=?3 WHERE {id}=?1;".format(table=table, id=id_column), prices)
+            self.cursor.executemany("UPDATE {price_table} SET last_seen=MAX(last_seen, ?3) "
+                                    "WHERE rowid=({latest_row}) AND price=?2;".format(price_table=price_table, latest_row=latest_row), prices)
+            self.cursor.executemany("INSERT INTO {price_table} ({id}, price, timestamp, last_seen) SELECT ?1, ?2, ?3, ?3 "
+                                    "WHERE EXISTS (SELECT 1 FROM {table} WHERE {id}=?1) "
+                                    "AND (SELECT price FROM {price_table} WHERE rowid=({latest_row})) IS NOT ?2;".format(price_table=price_table, table=table,
+                                                                                                                         id=id_column, latest_row=latest_row),
+                                    prices)
+
+        @_writes
         def update_wishlist_price(self, wishlist_id, price):
-            """Update the price of a wishlist in the database and add a price entry in the wishlist_prices table"""
-            self.cursor.execute("UPDATE wishlists SET price=? WHERE wishlist_id=?;", [str(price), str(wishlist_id)])
-            try:
-                utc_timestamp_now = int(datetime.utcnow().timestamp())
-                self.cursor.execute("INSERT INTO wishlist_prices (wishlist_id, price, timestamp) VALUES (?, ?, ?)", [str(wishlist_id), str(price), str(utc_timestamp_now)])
-            except sqlite3.IntegrityError:
-                self.logger.error("Insert into wishlist_prices not possible: {}, {}".format(wishlist_id, price))
+            """Update the price of a wishlist in the database and record it in the wishlist_prices table"""
+            utc_timestamp_now = int(datetime.utcnow().timestamp())
+            self._store_prices(EntityType.WISHLIST, [(wishlist_id, price, utc_timestamp_now)])
             self.connection.commit()
 
+        @_writes
         def update_product_price(self, product_id, price):
-            """Update the price of a product in the database and add a price entry in the product_prices table"""
-            self.cursor.execute("UPDATE products SET price=? WHERE product_id=?;", [str(price), str(product_id)])
+            """Update the price of a product in the database and record it in the product_prices table"""
+            utc_timestamp_now = int(datetime.utcnow().timestamp())
+            self._store_prices(EntityType.PRODUCT, [(product_id, price, utc_timestamp_now)])
+            self.connection.commit()
+
+        @_writes
+        def write_batch(self, prices=(), names=(), processed=(), notifications=()):
+            """Store the results of many price checks in a single transaction. Takes lists of
+            (entity_type, entity_id, price, timestamp), (entity_type, entity_id, name), (sweep_id, entity_type, entity_id) and
+            (user_id, entity_type, entity_id, old_price, new_price, created) tuples. Rows of entities and users which were
+            removed in the meantime are skipped."""
             try:
-                utc_timestamp_now = int(datetime.utcnow().timestamp())
-                self.cursor.execute("INSERT INTO product_prices (product_id, price, timestamp) VALUES (?, ?, ?)", [str(product_id), str(price), str(utc_timestamp_now)])
-            except sqlite3.IntegrityError:
-                self.logger.error("Insert into product_prices not possible: {}, {}".format(product_id, price))
+                for entity_type, (table, price_table, id_column) in self.entity_tables.items():
+                    type_names = [(str(name), entity_id) for e_type, entity_id, name in names if e_type == entity_type]
+                    self.cursor.executemany("UPDATE {} SET name=? WHERE {}=?;".format(table, id_column), type_names)
+
+                    self._store_prices(entity_type, [(entity_id, price, timestamp) for e_type, entity_id, price, timestamp in prices if e_type == entity_type])
+
+                self.cursor.executemany("UPDATE sweep_entities SET processed=1 WHERE sweep_id=? AND entity_type=? AND entity_id=?;",
+                                        [(sweep_id, entity_type.value, entity_id) for sweep_id, entity_type, entity_id in processed])
+                self.cursor.executemany("INSERT INTO pending_notifications (user_id, entity_type, entity_id, old_price, new_price, created) "
+                                        "SELECT ?1, ?2, ?3, ?4, ?5, ?6 WHERE EXISTS (SELECT 1 FROM users WHERE user_id=?1);",
+                                        [(user_id, entity_type.value, entity_id, old_price, new_price, created)
+                                         for user_id, entity_type, entity_id, old_price, new_price, created in notifications])
+                self.connection.commit()
+            except sqlite3.Error:
+                self.connection.rollback()
+                raise
+
+        def get_wishlist_last_update(self, wishlist_id):
+            """Returns the timestamp when the price of a wishlist was seen the last time or None if there is no price yet"""
+            self.cursor.execute("SELECT MAX(last_seen) FROM wishlist_prices WHERE wishlist_id=?;", [str(wishlist_id)])
+            return self.cursor.fetchone()[0]
+
+        def get_product_last_update(self, product_id):
+            """Returns the timestamp when the price of a product was seen the last time or None if there is no price yet"""
+            self.cursor.execute("SELECT MAX(last_seen) FROM product_prices WHERE product_id=?;", [str(product_id)])
+            return self.cursor.fetchone()[0]
+
+        def get_wishlist_check_stats(self):
+            """Returns all wishlists with subscribers along with their last_checked, last_changed and subscriber count"""
+            self.cursor.execute("SELECT w.wishlist_id, w.name, w.price, w.url, w.last_checked, w.last_changed, "
+                                "(SELECT COUNT(*) FROM wishlist_subscribers ws WHERE ws.wishlist_id=w.wishlist_id) "
+                                "FROM wishlists w "
+                                "WHERE EXISTS (SELECT 1 FROM wishlist_subscribers ws WHERE ws.wishlist_id=w.wishlist_id);")
+
+            return [(Wishlist(entity_id=line[0], name=line[1], price=line[2], url=line[3]), line[4], line[5], line[6])
+                    for line in self.cursor.fetchall()]
+
+        def get_product_check_stats(self):
+            """Returns all products with subscribers along with their last_checked, last_changed and subscriber count"""
+            self.cursor.execute("SELECT p.product_id, p.name, p.price, p.url, p.last_checked, p.last_changed, "
+                                "(SELECT COUNT(*) FROM product_subscribers ps WHERE ps.product_id=p.product_id) "
+                                "FROM products p "
+                                "WHERE EXISTS (SELECT 1 FROM product_subscribers ps WHERE ps.product_id=p.product_id);")
+
+            return [(Product(entity_id=line[0], name=line[1], price=line[2], url=line[3]), line[4], line[5], line[6])
+                    for line in self.cursor.fetchall()]
+
+        def get_price_change_counts(self, entity_type, entity_ids, since, chunk_size=400):
+            """Returns a dict mapping the given entity ids to the number of price changes since the given timestamp.
+            The history is read with a single query per chunk_size entities - SQLite limits the number of variables per query."""
+            _, price_table, id_column = self.entity_tables[entity_type]
+            entity_ids = list(entity_ids)
+            change_counts = {entity_id: 0 for entity_id in entity_ids}
+
+            for start in range(0, len(entity_ids), chunk_size):
+                chunk = entity_ids[start:start + chunk_size]
+                # Prices which differ from the previous one - the history of old versions repeats unchanged prices
+                self.cursor.execute("SELECT pt.{id}, COUNT(*) FROM {price_table} pt WHERE pt.{id} IN ({ids}) AND pt.timestamp>=? AND "
+                                    "(SELECT prev.price FROM {price_table} prev WHERE prev.{id}=pt.{id} AND prev.timestamp<pt.timestamp "
+                                    "ORDER BY prev.timestamp DESC LIMIT 1)!=pt.price "
+                                    "GROUP BY pt.{id};".format(id=id_column, price_table=price_table, ids=",".join("?" * len(chunk))),
+                                    chunk + [since])
+
+                for entity_id, change_count in self.cursor.fetchall():
+                    change_counts[entity_id] = change_count
+
+            return change_counts
+
+        @_writes
+        def claim_leases(self, worker_id, entities, lease_time):
+            """Claim leases for a batch of (entity_type, entity_id, last_checked) tuples in a single transaction.
+            An entity is only claimed if no other worker holds an unexpired lease for it and it was not checked since
+            last_checked. Returns the (entity_type, entity_id) tuples which were claimed."""
+            utc_timestamp_now = int(datetime.utcnow().timestamp())
+            claimed = []
+
+            if self.connection.in_transaction:
+                self.connection.commit()
+
+            # Take the write lock right away, so that no other process can claim entities in between
+            self.cursor.execute("BEGIN IMMEDIATE;")
+            try:
+                # Leases of crashed workers expire and can be claimed again
+                self.cursor.execute("DELETE FROM leases WHERE expires<=?;", [utc_timestamp_now])
+
+                for entity_type, entity_id, last_checked in entities:
+                    if entity_type == EntityType.WISHLIST:
+                        query = "SELECT last_checked FROM wishlists WHERE wishlist_id=?;"
+                    elif entity_type == EntityType.PRODUCT:
+                        query = "SELECT last_checked FROM products WHERE product_id=?;"
+                    else:
+                        raise ValueError("Unknown EntityType")
+
+                    result = self.cursor.execute(query, [entity_id]).fetchone()
+                    if result is None or result[0] != last_checked:
+                        continue
+
+                    self.cursor.execute("INSERT OR IGNORE INTO leases (entity_type, entity_id, worker_id, expires) VALUES (?, ?, ?, ?);",
+                                        [entity_type.value, entity_id, worker_id, utc_timestamp_now + lease_time])
+                    if self.cursor.rowcount == 1:
+                        claimed.append((entity_type, entity_id))
+
+                self.connection.commit()
+            except Exception:
+                self.connection.rollback()
+                raise
+
+            return claimed
+
+        @_writes
+        def release_leases(self, worker_id, entities):
+            """Release the leases of a worker for a list of (entity_type, entity_id) tuples"""
+            self.cursor.executemany("DELETE FROM leases WHERE worker_id=? AND entity_type=? AND entity_id=?;",
+                                    [(worker_id, entity_type.value, entity_id) for entity_type, entity_id in entities])
             self.connection.commit()
 
-        def get_product_price_history(self, product_id, weeks):
-            """Returns a sorted list of prices and timestamps when those prices got seen"""
+        @_writes
+        def start_sweep(self, worker_id, entities):
+            """Store a new sweep over a list of (entity_type, entity_id) tuples and return its id"""
+            utc_timestamp_now = int(datetime.utcnow().timestamp())
+            self.cursor.execute("INSERT INTO sweeps (worker_id, started) VALUES (?, ?);", [worker_id, utc_timestamp_now])
+            sweep_id = self.cursor.lastrowid
+            self.cursor.executemany("INSERT OR IGNORE INTO sweep_entities (sweep_id, entity_type, entity_id) VALUES (?, ?, ?);",
+                                    [(sweep_id, entity_type.value, entity_id) for entity_type, entity_id in entities])
+            self.connection.commit()
+            return sweep_id
+
+        @_writes
+        def finish_sweep(self, sweep_id):
+            """Remove a sweep - only unfinished sweeps are kept in the database"""
+            self.cursor.execute("DELETE FROM sweeps WHERE sweep_id=?;", [sweep_id])
+            self.connection.commit()
+
+        def get_unfinished_sweeps(self, worker_id, started_before):
+            """Returns the ids of the unfinished sweeps of a worker and of all sweeps started before the given timestamp"""
+            self.cursor.execute("SELECT sweep_id FROM sweeps WHERE worker_id=? OR started<? ORDER BY sweep_id;", [worker_id, started_before])
+            return [line[0] for line in self.cursor.fetchall()]
+
+        def get_unprocessed_sweep_entities(self, sweep_id):
+            """Returns the (entity_type, entity_id) tuples of a sweep which were not processed yet"""
+            self.cursor.execute("SELECT entity_type, entity_id FROM sweep_entities WHERE sweep_id=? AND processed=0;", [sweep_id])
+            return [(EntityType(line[0]), line[1]) for line in self.cursor.fetchall()]
+
+        @_writes
+        def claim_pending_notifications(self, worker_id, claim_time):
+            """Claim all pending notifications which are not claimed by another worker in a single transaction.
+            Returns (notification_id, user_id, entity_type, entity_id, old_price, new_price) tuples of the claimed ones."""
+            utc_timestamp_now = int(datetime.utcnow().timestamp())
+
+            if self.connection.in_transaction:
+                self.connection.commit()
+
+            # Take the write lock right away, so that no other process can claim the same notifications in between
+            self.cursor.execute("BEGIN IMMEDIATE;")
+            try:
+                # Claims of crashed workers expire and the notifications can be claimed again
+                self.cursor.execute("UPDATE pending_notifications SET claimed_by=?1, claimed_until=?2 "
+                                    "WHERE claimed_by=?1 OR claimed_until<=?3;", [worker_id, utc_timestamp_now + claim_time, utc_timestamp_now])
+                self.cursor.execute("SELECT notification_id, user_id, entity_type, entity_id, old_price, new_price "
+                                    "FROM pending_notifications WHERE claimed_by=? ORDER BY notification_id;", [worker_id])
+                notifications = [(line[0], line[1], EntityType(line[2]), line[3], line[4], line[5]) for line in self.cursor.fetchall()]
+                self.connection.commit()
+            except Exception:
+                self.connection.rollback()
+                raise
+
+            return notifications
+
+        @_writes
+        def rm_pending_notification(self, notification_id):
+            self.cursor.execute("DELETE FROM pending_notifications WHERE notification_id=?;", [notification_id])
+            self.connection.commit()
+
+        def _get_price_history(self, entity_type, entity_id, weeks):
+            """Returns (price, timestamp, name) tuples of the last weeks, newest first. Unchanged prices are only stored
+            once, so they are returned for every day they were seen - otherwise the charts would miss flat segments."""
+            table, price_table, id_column = self.entity_tables[entity_type]
             utc_timestamp_now = int(datetime.utcnow().timestamp())
             week_in_seconds = (60 * 60 * 24 * 7 * weeks)
             utc_timestamp_last_week = utc_timestamp_now - week_in_seconds
-            self.cursor.execute("SELECT product_prices.price, product_prices.timestamp, products.name from product_prices \
-                                 INNER JOIN products \
-                                 ON product_prices.product_id=products.product_id \
-                                 WHERE product_prices.product_id=? AND product_prices.timestamp>? \
-                                 ORDER BY product_prices.timestamp DESC", [str(product_id), str(utc_timestamp_last_week)])
-            results = self.cursor.fetchall()
+            self.cursor.execute("SELECT {price_table}.price, {price_table}.timestamp, {price_table}.last_seen, {table}.name from {price_table} \
+                                 INNER JOIN {table} \
+                                 ON {price_table}.{id}={table}.{id} \
+                                 WHERE {price_table}.{id}=? AND {price_table}.last_seen>? \
+                                 ORDER BY {price_table}.timestamp DESC".format(price_table=price_table, table=table, id=id_column),
+                                [str(entity_id), str(utc_timestamp_last_week)])
+
+            results = []
+            for price, timestamp, last_seen, name in self.cursor.fetchall():
+                first_seen = max(timestamp, utc_timestamp_last_week)
+                seen = last_seen
+                while seen > first_seen:
+                    results.append((price, seen, name))
+                    seen -= 60 * 60 * 24
+                results.append((price, first_seen, name))
             return results
 
+        def get_product_price_history(self, product_id, weeks):
+            """Returns a sorted list of prices and timestamps when those prices got seen"""
+            return self._get_price_history(EntityType.PRODUCT, product_id, weeks)
+
         def get_wishlist_price_history(self, wishlist_id, weeks):
             """Returns a sorted list of prices and timestamps when those prices got seen"""
-            utc_timestamp_now = int(datetime.utcnow().timestamp())
-            week_in_seconds = (60 * 60 * 24 * 7 * weeks)
-            utc_timestamp_last_week = utc_timestamp_now - week_in_seconds
-            self.cursor.execute("SELECT wishlist_prices.price, wishlist_prices.timestamp, wishlists.name from wishlist_prices \
-                                 INNER JOIN wishlists \
-                                 ON wishlist_prices.wishlist_id=wishlists.wishlist_id \
-                                 WHERE wishlist_prices.wishlist_id=? AND wishlist_prices.timestamp>? \
-                                 ORDER BY wishlist_prices.timestamp DESC", [str(wishlist_id), str(utc_timestamp_last_week)])
-            results = self.cursor.fetchall()
-            return results
+            return self._get_price_history(EntityType.WISHLIST, wishlist_id, weeks)
 
         def get_wishlist_pricecount(self):
             """Returns the amount of stored prices"""
@@ -395,6 +775,50 @@ class DBwrapper(object):
 
             return result
 
+        def compact_price_history(self, chunk_size=100):
+            """Remove the repeated prices from the history which was stored before only price changes got recorded. The
+            remaining row of each run of equal prices gets the last_seen of the whole run. Every chunk of entities is
+            compacted in its own immediate transaction, so the bot can keep running. Returns the number of removed rows."""
+            removed = 0
+            for _, price_table, id_column in self.entity_tables.values():
+                table_removed = 0
+                self.cursor.execute("SELECT DISTINCT {id} FROM {price_table};".format(id=id_column, price_table=price_table))
+                entity_ids = [line[0] for line in self.cursor.fetchall()]
+
+                for start in range(0, len(entity_ids), chunk_size):
+                    with self.connections.writing():
+                        if self.connection.in_transaction:
+                            self.connection.commit()
+
+                        # Other processes must not update last_seen between reading the rows and deleting them
+                        self.cursor.execute("BEGIN IMMEDIATE;")
+                        duplicates, merged_runs = [], {}
+                        for entity_id in entity_ids[start:start + chunk_size]:
+                            self.cursor.execute("SELECT rowid, price, last_seen FROM {price_table} WHERE {id}=? "
+                                                "ORDER BY timestamp, rowid;".format(price_table=price_table, id=id_column), [entity_id])
+                            run = None
+                            for rowid, price, last_seen in self.cursor.fetchall():
+                                if run is not None and run[1] == price:
+                                    duplicates.append((rowid,))
+                                    run[2] = max(run[2], last_seen)
+                                    merged_runs[run[0]] = run
+                                else:
+                                    run = [rowid, price, last_seen]
+
+                        self.cursor.executemany("DELETE FROM {} WHERE rowid=?;".format(price_table), duplicates)
+                        self.cursor.executemany("UPDATE {} SET last_seen=? WHERE rowid=?;".format(price_table),
+                                                [(last_seen, rowid) for rowid, _, last_seen in merged_runs.values()])
+                        table_removed += len(duplicates)
+
+                self.logger.info("Removed {} repeated prices from {}".format(table_removed, price_table))
+                removed += table_removed
+            return removed
+
+        @_writes
+        def vacuum(self):
+            """Rebuild the database file to give the space of deleted rows back - blocks all writes while running"""
+            self.cursor.execute("VACUUM;")
+
         def get_all_users(self):
             self.cursor.execute("SELECT user_id, first_name, username, lang_code FROM users;")
             result = self.cursor.fetchall()
@@ -425,6 +849,7 @@ class DBwrapper(object):
             else:
                 return "en"
 
+        @_writes
         def add_user(self, user_id, first_name, last_name, username, lang_code="de-DE"):
             lang_code = lang_code or "de-DE"
             first_use = int(datetime.utcnow().timestamp())
@@ -436,6 +861,7 @@ class DBwrapper(object):
                 # print("User already exists")
                 pass
 
+        @_writes
         def delete_user(self, user_id):
             """Delete a user and remove its subscriptions from the database"""
             try:
@@ -454,7 +880,7 @@ class DBwrapper(object):
             return False
 
         def close_conn(self):
-            self.connection.close()
+            self.connections.close_all()
 
     instance = None
 
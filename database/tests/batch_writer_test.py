@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+import sqlite3
+import time
+import unittest
+
+from database.batch_writer import BatchWriter
+from geizhals.entities import EntityType
+
+
+class DBMock(object):
+
+    def __init__(self, error=None):
+        self.batches = []
+        self.error = error
+
+    def write_batch(self, prices=(), names=(), processed=(), notifications=()):
+        if self.error is not None:
+            raise self.error
+        self.batches.append((list(prices), list(names), list(processed), list(notifications)))
+
+
+class BatchWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = DBMock()
+        self.writer = BatchWriter(self.db, max_rows=6, max_delay=60)
+
+    def tearDown(self):
+        del self.writer
+
+    def helper_write_entity(self, entity_id):
+        self.writer.update_price(EntityType.PRODUCT, entity_id, 9.99)
+        self.writer.add_notifications([1, 2], EntityType.PRODUCT, entity_id, 10.99, 9.99)
+        self.writer.mark_processed(1, EntityType.PRODUCT, entity_id)
+
+    def test_flush_max_rows(self):
+        """Test to check if full batches are written, but only between two entities"""
+        self.helper_write_entity(1)
+        self.writer.flush_if_needed()
+        self.assertEqual([], self.db.batches)
+
+        self.helper_write_entity(2)
+        self.writer.flush_if_needed()
+        self.assertEqual(1, len(self.db.batches))
+
+        prices, names, processed, notifications = self.db.batches[0]
+        self.assertEqual([1, 2], [entity_id for _, entity_id, _, _ in prices])
+        self.assertEqual(4, len(notifications))
+        self.assertEqual([(1, EntityType.PRODUCT, 1), (1, EntityType.PRODUCT, 2)], processed)
+
+        # Nothing left to write
+        self.writer.flush()
+        self.assertEqual(1, len(self.db.batches))
+
+    def test_flush_max_delay(self):
+        """Test to check if small batches are written after max_delay"""
+        writer = BatchWriter(self.db, max_rows=100, max_delay=0.1)
+        writer.update_name(EntityType.WISHLIST, 1, "Name")
+        writer.flush_if_needed()
+        self.assertEqual([], self.db.batches)
+
+        time.sleep(0.15)
+        writer.flush_if_needed()
+        self.assertEqual([([], [(EntityType.WISHLIST, 1, "Name")], [], [])], self.db.batches)
+
+    def test_context_manager(self):
+        """Test to check if the remaining rows are written when the context is left - even after an exception"""
+        with self.assertRaises(ValueError):
+            with self.writer as writer:
+                self.helper_write_entity(1)
+                raise ValueError("Sweep failed")
+
+        self.assertEqual(1, len(self.db.batches))
+
+    def test_context_manager_flush_error(self):
+        """Test to check if a failing flush does not replace the exception of the sweep"""
+        writer = BatchWriter(DBMock(error=sqlite3.OperationalError("database is locked")))
+        with self.assertRaises(ValueError):
+            with writer:
+                writer.update_price(EntityType.PRODUCT, 1, 9.99)
+                raise ValueError("Sweep failed")
+
+        # Without an exception of the sweep, the flush error is raised
+        with self.assertRaises(sqlite3.OperationalError):
+            with writer:
+                writer.update_price(EntityType.PRODUCT, 1, 9.99)
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from database.connection_manager import ConnectionManager
+
+
+class ConnectionManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.manager = ConnectionManager(os.path.join(self.dir.name, "test.db"))
+        with self.manager.writing() as cursor:
+            cursor.execute("CREATE TABLE prices (price REAL);")
+
+    def tearDown(self):
+        self.manager.close_all()
+        self.dir.cleanup()
+
+    def helper_run_in_thread(self, func):
+        result = []
+        thread = threading.Thread(target=lambda: result.append(func()))
+        thread.start()
+        thread.join(5)
+        return result[0]
+
+    def test_wal_mode(self):
+        """Test to check if the database runs in WAL mode"""
+        self.assertEqual("wal", self.manager.get_cursor().execute("PRAGMA journal_mode;").fetchone()[0])
+        self.assertEqual(1, self.manager.get_cursor().execute("PRAGMA foreign_keys;").fetchone()[0])
+
+    def test_connection_per_thread(self):
+        """Test to check if each thread gets its own connection and the writer is only used within writing()"""
+        connection = self.manager.get_connection()
+        self.assertIs(connection, self.manager.get_connection())
+        self.assertIsNot(connection, self.helper_run_in_thread(self.manager.get_connection))
+
+        with self.manager.writing():
+            self.assertIsNot(connection, self.manager.get_connection())
+
+    def test_readers_not_blocked(self):
+        """Test to check if reads don't wait for a running write transaction"""
+        write_started = threading.Event()
+        finish_write = threading.Event()
+
+        def write():
+            with self.manager.writing() as cursor:
+                cursor.execute("INSERT INTO prices VALUES (1.0);")
+                write_started.set()
+                finish_write.wait(5)
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        write_started.wait(5)
+
+        start = time.monotonic()
+        count = self.manager.get_cursor().execute("SELECT COUNT(*) FROM prices;").fetchone()[0]
+        self.assertLess(time.monotonic() - start, 1)
+        # The uncommitted row is not visible yet
+        self.assertEqual(0, count)
+
+        finish_write.set()
+        writer.join(5)
+        self.assertEqual(1, self.manager.get_cursor().execute("SELECT COUNT(*) FROM prices;").fetchone()[0])
+
+    def test_writing_rollback(self):
+        """Test to check if failed writes are rolled back and writes are committed otherwise"""
+        with self.assertRaises(ValueError):
+            with self.manager.writing() as cursor:
+                cursor.execute("INSERT INTO prices VALUES (1.0);")
+                raise ValueError("Write failed")
+
+        with self.manager.writing() as cursor:
+            cursor.execute("INSERT INTO prices VALUES (2.0);")
+            # Nested writes run within the same transaction
+            with self.manager.writing() as nested_cursor:
+                nested_cursor.execute("INSERT INTO prices VALUES (3.0);")
+
+        prices = self.manager.get_cursor().execute("SELECT price FROM prices ORDER BY price;").fetchall()
+        self.assertEqual([(2.0,), (3.0,)], prices)
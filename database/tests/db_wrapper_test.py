@@ -1,10 +1,12 @@
 # -*- coding: utf-8 -*-
 
 import os
+import sqlite3
 import unittest
+from datetime import datetime
 
 from database.db_wrapper import DBwrapper
-from geizhals.entities import Product, Wishlist
+from geizhals.entities import EntityType, Product, Wishlist
 
 
 class DBWrapperTest(unittest.TestCase):
@@ -76,6 +78,105 @@ class DBWrapperTest(unittest.TestCase):
             result = self.db.cursor.execute("SELECT count(*) FROM sqlite_master WHERE type='table' AND name=?;", [table_name]).fetchone()[0]
             self.assertEqual(result, 1, msg="Table '{}' does not exist!".format(table_name))
 
+    def test_migrate_db_canonical_urls(self):
+        """Test to check if migration 2 rewrites the stored urls to canonical urls"""
+        # Recreate the tables of database version 1
+        self.db.delete_all_tables()
+        self.db.cursor.execute("PRAGMA user_version = 0;")
+        self.db.create_tables()
+
+        self.db.add_product(903248, "Product", 9.99, "https://www.geizhals.at/seagate-desktop-hdd-4tb-st4000dm000-a903248.html?hloc=at")
+        self.db.add_product(1564497, "Product", 9.99, "https://geizhals.de/a1564497.html")
+        self.db.add_product(1, "Product", 9.99, "invalid")
+        self.db.add_wishlist(676328, "Wishlist", 9.99, "https://geizhals.eu/?cat=WL-676328&hloc=de")
+
+        self.db.migrate_db()
+
+        self.assertGreaterEqual(self.db.cursor.execute("PRAGMA user_version").fetchone()[0], 2)
+        self.assertEqual("https://geizhals.at/a903248.html", self.db.get_product_info(903248).url)
+        self.assertEqual("https://geizhals.de/a1564497.html", self.db.get_product_info(1564497).url)
+        self.assertEqual("invalid", self.db.get_product_info(1).url)
+        self.assertEqual("https://geizhals.eu/?cat=WL-676328", self.db.get_wishlist_info(676328).url)
+
+    def test_migrations(self):
+        """Test to check if the migrations have consecutive versions and the database is at the latest one"""
+        versions = [migration.migration_version for migration in self.db.get_migrations()]
+        self.assertEqual(list(range(1, len(versions) + 1)), versions)
+        self.assertEqual(versions[-1], self.db.cursor.execute("PRAGMA user_version").fetchone()[0])
+
+    def test_migrate_db_rollback(self):
+        """Test to check if a failing migration is rolled back and leaves the database at the previous version"""
+        self.helper_add_user(self.user)
+        self.db.add_product(self.p.entity_id, self.p.name, self.p.price, self.p.url)
+        self.db.cursor.execute("PRAGMA user_version = 5;")
+        self.db.cursor.execute("DROP INDEX idx_product_subscribers_entity_user;")
+        self.db.cursor.execute("INSERT INTO product_subscribers (product_id, user_id) VALUES (?, ?), (?, ?);",
+                               [self.p.entity_id, self.user.get("user_id"), self.p.entity_id, self.user.get("user_id")])
+        self.db.connection.commit()
+        # Migration 6 fails after removing the duplicate subscription, because the table can't be indexed
+        self.db.cursor.execute("DROP TABLE product_prices;")
+
+        with self.assertRaises(sqlite3.OperationalError):
+            self.db.migrate_db()
+
+        self.assertEqual(5, self.db.cursor.execute("PRAGMA user_version").fetchone()[0])
+        self.assertEqual(2, self.db.cursor.execute("SELECT COUNT(*) FROM product_subscribers;").fetchone()[0])
+
+    def test_subscribe_twice(self):
+        """Test to check if subscribing to the same entity twice is prevented by the unique index"""
+        self.helper_add_user(self.user)
+        self.db.add_product(self.p.entity_id, self.p.name, self.p.price, self.p.url)
+        self.db.add_wishlist(self.wl.entity_id, self.wl.name, self.wl.price, self.wl.url)
+
+        self.assertTrue(self.db.subscribe_product(self.p.entity_id, self.user.get("user_id")))
+        self.assertFalse(self.db.subscribe_product(self.p.entity_id, self.user.get("user_id")))
+        self.assertTrue(self.db.subscribe_wishlist(self.wl.entity_id, self.user.get("user_id")))
+        self.assertFalse(self.db.subscribe_wishlist(self.wl.entity_id, self.user.get("user_id")))
+
+        self.assertEqual([self.user.get("user_id")], self.db.get_userids_for_product(self.p.entity_id))
+
+    def helper_traced_selects(self, func, *args):
+        """Returns the SELECT statements which the given DBwrapper method runs"""
+        statements = []
+        self.db.connection.set_trace_callback(statements.append)
+        try:
+            func(*args)
+        finally:
+            self.db.connection.set_trace_callback(None)
+
+        return [statement for statement in statements if statement.lstrip().upper().startswith("SELECT")]
+
+    def helper_query_plan(self, statement):
+        # Depending on the Python version, the traced statements contain the parameters or placeholders
+        params = [None] * statement.count("?")
+        return " ".join(line[-1] for line in self.db.cursor.execute("EXPLAIN QUERY PLAN " + statement, params).fetchall())
+
+    def test_query_plan_price_history(self):
+        """Test to check if the price history is read with the index instead of a table scan"""
+        for table, func in [("product_prices", self.db.get_product_price_history), ("wishlist_prices", self.db.get_wishlist_price_history)]:
+            statements = self.helper_traced_selects(func, 1, 4)
+            self.assertEqual(1, len(statements))
+
+            plan = self.helper_query_plan(statements[0])
+            self.assertIn("idx_{}_entity_timestamp".format(table), plan)
+            self.assertNotIn("SCAN {}".format(table), plan)
+
+    def test_query_plan_user_subscriptions(self):
+        """Test to check if the subscriptions of a user are read with the index instead of a table scan"""
+        for table, alias, id_column, func, subscriber_func in [
+                ("product_subscribers", "ps", "product_id", self.db.get_products_for_user, self.db.is_user_product_subscriber),
+                ("wishlist_subscribers", "ws", "wishlist_id", self.db.get_wishlists_for_user, self.db.is_user_wishlist_subscriber)]:
+            statements = self.helper_traced_selects(func, 1)
+            self.assertEqual(1, len(statements))
+
+            plan = self.helper_query_plan(statements[0])
+            self.assertIn("idx_{}_user".format(table), plan)
+            self.assertNotIn("SCAN {}".format(alias), plan)
+
+            statements = self.helper_traced_selects(subscriber_func, 1, 1)
+            self.assertEqual(1, len(statements))
+            self.assertIn("USING COVERING INDEX", self.helper_query_plan(statements[0]))
+
     def test_get_subscribed_wishlist_count(self):
         """Test to check if the subscribed wishlist count is correct"""
         user_id = 11223344
@@ -454,6 +555,31 @@ class DBWrapperTest(unittest.TestCase):
         self.assertEqual(user.get("username"), user_db.username)
         self.assertEqual(user.get("lang_code"), user_db.lang_code)
 
+    def test_get_subscribers(self):
+        """Test to check if the subscribers of many entities are loaded at once"""
+        user, user2 = self.user, self.user2
+        self.helper_add_user(user)
+        self.helper_add_user(user2)
+        self.db.add_wishlist(self.wl.entity_id, self.wl.name, self.wl.price, self.wl.url)
+        self.db.add_product(self.p.entity_id, self.p.name, self.p.price, self.p.url)
+
+        self.db.subscribe_wishlist(self.wl.entity_id, user.get("user_id"))
+        self.db.subscribe_product(self.p.entity_id, user.get("user_id"))
+        self.db.subscribe_product(self.p.entity_id, user2.get("user_id"))
+
+        keys = [(EntityType.WISHLIST, self.wl.entity_id), (EntityType.PRODUCT, self.p.entity_id), (EntityType.PRODUCT, 1)]
+        # A small chunk size makes sure that chunking does not lose any subscribers
+        for chunk_size in (1, 400):
+            subscribers = self.db.get_subscribers(keys, chunk_size=chunk_size)
+
+            self.assertEqual({keys[0], keys[1]}, set(subscribers))
+            self.assertEqual([user.get("user_id")], [u.user_id for u in subscribers[keys[0]]])
+            self.assertEqual({user.get("user_id"), user2.get("user_id")}, {u.user_id for u in subscribers[keys[1]]})
+            self.assertEqual("Peter", subscribers[keys[0]][0].first_name)
+
+        self.assertEqual({}, self.db.get_subscribers([]))
+        self.assertEqual({}, self.db.get_subscribers([(EntityType.PRODUCT, 1)]))
+
     def test_get_userids_for_wishlist(self):
         """Test to check if getting the (subscriber) userid from a wishlist works as intended"""
         # Users should be 0 in the beginning
@@ -688,6 +814,282 @@ class DBWrapperTest(unittest.TestCase):
 
         self.assertEqual(price, new_price)
 
+    def test_get_wishlist_last_update(self):
+        """Test to check if the timestamp of the last price update of a wishlist is returned"""
+        self.db.add_wishlist(self.wl.entity_id, self.wl.name, self.wl.price, self.wl.url)
+        self.assertIsNone(self.db.get_wishlist_last_update(self.wl.entity_id))
+
+        self.db.cursor.execute("INSERT INTO wishlist_prices (wishlist_id, price, timestamp, last_seen) VALUES (?, ?, ?, ?)", [self.wl.entity_id, 10.0, 1000, 1500])
+        self.db.cursor.execute("INSERT INTO wishlist_prices (wishlist_id, price, timestamp, last_seen) VALUES (?, ?, ?, ?)", [self.wl.entity_id, 12.0, 2000, 3000])
+        self.db.connection.commit()
+        self.assertEqual(self.db.get_wishlist_last_update(self.wl.entity_id), 3000)
+
+    def test_get_product_last_update(self):
+        """Test to check if the timestamp of the last price update of a product is returned"""
+        self.db.add_product(self.p.entity_id, self.p.name, self.p.price, self.p.url)
+        self.assertIsNone(self.db.get_product_last_update(self.p.entity_id))
+
+        self.db.update_product_price(product_id=self.p.entity_id, price=999.99)
+        last_update = self.db.get_product_last_update(self.p.entity_id)
+        self.assertIsNotNone(last_update)
+        self.assertAlmostEqual(last_update, int(datetime.utcnow().timestamp()), delta=5)
+
+    def test_update_price_check_bookkeeping(self):
+        """Test to check if price updates set last_checked and only set last_changed if the price changed"""
+        self.db.add_product(self.p.entity_id, self.p.name, self.p.price, self.p.url)
+        query = "SELECT last_checked, last_changed FROM products WHERE product_id=?"
+        self.assertEqual((0, 0), self.db.cursor.execute(query, [self.p.entity_id]).fetchone())
+
+        self.db.update_product_price(product_id=self.p.entity_id, price=self.p.price)
+        last_checked, last_changed = self.db.cursor.execute(query, [self.p.entity_id]).fetchone()
+        self.assertGreater(last_checked, 0)
+        self.assertEqual(0, last_changed)
+
+        self.db.update_product_price(product_id=self.p.entity_id, price=99.99)
+        last_checked, last_changed = self.db.cursor.execute(query, [self.p.entity_id]).fetchone()
+        self.assertEqual(last_checked, last_changed)
+
+        self.db.add_wishlist(self.wl.entity_id, self.wl.name, self.wl.price, self.wl.url)
+        self.db.update_wishlist_price(wishlist_id=self.wl.entity_id, price=99.99)
+        last_checked, last_changed = self.db.cursor.execute("SELECT last_checked, last_changed FROM wishlists WHERE wishlist_id=?",
+                                                            [self.wl.entity_id]).fetchone()
+        self.assertGreater(last_checked, 0)
+        self.assertEqual(last_checked, last_changed)
+
+    def test_price_history_stores_changes(self):
+        """Test to check if a price is only added to the history if it changed and its last_seen is updated otherwise"""
+        self.db.add_product(self.p.entity_id, self.p.name, self.p.price, self.p.url)
+        query = "SELECT price, timestamp, last_seen FROM product_prices ORDER BY timestamp, rowid"
+
+        for timestamp, price in [(1000, 10.0), (2000, 10.0), (3000, 12.0), (4000, 12.0), (5000, 10.0)]:
+            self.db.write_batch(prices=[(EntityType.PRODUCT, self.p.entity_id, price, timestamp)])
+        self.assertEqual([(10.0, 1000, 2000), (12.0, 3000, 4000), (10.0, 5000, 5000)], self.db.cursor.execute(query).fetchall())
+        self.assertEqual(5000, self.db.get_product_last_update(self.p.entity_id))
+
+        self.db.update_product_price(product_id=self.p.entity_id, price=10.0)
+        history = self.db.cursor.execute(query).fetchall()
+        self.assertEqual(3, len(history))
+        self.assertAlmostEqual(history[-1][2], int(datetime.utcnow().timestamp()), delta=5)
+
+        # Two changes within the same second are both kept
+        self.db.update_product_price(product_id=self.p.entity_id, price=11.0)
+        self.db.update_product_price(product_id=self.p.entity_id, price=10.0)
+        self.assertEqual([10.0, 11.0, 10.0], [line[0] for line in self.db.cursor.execute(query).fetchall()[-3:]])
+
+    def test_get_price_history(self):
+        """Test to check if unchanged prices are returned for every day they were seen"""
+        self.db.add_wishlist(self.wl.entity_id, self.wl.name, self.wl.price, self.wl.url)
+        now = int(datetime.utcnow().timestamp())
+        day = 60 * 60 * 24
+        week_ago = now - 7 * day
+        for timestamp, last_seen, price in [(now - 30 * day, now - 20 * day, 8.0), (now - 10 * day, now - 5 * day, 10.0), (now - 2 * day, now, 9.0)]:
+            self.db.cursor.execute("INSERT INTO wishlist_prices (wishlist_id, price, timestamp, last_seen) VALUES (?, ?, ?, ?)",
+                                   [self.wl.entity_id, price, timestamp, last_seen])
+        self.db.connection.commit()
+
+        history = self.db.get_wishlist_price_history(self.wl.entity_id, weeks=1)
+        self.assertEqual([(9.0, now), (9.0, now - day), (9.0, now - 2 * day),
+                          (10.0, now - 5 * day), (10.0, now - 6 * day), (10.0, week_ago)], [(p, timestamp) for p, timestamp, _ in history])
+        self.assertEqual({self.wl.name}, {name for _, _, name in history})
+
+    def test_compact_price_history(self):
+        """Test to check if repeated prices are removed from the history and the remaining rows cover them"""
+        self.db.add_product(self.p.entity_id, self.p.name, self.p.price, self.p.url)
+        self.db.add_wishlist(self.wl.entity_id, self.wl.name, self.wl.price, self.wl.url)
+        for timestamp, price in [(1000, 10.0), (2000, 10.0), (3000, 12.0), (4000, 10.0), (5000, 10.0), (6000, 10.0)]:
+            self.db.cursor.execute("INSERT INTO product_prices (product_id, price, timestamp, last_seen) VALUES (?, ?, ?, ?)",
+                                   [self.p.entity_id, price, timestamp, timestamp])
+        self.db.cursor.execute("INSERT INTO wishlist_prices (wishlist_id, price, timestamp, last_seen) VALUES (?, ?, ?, ?)", [self.wl.entity_id, 5.0, 1000, 1000])
+        self.db.connection.commit()
+
+        # Each chunk reads and deletes the rows within one transaction which holds the write lock
+        statements = []
+        self.db.connections._writer.set_trace_callback(statements.append)
+        self.assertEqual(3, self.db.compact_price_history(chunk_size=1))
+        self.db.connections._writer.set_trace_callback(None)
+        self.assertEqual(2, statements.count("BEGIN IMMEDIATE;"))
+        self.assertLess(statements.index("BEGIN IMMEDIATE;"), min(i for i, statement in enumerate(statements) if statement.startswith("SELECT rowid")))
+        self.assertEqual([(10.0, 1000, 2000), (12.0, 3000, 3000), (10.0, 4000, 6000)],
+                         self.db.cursor.execute("SELECT price, timestamp, last_seen FROM product_prices ORDER BY timestamp").fetchall())
+        self.assertEqual(1, self.db.get_wishlist_pricecount())
+
+        # Compacting twice doesn't change anything
+        self.assertEqual(0, self.db.compact_price_history())
+
+    def test_migrate_db_price_last_seen(self):
+        """Test to check if migration 7 sets the last_seen of the existing prices to their timestamp"""
+        self.db.add_product(self.p.entity_id, self.p.name, self.p.price, self.p.url)
+        self.db.cursor.execute("PRAGMA user_version = 6;")
+        self.db.cursor.execute("DROP TABLE product_prices;")
+        self.db.cursor.execute("DROP TABLE wishlist_prices;")
+        self.db.cursor.execute("CREATE TABLE product_prices (product_id INTEGER NOT NULL, price REAL NOT NULL DEFAULT 0, timestamp INTEGER NOT NULL DEFAULT 0);")
+        self.db.cursor.execute("CREATE TABLE wishlist_prices (wishlist_id INTEGER NOT NULL, price REAL NOT NULL DEFAULT 0, timestamp INTEGER NOT NULL DEFAULT 0);")
+        self.db.cursor.execute("INSERT INTO product_prices (product_id, price, timestamp) VALUES (?, ?, ?);", [self.p.entity_id, 10.0, 1000])
+        # The later migrations run again as well
+        self.db.cursor.execute("DROP TABLE pending_notifications;")
+        self.db._migrate_sweeps_and_notifications()
+        self.db.connection.commit()
+
+        self.db.migrate_db()
+
+        self.assertEqual(1000, self.db.get_product_last_update(self.p.entity_id))
+
+    def test_get_check_stats(self):
+        """Test to check if the check stats of subscribed entities are returned"""
+        self.helper_add_user(self.user)
+        self.helper_add_user(self.user2)
+        self.db.add_product(self.p.entity_id, self.p.name, self.p.price, self.p.url)
+        self.db.add_product(1, "Unsubscribed", 1.0, "https://geizhals.de/a1.html")
+        self.db.add_wishlist(self.wl.entity_id, self.wl.name, self.wl.price, self.wl.url)
+        self.db.subscribe_product(self.p.entity_id, self.user.get("user_id"))
+        self.db.subscribe_product(self.p.entity_id, self.user2.get("user_id"))
+        self.db.subscribe_wishlist(self.wl.entity_id, self.user.get("user_id"))
+
+        # Two changes back to 10.0 and a repeated price of an old version, which is no change
+        for timestamp, price in [(0, 9.0), (100, 10.0), (300, 11.0), (400, 10.0), (500, 12.0), (600, 10.0), (700, 10.0)]:
+            self.db.cursor.execute("INSERT INTO product_prices (product_id, price, timestamp, last_seen) VALUES (?, ?, ?, ?)",
+                                   [self.p.entity_id, price, timestamp, timestamp + 99])
+        self.db.connection.commit()
+
+        product_stats = self.db.get_product_check_stats()
+        self.assertEqual(1, len(product_stats))
+        product, last_checked, last_changed, subscribers = product_stats[0]
+        self.assertEqual(self.p.entity_id, product.entity_id)
+        self.assertEqual((0, 0, 2), (last_checked, last_changed, subscribers))
+
+        wishlist_stats = self.db.get_wishlist_check_stats()
+        self.assertEqual(1, len(wishlist_stats))
+        self.assertEqual(self.wl.entity_id, wishlist_stats[0][0].entity_id)
+        self.assertEqual((0, 0, 1), wishlist_stats[0][1:])
+
+        # Only the requested entities are counted, the ones without changes have a count of 0
+        self.assertEqual({self.p.entity_id: 4, 1: 0}, self.db.get_price_change_counts(EntityType.PRODUCT, [self.p.entity_id, 1], since=200))
+        self.assertEqual({self.p.entity_id: 4}, self.db.get_price_change_counts(EntityType.PRODUCT, [self.p.entity_id], since=200, chunk_size=1))
+        self.assertEqual({self.p.entity_id: 2}, self.db.get_price_change_counts(EntityType.PRODUCT, [self.p.entity_id], since=450))
+        self.assertEqual({self.wl.entity_id: 0}, self.db.get_price_change_counts(EntityType.WISHLIST, [self.wl.entity_id], since=0))
+        self.assertEqual({}, self.db.get_price_change_counts(EntityType.WISHLIST, [], since=0))
+
+    def test_claim_leases(self):
+        """Test to check if only one worker can claim an entity and if released leases can be claimed again"""
+        self.db.add_product(self.p.entity_id, self.p.name, self.p.price, self.p.url)
+        self.db.add_wishlist(self.wl.entity_id, self.wl.name, self.wl.price, self.wl.url)
+        entities = [(EntityType.PRODUCT, self.p.entity_id, 0), (EntityType.WISHLIST, self.wl.entity_id, 0), (EntityType.PRODUCT, 1, 0)]
+
+        # Entities which don't exist are never claimed
+        claimed = self.db.claim_leases("worker1", entities, lease_time=600)
+        self.assertEqual([(EntityType.PRODUCT, self.p.entity_id), (EntityType.WISHLIST, self.wl.entity_id)], claimed)
+        self.assertEqual([], self.db.claim_leases("worker2", entities, lease_time=600))
+
+        self.db.release_leases("worker2", claimed)
+        self.assertEqual([], self.db.claim_leases("worker2", entities, lease_time=600))
+
+        self.db.release_leases("worker1", claimed)
+        self.assertEqual(claimed, self.db.claim_leases("worker2", entities, lease_time=600))
+
+    def test_claim_leases_expired(self):
+        """Test to check if expired leases of crashed workers are reclaimed"""
+        self.db.add_product(self.p.entity_id, self.p.name, self.p.price, self.p.url)
+        entities = [(EntityType.PRODUCT, self.p.entity_id, 0)]
+
+        self.assertEqual(1, len(self.db.claim_leases("worker1", entities, lease_time=-1)))
+        self.assertEqual(1, len(self.db.claim_leases("worker2", entities, lease_time=600)))
+
+        worker_id = self.db.cursor.execute("SELECT worker_id FROM leases WHERE entity_id=?", [self.p.entity_id]).fetchone()[0]
+        self.assertEqual("worker2", worker_id)
+
+    def test_claim_leases_checked_in_between(self):
+        """Test to check if entities which were checked by another worker in the meantime are not claimed"""
+        self.db.add_product(self.p.entity_id, self.p.name, self.p.price, self.p.url)
+        self.db.update_product_price(self.p.entity_id, 99.99)
+        last_checked = self.db.cursor.execute("SELECT last_checked FROM products WHERE product_id=?", [self.p.entity_id]).fetchone()[0]
+
+        self.assertEqual([], self.db.claim_leases("worker1", [(EntityType.PRODUCT, self.p.entity_id, 0)], lease_time=600))
+        self.assertEqual(1, len(self.db.claim_leases("worker1", [(EntityType.PRODUCT, self.p.entity_id, last_checked)], lease_time=600)))
+
+    def test_sweeps(self):
+        """Test to check if the unprocessed entities of unfinished sweeps are stored"""
+        keys = [(EntityType.PRODUCT, self.p.entity_id), (EntityType.WISHLIST, self.wl.entity_id)]
+        sweep_id = self.db.start_sweep("worker1", keys)
+        other_sweep_id = self.db.start_sweep("worker2", keys[:1])
+
+        self.db.write_batch(processed=[(sweep_id, EntityType.PRODUCT, self.p.entity_id)])
+        self.assertEqual(keys[1:], self.db.get_unprocessed_sweep_entities(sweep_id))
+
+        # Running sweeps of other workers are not returned until they are old enough
+        now = int(datetime.utcnow().timestamp())
+        self.assertEqual([sweep_id], self.db.get_unfinished_sweeps("worker1", now - 600))
+        self.assertEqual([sweep_id, other_sweep_id], self.db.get_unfinished_sweeps("worker3", now + 1))
+
+        self.db.finish_sweep(sweep_id)
+        self.assertEqual([], self.db.get_unfinished_sweeps("worker1", now - 600))
+        self.assertEqual([], self.db.get_unprocessed_sweep_entities(sweep_id))
+
+    def helper_add_notifications(self, user_ids, old_price, new_price):
+        self.db.write_batch(notifications=[(user_id, EntityType.PRODUCT, self.p.entity_id, old_price, new_price, 1000) for user_id in user_ids])
+
+    def helper_get_notifications(self):
+        """Returns all pending notifications without claiming them"""
+        return self.db.cursor.execute("SELECT notification_id, user_id, entity_type, entity_id, old_price, new_price "
+                                      "FROM pending_notifications ORDER BY notification_id;").fetchall()
+
+    def test_pending_notifications(self):
+        """Test to check if pending notifications are stored until they get removed"""
+        self.helper_add_user({"user_id": 415641, "first_name": "Peter", "last_name": "Müller", "username": "name2", "lang_code": "en_US"})
+        self.helper_add_user({"user_id": 5555333, "first_name": "1234", "last_name": "koldfg", "username": "d_Rickyy_b", "lang_code": "en_US"})
+
+        self.helper_add_notifications([415641, 5555333], 10.5, 9.99)
+        notifications = self.db.claim_pending_notifications("worker1", claim_time=600)
+        self.assertEqual(2, len(notifications))
+        self.assertEqual((415641, EntityType.PRODUCT, self.p.entity_id, 10.5, 9.99), notifications[0][1:])
+
+        self.db.rm_pending_notification(notifications[0][0])
+        self.assertEqual(notifications[1:], self.db.claim_pending_notifications("worker1", claim_time=600))
+
+        # Notifications of deleted users are removed as well
+        self.db.delete_user(5555333)
+        self.assertEqual([], self.helper_get_notifications())
+
+    def test_claim_pending_notifications(self):
+        """Test to check if pending notifications are only claimed by one worker until the claim expires"""
+        self.helper_add_user(self.user)
+        self.helper_add_notifications([self.user.get("user_id")], 10.5, 9.99)
+
+        notifications = self.db.claim_pending_notifications("worker1", claim_time=600)
+        self.assertEqual(1, len(notifications))
+        self.assertEqual([], self.db.claim_pending_notifications("worker2", claim_time=600))
+        # Workers keep their own claims
+        self.assertEqual(notifications, self.db.claim_pending_notifications("worker1", claim_time=600))
+
+        self.db.cursor.execute("UPDATE pending_notifications SET claimed_until=0;")
+        self.db.connection.commit()
+        self.assertEqual(notifications, self.db.claim_pending_notifications("worker2", claim_time=600))
+        self.assertEqual([], self.db.claim_pending_notifications("worker1", claim_time=600))
+
+    def test_write_batch(self):
+        """Test to check if a batch of prices, names, processed marks and notifications is written at once"""
+        self.helper_add_user(self.user)
+        self.db.add_product(self.p.entity_id, self.p.name, self.p.price, self.p.url)
+        self.db.add_wishlist(self.wl.entity_id, self.wl.name, self.wl.price, self.wl.url)
+        sweep_id = self.db.start_sweep("worker1", [(EntityType.PRODUCT, self.p.entity_id)])
+
+        self.db.write_batch(prices=[(EntityType.PRODUCT, self.p.entity_id, 99.99, 1000), (EntityType.WISHLIST, self.wl.entity_id, self.wl.price, 1000),
+                                    (EntityType.PRODUCT, 1, 5.0, 1000)],
+                            names=[(EntityType.WISHLIST, self.wl.entity_id, "New name")],
+                            processed=[(sweep_id, EntityType.PRODUCT, self.p.entity_id)],
+                            notifications=[(self.user.get("user_id"), EntityType.PRODUCT, self.p.entity_id, self.p.price, 99.99, 1000),
+                                           (1, EntityType.PRODUCT, self.p.entity_id, self.p.price, 99.99, 1000)])
+
+        self.assertEqual(99.99, self.db.get_product_info(self.p.entity_id).price)
+        self.assertEqual("New name", self.db.get_wishlist_info(self.wl.entity_id).name)
+        self.assertEqual((1000, 1000), self.db.cursor.execute("SELECT last_checked, last_changed FROM products").fetchone())
+        self.assertEqual((1000, 0), self.db.cursor.execute("SELECT last_checked, last_changed FROM wishlists").fetchone())
+        self.assertEqual(1000, self.db.get_product_last_update(self.p.entity_id))
+        self.assertEqual([], self.db.get_unprocessed_sweep_entities(sweep_id))
+
+        # Rows of unknown entities and users are skipped
+        self.assertEqual(1, len(self.helper_get_notifications()))
+        self.assertIsNone(self.db.get_product_last_update(1))
+
     def test_get_all_users(self):
         """Test to check if retreiving all users from the database works"""
         users = [{"user_id": 415641, "first_name": "Peter", "last_name": "Müller", "username": "name2", "lang_code": "en_US"},
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
 from .state_handler import GeizhalsStateHandler
+from .fetch_engine import FetchEngine
 
-__all__ = ["GeizhalsStateHandler"]
+__all__ = ["GeizhalsStateHandler", "FetchEngine"]
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""Canonical identity of Geizhals entities.
+
+The same entity can be shared through different domains (geizhals.de/.at/.eu), with or without 'www.', with
+different slugs or with additional query parameters. All of those variants are mapped offline to the
+(type, id, region) of the entity and a single canonical url per region.
+"""
+import re
+from collections import namedtuple
+
+from geizhals.entities import EntityType
+
+CanonicalEntity = namedtuple("CanonicalEntity", ["entity_type", "entity_id", "region", "url"])
+
+_domain = r"(?:https?://)?(?:www\.)?geizhals\.(de|at|eu)/"
+_product_pattern = re.compile(_domain + r"(?:[0-9a-zA-Z\-]*-)?a([0-9]+)\.html", re.IGNORECASE)
+_wishlist_pattern = re.compile(_domain + r"\?(?:[^\s#]*&)?cat=WL-([0-9]+)", re.IGNORECASE)
+
+
+def get_canonical_url(entity_type, entity_id, region):
+    """Returns the canonical url of an entity in the given region"""
+    if entity_type == EntityType.WISHLIST:
+        return "https://geizhals.{}/?cat=WL-{}".format(region, entity_id)
+    elif entity_type == EntityType.PRODUCT:
+        return "https://geizhals.{}/a{}.html".format(region, entity_id)
+    else:
+        raise ValueError("The given type {} is unknown!".format(entity_type))
+
+
+def canonicalize(text):
+    """Find the first Geizhals url in a text and return its CanonicalEntity - returns None if there is no valid url"""
+    matches = []
+    for entity_type, pattern in [(EntityType.WISHLIST, _wishlist_pattern), (EntityType.PRODUCT, _product_pattern)]:
+        match = pattern.search(text)
+        if match is not None:
+            matches.append((match.start(), entity_type, match))
+
+    if not matches:
+        return None
+
+    _, entity_type, match = min(matches, key=lambda m: m[0])
+    region = match.group(1).lower()
+    entity_id = int(match.group(2))
+
+    return CanonicalEntity(entity_type=entity_type, entity_id=entity_id, region=region,
+                           url=get_canonical_url(entity_type, entity_id, region))
@@ -1,64 +1,141 @@
 # -*- coding: utf-8 -*-
-import html
 import logging
+import re
+import time
+from collections import namedtuple
+from urllib.parse import urlsplit, urlunsplit
 
-import requests
 from pyquery import PyQuery
-from requests.exceptions import ProxyError
+from requests.exceptions import ConnectionError as RequestsConnectionError
+from requests.exceptions import ProxyError, RequestException, Timeout
 
+import geizhals.canonical
+from geizhals import fast_extractor
 from geizhals.entities import EntityType
-from geizhals.exceptions import HTTPLimitedException
+from geizhals.exceptions import FetchStoppedException, HTTPLimitedException
 from geizhals.state_handler import GeizhalsStateHandler
+from geizhals.util import SingleFlight
+from geizhals.util.ratelimiter import parse_retry_after
 
 logger = logging.getLogger(__name__)
 useragent = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_9_3) " \
             "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/35.0.1916.47 " \
             "Safari/537.36"
 
+# Parse price so that it's a proper comma value (no `,--`)
+price_pattern = r"([0-9]+)\.([0-9]+|[-]+)"
+price_pattern_dash = r"([0-9]+)\.([-]+)"
 
-def send_request(url):
+# products is only set for wishlists and holds the WishlistProducts listed on the page
+EntityData = namedtuple("EntityData", ["name", "price", "products"])
+EntityData.__new__.__defaults__ = (None,)
+WishlistProduct = namedtuple("WishlistProduct", ["entity_id", "name", "price", "path"])
+
+_entity_data_flight = SingleFlight()
+
+
+def _backoff(statehandler, attempt, stop_event=None):
+    """Wait before retrying a failed request. With proxies the next attempt uses another proxy, so there is no need to wait."""
+    if statehandler.use_proxies or attempt >= 2:
+        return
+
+    backoff = statehandler.rate_limiter.get_backoff(attempt)
+    logger.info("Retrying in {:.1f} seconds".format(backoff))
+    if stop_event is None:
+        time.sleep(backoff)
+    elif stop_event.wait(backoff):
+        raise FetchStoppedException("Stopped while waiting to retry the request!")
+
+
+def _download(url, validators=None, stop_event=None):
+    """Download an url - if validators are given, a conditional request is sent and a 304 response counts as success.
+    Once stop_event is set, waiting for the rate limiter or a retry raises a FetchStoppedException."""
     logger.debug("Requesting url '{}'!".format(url))
     statehandler = GeizhalsStateHandler()
 
+    headers = {'User-Agent': useragent}
+    if validators:
+        headers.update(validators)
+
+    rate_limiter = statehandler.rate_limiter
     successful_connection = False
+    last_error = None
     r = None
 
     for i in range(3):
         logger.debug("Trying to download site {}/3".format(i + 1))
         if statehandler.use_proxies:
             proxy = statehandler.get_next_proxy()
+            # Skip proxies which were told to back off, as long as there are other proxies left
+            for _ in range(len(statehandler.proxies) - 1):
+                if not rate_limiter.is_blocked(proxy):
+                    break
+                proxy = statehandler.get_next_proxy()
             logger.debug("Using proxy: '{}'".format(proxy))
             proxies = dict(http=proxy, https=proxy)
         else:
             proxy = None
             proxies = None
 
+        if not rate_limiter.wait(proxy, stop_event):
+            raise FetchStoppedException("Stopped while waiting for the rate limiter!")
+
         try:
-            r = requests.get(url, headers={'User-Agent': useragent}, proxies=proxies, timeout=4)
+            session = statehandler.get_session(proxy)
+            start = time.monotonic()
+            r = session.get(url, headers=headers, proxies=proxies, timeout=4)
         except ProxyError as e:
+            statehandler.report_proxy_failure(proxy)
             logger.warning("An error using the proxy '{}' occurred: {}. Trying another proxy if possible!".format(proxy, e))
+            last_error = e
             continue
+        except (Timeout, RequestsConnectionError) as e:
+            statehandler.report_proxy_failure(proxy)
+            logger.warning("Request to '{}' failed: {}".format(url, e))
+            last_error = e
+            _backoff(statehandler, i, stop_event)
+            continue
+        except RequestException:
+            statehandler.report_proxy_failure(proxy)
+            raise
 
         if r.status_code == 429:
             logger.error("Geizhals blocked us from sending that many requests (HTTP 429)!")
-            if statehandler.use_proxies:
-                proxy = statehandler.get_next_proxy()
-                logger.info("Switching proxy to '{}".format(proxy))
+            retry_after = parse_retry_after(r.headers.get("Retry-After"))
+            rate_limiter.report_limited(proxy, retry_after)
+            # The proxy's address is blocked, so it should be used less often for the time being
+            statehandler.report_proxy_failure(proxy)
+            last_error = None
+            if retry_after is None:
+                # Otherwise the rate limiter makes the next request over this proxy wait as long as requested
+                _backoff(statehandler, i, stop_event)
             continue
-        elif r.status_code == 403:
+
+        statehandler.report_proxy_success(proxy, time.monotonic() - start)
+        if r.status_code == 403:
             logger.info("URL is not visible publically!")
             r.raise_for_status()
+        elif r.status_code == 304 and validators:
+            logger.debug("URL '{}' was not modified".format(url))
+            successful_connection = True
+            break
         elif r.status_code == 200:
             successful_connection = True
             break
 
     if not successful_connection:
+        if last_error is not None:
+            raise last_error
         raise HTTPLimitedException("Geizhals blocked us temporarily!")
 
-    html_str = r.text
-    logger.debug("HTML content length: {} - status code: {}".format(len(html_str), r.status_code))
-    html_str = html.unescape(html_str)
-    return html_str
+    logger.debug("HTML content length: {} - status code: {}".format(len(r.content), r.status_code))
+    return r
+
+
+def send_request(url):
+    """Download an url and return the raw bytes of the page"""
+    # The raw bytes are handed to the parsers, which decode the entities of the fields they extract
+    return _download(url).content
 
 
 def parse_html(html_str, selector):
@@ -66,33 +143,44 @@ def parse_html(html_str, selector):
     return pq(selector).text()
 
 
-def parse_entity_price(html_str, entity_type):
+def _check_entity_type(entity_type):
+    if entity_type not in (EntityType.WISHLIST, EntityType.PRODUCT):
+        raise ValueError("The given type {} is unknown!".format(entity_type))
+
+
+def _get_price_selector(entity_type):
     if entity_type == EntityType.WISHLIST:
-        selector = "div.wishlist_sum_area span.gh_price span.gh_price > span.gh_price"
+        return "div.wishlist_sum_area span.gh_price span.gh_price > span.gh_price"
     elif entity_type == EntityType.PRODUCT:
-        selector = "div#offer__price-0 span.gh_price"
+        return "div#offer__price-0 span.gh_price"
     else:
         raise ValueError("The given type {} is unknown!".format(entity_type))
 
-    price = parse_html(html_str, selector)
-    price = price[2:]  # Cut off the '€ ' before the real price
-    price = price.replace(',', '.')
-    return price
-
 
-def parse_entity_name(html_str, entity_type):
+def _get_name_selector(entity_type):
     if entity_type == EntityType.WISHLIST:
-        selector = "div.wishlist span.wishlist_title"
+        return "div.wishlist span.wishlist_title"
     elif entity_type == EntityType.PRODUCT:
-        selector = "div.variant__header h1[itemprop='name']"
+        return "div.variant__header h1[itemprop='name']"
     else:
         raise ValueError("The given type {} is unknown!".format(entity_type))
 
-    name = parse_html(html_str, selector)
+
+def _select_entity_price(pq, entity_type):
+    """Select the price string of an entity from an already parsed document"""
+    price = pq(_get_price_selector(entity_type)).text()
+    price = price[2:]  # Cut off the '€ ' before the real price
+    price = price.replace(',', '.')
+    return price
+
+
+def _select_entity_name(pq, entity_type):
+    """Select the name of an entity from an already parsed document"""
+    name = pq(_get_name_selector(entity_type)).text()
 
     # Temporary fix for new Geizhals pages such as https://geizhals.de/sony-ht-rt3-schwarz-a1400003.html
     if name == "" and entity_type == EntityType.PRODUCT:
-        name = parse_html(html_str, "#productpage__headline")
+        name = pq("#productpage__headline").text()
 
     # If name is still empty, raise error
     if name == "":
@@ -100,3 +188,152 @@ def parse_entity_name(html_str, entity_type):
         raise ValueError("Name cannot be parsed!")
 
     return name
+
+
+def parse_entity_price(html_str, entity_type):
+    _check_entity_type(entity_type)
+    return _select_entity_price(PyQuery(html_str), entity_type)
+
+
+def parse_entity_name(html_str, entity_type):
+    _check_entity_type(entity_type)
+    return _select_entity_name(PyQuery(html_str), entity_type)
+
+
+def parse_price(price):
+    """Convert a parsed price string such as '199.65' or '199.--' into a float"""
+    if re.match(price_pattern, price):
+        if re.match(price_pattern_dash, price):
+            price = re.search(price_pattern_dash, price).group(1)
+    else:
+        raise ValueError("Couldn't parse price '{}'!".format(price))
+
+    return float(price)
+
+
+def _select_wishlist_products(pq):
+    """Select all products with a price from an already parsed wishlist page"""
+    products = []
+    for item in pq("div.wishlist__item[data-id]").items():
+        link = item("a.productlist__link")
+        name = link.text()
+
+        # Products which are currently not available have no price
+        price = item("div.wishlist__item-price span.gh_price span.gh_price").text()
+        if price == "":
+            continue
+
+        price = price[2:].replace(',', '.')
+        path = (link.attr("href") or "").split("?")[0]
+        try:
+            if name == "":
+                raise ValueError("Name of wishlist product cannot be parsed!")
+            product = WishlistProduct(entity_id=int(item.attr("data-id")), name=name, price=parse_price(price), path=path)
+        except ValueError as e:
+            # A single malformed item must not keep the wishlist itself from being updated
+            logger.warning("Skipping malformed wishlist item '{}': {}".format(item.attr("data-id"), e))
+            continue
+
+        products.append(product)
+
+    return products
+
+
+def _fast_parse_entity(html_str, entity_type):
+    """Try to extract name and price without building a DOM - returns None if that's not possible"""
+    name = fast_extractor.extract_name(html_str, entity_type)
+    price = fast_extractor.extract_price(html_str, entity_type)
+
+    if name is None or price is None:
+        return None
+
+    try:
+        products = None
+        if entity_type == EntityType.WISHLIST:
+            products = fast_extractor.extract_wishlist_products(html_str)
+            if products is None:
+                return None
+            products = [WishlistProduct(entity_id=p_id, name=p_name, price=parse_price(p_price), path=p_path)
+                        for p_id, p_name, p_price, p_path in products]
+
+        return EntityData(name=name, price=parse_price(price), products=products)
+    except ValueError:
+        return None
+
+
+def parse_entity(html_str, entity_type, fast=True):
+    """Parse name and price of an entity while building the DOM of the page only once.
+    If fast is set, the targeted extractor is tried first and PyQuery is only used as a fallback."""
+    _check_entity_type(entity_type)
+
+    if fast:
+        data = _fast_parse_entity(html_str, entity_type)
+        if data is not None:
+            return data
+        logger.debug("Fast extraction failed, falling back to PyQuery!")
+
+    pq = PyQuery(html_str)
+
+    name = _select_entity_name(pq, entity_type)
+    price = parse_price(_select_entity_price(pq, entity_type))
+    products = _select_wishlist_products(pq) if entity_type == EntityType.WISHLIST else None
+
+    return EntityData(name=name, price=price, products=products)
+
+
+def _parse_entity(html_str, entity_type):
+    """Parse the page of an entity. The fast path runs in the calling thread, while the CPU bound PyQuery fallback
+    runs in the parse pool - if one is configured."""
+    parse_pool = GeizhalsStateHandler().parse_pool
+    if parse_pool is None:
+        return parse_entity(html_str, entity_type)
+
+    _check_entity_type(entity_type)
+    data = _fast_parse_entity(html_str, entity_type)
+    if data is not None:
+        return data
+
+    return parse_pool.run(parse_entity, html_str, entity_type, False)
+
+
+def _get_fetch_key(url, entity_type):
+    """Key under which concurrent requests for the same entity are coalesced - (type, id, region) of the entity"""
+    entity = geizhals.canonical.canonicalize(url)
+    if entity is not None and entity.entity_type == entity_type:
+        return entity.entity_type, entity.entity_id, entity.region
+
+    parts = urlsplit(url.strip())
+    return entity_type, urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, parts.query, ""))
+
+
+def get_entity_data(url, entity_type, stop_event=None):
+    """Download the page of an entity and parse its current name and price.
+    Concurrent calls for the same entity share a single download and parse, even if their urls differ."""
+    return _entity_data_flight.do(_get_fetch_key(url, entity_type), _get_entity_data, url, entity_type, stop_event)
+
+
+def _data_from_cache(data):
+    """Restore EntityData from its json representation. Entries of older versions have no products."""
+    data = EntityData(*data)
+    if data.products is not None:
+        data = data._replace(products=[WishlistProduct(*product) for product in data.products])
+    return data
+
+
+def _get_entity_data(url, entity_type, stop_event=None):
+    """If the page did not change since the last download, the cached data is returned without parsing the page."""
+    cache = GeizhalsStateHandler().response_cache
+    entry = cache.get(url) if cache else None
+    has_data = entry is not None and entry.data is not None
+
+    r = _download(url, entry.validators if has_data else None, stop_event)
+    if r.status_code == 304:
+        cache.record_hit(entry)
+        return _data_from_cache(entry.data)
+
+    data = _parse_entity(r.content, entity_type)
+    if cache:
+        cache.record_miss()
+        cache.store(url, r.headers, r.content, data=list(data))
+
+    return data
@@ -1,6 +1,4 @@
 # -*- coding: utf-8 -*-
-import re
-
 import geizhals.core
 
 
@@ -9,6 +7,7 @@ class Entity(object):
 
     def __init__(self, entity_id: int, name: str, url: str, price: float):
         self.__html = None
+        self.__data = None
         self.entity_id = int(entity_id)
         self.name = str(name)
         self.url = str(url)
@@ -19,28 +18,17 @@ class Entity(object):
         if not self.__html:
             self.__html = geizhals.core.send_request(self.url)
 
-    def get_current_name(self):
-        """Get the current name of an entity from Geizhals"""
-        self.get_html()
+    def get_current_data(self, stop_event=None):
+        """Get the current name and price of an entity from Geizhals - the page is downloaded and parsed only once"""
+        if not self.__data:
+            self.__data = geizhals.core.get_entity_data(self.url, self.TYPE, stop_event)
 
-        name = geizhals.core.parse_entity_name(self.__html, self.TYPE)
+        return self.__data
 
-        return name
+    def get_current_name(self):
+        """Get the current name of an entity from Geizhals"""
+        return self.get_current_data().name
 
     def get_current_price(self):
         """Get the current price of a wishlist from Geizhals"""
-        self.get_html()
-        self.get_current_name()
-        price = geizhals.core.parse_entity_price(self.__html, self.TYPE)
-
-        # Parse price so that it's a proper comma value (no `,--`)
-        pattern = r"([0-9]+)\.([0-9]+|[-]+)"
-        pattern_dash = r"([0-9]+)\.([-]+)"
-
-        if re.match(pattern, price):
-            if re.match(pattern_dash, price):
-                price = float(re.search(pattern_dash, price).group(1))
-        else:
-            raise ValueError("Couldn't parse price '{}' for entity '{}'!".format(price, self.url))
-
-        return float(price)
+        return self.get_current_data().price
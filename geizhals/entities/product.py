@@ -21,8 +21,9 @@ class Product(Entity):
             raise geizhals.exceptions.InvalidWishlistURLException
 
         p = Product(entity_id=0, name="", url=url, price=0)
-        p.price = p.get_current_price()
-        p.name = p.get_current_name()
+        data = p.get_current_data()
+        p.name = data.name
+        p.price = data.price
         p.entity_id = int(re.search(Product.url_pattern, url).group(2))
 
         logger.info("Name: {}".format(p.name))
@@ -1,9 +1,10 @@
 # -*- coding: utf-8 -*-
 import re
 
+import geizhals.canonical
 import geizhals.core
 import geizhals.exceptions
-from geizhals.entities import Entity, EntityType
+from geizhals.entities import Entity, EntityType, Product
 
 
 class Wishlist(Entity):
@@ -19,11 +20,16 @@ class Wishlist(Entity):
             raise geizhals.exceptions.InvalidWishlistURLException
 
         wl = Wishlist(entity_id=0, name="", url=url, price=0)
-        wl.price = wl.get_current_price()
-        wl.name = wl.get_current_name()
+        data = wl.get_current_data()
+        wl.name = data.name
+        wl.price = data.price
         wl.entity_id = int(re.search(Wishlist.url_pattern, url).group(2))
 
         return wl
 
     def get_wishlist_products(self):
-        raise NotImplementedError("get_wishlist_products is not implemented yet")
+        """Returns the products of the wishlist which currently have a price - parsed from the wishlist page itself"""
+        region = geizhals.canonical.canonicalize(self.url).region
+        products = self.get_current_data().products or []
+        return [Product(entity_id=p.entity_id, name=p.name, price=p.price,
+                        url=geizhals.canonical.get_canonical_url(EntityType.PRODUCT, p.entity_id, region)) for p in products]
@@ -1,5 +1,6 @@
 from .invalidwishlisturlexception import InvalidWishlistURLException
 from .invalidproducturlexception import InvalidProductURLException
 from .httplimitedexception import HTTPLimitedException
+from .fetchstoppedexception import FetchStoppedException
 
-__all__ = ['InvalidWishlistURLException', 'InvalidProductURLException', 'HTTPLimitedException']
+__all__ = ['InvalidWishlistURLException', 'InvalidProductURLException', 'HTTPLimitedException', 'FetchStoppedException']
@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+
+
+class FetchStoppedException(Exception):
+    pass
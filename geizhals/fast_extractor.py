@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""Fast path for extracting the name and price of an entity without building a DOM of the whole page.
+
+The extractor only searches for a few well known anchors in the raw html (str or bytes) and reads the text right
+behind them. Only those extracted fields get decoded and unescaped.
+Whenever the markup does not look exactly as expected, None is returned and the caller has to fall back to the
+PyQuery based parser in geizhals.core.
+"""
+import html
+import logging
+import re
+
+from geizhals.entities import EntityType
+
+logger = logging.getLogger(__name__)
+
+
+def _compile(pattern):
+    """Compile a pattern for str as well as for raw bytes input"""
+    return {str: re.compile(pattern), bytes: re.compile(pattern.encode("ascii"))}
+
+
+# Text of a span which does not contain any further markup
+_gh_price_span = _compile(r'<span class="gh_price">([^<]+)</span>')
+_wishlist_title_span = _compile(r'<span class="wishlist_title"[^>]*>([^<]*)</span>')
+_product_headline = _compile(r'<h1 id="productpage__headline"[^>]*>([^<]*)</h1>')
+_variant_headline = _compile(r'<h1[^>]*itemprop="name"[^>]*>([^<]*)</h1>')
+_wishlist_item = _compile(r'<div class="wishlist__item[^"-]*" data-id="([0-9]+)"')
+_wishlist_item_link = _compile(r'<a class="productlist__link" href="([^"?]*)[^"]*"[^>]*>([^<]*)</a>')
+_div_tag = _compile(r'<(/?)div[\s>]')
+_charset = re.compile(rb'<meta[^>]+charset=["\']?([a-zA-Z0-9_\-]+)', re.IGNORECASE)
+
+
+def _get_encoding(html_bytes):
+    """Returns the charset declared in the head of the page, the same as lxml would use it"""
+    match = _charset.search(html_bytes, 0, 4096)
+    if match is None:
+        return "utf-8"
+
+    return match.group(1).decode("ascii")
+
+
+def _clean_text(text):
+    """Decode html entities and collapse whitespace the same way PyQuery's text() does"""
+    return " ".join(html.unescape(text).split())
+
+
+def _decode(html_str, text):
+    """Decode text which was extracted from raw bytes - only the extracted fields are decoded"""
+    if isinstance(text, str):
+        return text
+
+    try:
+        return text.decode(_get_encoding(html_str), "replace")
+    except LookupError:
+        return text.decode("utf-8", "replace")
+
+
+def _find_div(html_str, anchor):
+    """Returns the start and end position of the div whose opening tag contains the anchor or None"""
+    pos = html_str.find(_as_type(html_str, anchor))
+    if pos == -1:
+        return None
+
+    start = html_str.rfind(_as_type(html_str, "<"), 0, pos)
+    if start == -1 or not _div_tag[type(html_str)].match(html_str, start):
+        return None
+
+    depth = 0
+    for tag in _div_tag[type(html_str)].finditer(html_str, start):
+        depth += -1 if tag.group(1) else 1
+        if depth == 0:
+            return start, tag.end()
+
+    return None
+
+
+def _search_in_div(html_str, anchor, pattern):
+    """Returns the first non empty text matched by pattern within the div of the given anchor or None"""
+    bounds = _find_div(html_str, anchor)
+    if bounds is None:
+        return None
+
+    for match in pattern[type(html_str)].finditer(html_str, *bounds):
+        text = _clean_text(_decode(html_str, match.group(1)))
+        if text:
+            return text
+
+    return None
+
+
+def _as_type(html_str, text):
+    """Convert an ascii anchor to the type of the searched html"""
+    return text.encode("ascii") if isinstance(html_str, bytes) else text
+
+
+def _search(html_str, pattern):
+    match = pattern[type(html_str)].search(html_str)
+    if match is None:
+        return None
+
+    return _clean_text(_decode(html_str, match.group(1))) or None
+
+
+def extract_price(html_str, entity_type):
+    """Extract the price string of an entity, formatted like geizhals.core.parse_entity_price"""
+    if entity_type == EntityType.WISHLIST:
+        price = _search_in_div(html_str, 'class="wishlist_sum_area"', _gh_price_span)
+    elif entity_type == EntityType.PRODUCT:
+        price = _search_in_div(html_str, 'id="offer__price-0"', _gh_price_span)
+    else:
+        raise ValueError("The given type {} is unknown!".format(entity_type))
+
+    if price is None:
+        return None
+
+    return _cut_price(price)
+
+
+def extract_name(html_str, entity_type):
+    """Extract the name of an entity, returns None if it can't be found"""
+    if entity_type == EntityType.WISHLIST:
+        return _search(html_str, _wishlist_title_span)
+    elif entity_type == EntityType.PRODUCT:
+        name = _search_in_div(html_str, 'class="variant__header"', _variant_headline)
+        return name or _search(html_str, _product_headline)
+    else:
+        raise ValueError("The given type {} is unknown!".format(entity_type))
+
+
+def _cut_price(price):
+    price = price[2:]  # Cut off the '€ ' before the real price
+    return price.replace(',', '.')
+
+
+def extract_wishlist_products(html_str):
+    """Extract (product id, name, price string, path) of every product of a wishlist.
+    Products without a price are not listed. Returns None if any item can't be parsed."""
+    items = list(_wishlist_item[type(html_str)].finditer(html_str))
+
+    end = html_str.find(_as_type(html_str, 'class="wishlist_sum_area"'))
+    if end == -1:
+        end = len(html_str)
+
+    products = []
+    for i, item in enumerate(items):
+        item_end = items[i + 1].start() if i + 1 < len(items) else max(end, item.end())
+
+        link = _wishlist_item_link[type(html_str)].search(html_str, item.end(), item_end)
+        if link is None:
+            return None
+
+        name = _clean_text(_decode(html_str, link.group(2)))
+        path = _decode(html_str, link.group(1))
+        if not name:
+            return None
+
+        price = None
+        price_pos = html_str.find(_as_type(html_str, 'class="wishlist__item-price '), item.end(), item_end)
+        if price_pos != -1:
+            for match in _gh_price_span[type(html_str)].finditer(html_str, price_pos, item_end):
+                price = _clean_text(_decode(html_str, match.group(1)))
+                if price:
+                    break
+
+        if not price:
+            continue
+
+        products.append((int(item.group(1)), name, _cut_price(price), path))
+
+    return products
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+FetchResult = namedtuple("FetchResult", ["entity", "result", "error"])
+
+
+class FetchEngine(object):
+    """Fetches the data of many entities in parallel with a bounded number of worker threads"""
+
+    def __init__(self, workers=8, per_host_limit=4):
+        if workers < 1 or per_host_limit < 1:
+            raise ValueError("workers and per_host_limit must be greater than 0!")
+
+        self.workers = workers
+        self.per_host_limit = per_host_limit
+        self._host_semaphores = {}
+        self._lock = threading.Lock()
+
+    def _get_host_semaphore(self, url):
+        """Returns the semaphore limiting the concurrent requests to the host of the given url"""
+        host = urlparse(url).netloc.lower()
+
+        with self._lock:
+            semaphore = self._host_semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.per_host_limit)
+                self._host_semaphores[host] = semaphore
+
+        return semaphore
+
+    def _run(self, entity, fetch_func):
+        """Call fetch_func for a single entity and wrap the outcome into a FetchResult"""
+        with self._get_host_semaphore(entity.url):
+            try:
+                return FetchResult(entity, fetch_func(entity), None)
+            except Exception as e:
+                logger.debug("Fetching entity '{}' failed: {}".format(entity.url, e))
+                return FetchResult(entity, None, e)
+
+    def fetch_all(self, entities, fetch_func, stop_event=None):
+        """Call fetch_func for each entity and yield a FetchResult for each of them in the order they finish.
+        Once stop_event is set, the entities which were not started yet are skipped, but running fetches are drained."""
+        entities = list(entities)
+        if not entities:
+            return
+
+        logger.info("Fetching {} entities with {} workers".format(len(entities), self.workers))
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(entities)), thread_name_prefix="fetch_engine") as executor:
+            futures = [executor.submit(self._run, entity, fetch_func) for entity in entities]
+            stopped = False
+
+            for future in as_completed(futures):
+                if not stopped and stop_event is not None and stop_event.is_set():
+                    stopped = True
+                    skipped = sum(1 for f in futures if f.cancel())
+                    logger.info("Stopping the fetch - skipping {} entities".format(skipped))
+
+                if future.cancelled():
+                    continue
+
+                yield future.result()
@@ -2,7 +2,7 @@
 import logging
 import random
 
-from .util import Ringbuffer
+from .util import ProxyPool, SessionPool, ResponseCache, RateLimiter, ParsePool
 
 logger = logging.getLogger(__name__)
 
@@ -16,17 +16,22 @@ class GeizhalsStateHandler(object):
             cls._instance = super(GeizhalsStateHandler, cls).__new__(cls)
         return cls._instance
 
-    def __init__(self, use_proxies=False, proxies=None):
+    def __init__(self, use_proxies=False, proxies=None, session_pool_size=10, session_idle_timeout=300, cache_dir=None,
+                 rate_limit=None, proxy_rate_limit=None, parse_workers=0):
         # Make sure that the object does not get overwritten each time the constructor get's called
         if GeizhalsStateHandler._initialized:
             return
 
         self.use_proxies = use_proxies
+        self.sessions = SessionPool(pool_size=session_pool_size, idle_timeout=session_idle_timeout)
+        self.response_cache = ResponseCache(cache_dir) if cache_dir else None
+        self.rate_limiter = RateLimiter(global_rate=rate_limit, proxy_rate=proxy_rate_limit)
+        self.parse_pool = ParsePool(parse_workers) if parse_workers else None
 
         if use_proxies:
             # Randomize order of proxies in the list
             random.shuffle(proxies)
-            self.proxies = Ringbuffer(proxies)
+            self.proxies = ProxyPool(proxies)
 
             self.selected_proxy = self.get_next_proxy()
 
@@ -44,3 +49,22 @@ class GeizhalsStateHandler(object):
         else:
             logger.warning("No proxies configured!")
             return None
+
+    def report_proxy_success(self, proxy, latency):
+        """Report a successful request over a proxy, so that its health score gets updated"""
+        if self.use_proxies and proxy is not None:
+            self.proxies.report_success(proxy, latency)
+
+    def report_proxy_failure(self, proxy):
+        """Report a failed request over a proxy, so that it gets chosen less often"""
+        if self.use_proxies and proxy is not None:
+            self.proxies.report_failure(proxy)
+
+    def get_proxy_stats(self):
+        if not self.use_proxies:
+            return []
+        return self.proxies.get_stats()
+
+    def get_session(self, proxy=None):
+        """Returns the keep-alive session which should be used for requests over the given proxy"""
+        return self.sessions.get(proxy)
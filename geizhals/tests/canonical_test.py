@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import geizhals.core
+from geizhals.canonical import canonicalize, get_canonical_url
+from geizhals.entities import EntityType
+
+
+class CanonicalTest(unittest.TestCase):
+
+    def test_get_canonical_url(self):
+        """Test to check if canonical urls are built correctly"""
+        self.assertEqual("https://geizhals.de/a903248.html", get_canonical_url(EntityType.PRODUCT, 903248, "de"))
+        self.assertEqual("https://geizhals.at/?cat=WL-676328", get_canonical_url(EntityType.WISHLIST, 676328, "at"))
+
+        with self.assertRaises(ValueError):
+            get_canonical_url(None, 1, "de")
+
+    def test_canonicalize_product(self):
+        """Test to check if all variants of a product url lead to the same canonical entity"""
+        variants = ["https://geizhals.de/seagate-desktop-hdd-4tb-st4000dm000-a903248.html",
+                    "https://geizhals.de/a903248.html",
+                    "http://www.geizhals.de/seagate-desktop-hdd-4tb-st4000dm000-a903248.html?hloc=at&hloc=de#offerlist",
+                    "HTTPS://Geizhals.DE/a903248.html",
+                    "Schau mal: https://geizhals.de/seagate-a903248.html"]
+
+        for variant in variants:
+            entity = canonicalize(variant)
+            self.assertEqual(EntityType.PRODUCT, entity.entity_type, msg=variant)
+            self.assertEqual(903248, entity.entity_id, msg=variant)
+            self.assertEqual("de", entity.region, msg=variant)
+            self.assertEqual("https://geizhals.de/a903248.html", entity.url, msg=variant)
+
+        self.assertEqual("at", canonicalize("https://geizhals.at/a903248.html").region)
+
+    def test_canonicalize_wishlist(self):
+        """Test to check if all variants of a wishlist url lead to the same canonical entity"""
+        variants = ["https://geizhals.eu/?cat=WL-676328",
+                    "https://www.geizhals.eu/?cat=WL-676328&hloc=de",
+                    "https://geizhals.eu/?hloc=at&cat=WL-676328"]
+
+        for variant in variants:
+            entity = canonicalize(variant)
+            self.assertEqual(EntityType.WISHLIST, entity.entity_type, msg=variant)
+            self.assertEqual(676328, entity.entity_id, msg=variant)
+            self.assertEqual("eu", entity.region, msg=variant)
+            self.assertEqual("https://geizhals.eu/?cat=WL-676328", entity.url, msg=variant)
+
+    def test_canonicalize_invalid(self):
+        """Test to check if invalid urls are not canonicalized"""
+        for text in ["", "Test", "https://example.com/a903248.html", "https://geizhals.com/a903248.html", "https://geizhals.de/?cat=hde7s"]:
+            self.assertIsNone(canonicalize(text), msg=text)
+
+    def test_fetch_key(self):
+        """Test to check if fetches of the same entity through different urls are coalesced"""
+        key = geizhals.core._get_fetch_key("https://geizhals.de/a903248.html", EntityType.PRODUCT)
+        self.assertEqual(key, geizhals.core._get_fetch_key("https://www.geizhals.de/seagate-a903248.html?hloc=at", EntityType.PRODUCT))
+        self.assertNotEqual(key, geizhals.core._get_fetch_key("https://geizhals.at/a903248.html", EntityType.PRODUCT))
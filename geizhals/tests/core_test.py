@@ -2,10 +2,19 @@
 
 import os
 import re
+import shutil
+import tempfile
+import threading
+import time
 import unittest
+from unittest import mock
+
+import requests
 
 import geizhals.core
 from geizhals.entities import EntityType
+from geizhals.exceptions import FetchStoppedException, HTTPLimitedException
+from geizhals.state_handler import GeizhalsStateHandler
 
 
 class GeizhalsCoreTest(unittest.TestCase):
@@ -20,13 +29,19 @@ class GeizhalsCoreTest(unittest.TestCase):
         with open(self.test_p_file_path, "r", encoding='utf8') as f:
             self.html_p = f.read()
 
+        with open(self.test_wl_file_path, "rb") as f:
+            self.html_wl_bytes = f.read()
+
+        with open(self.test_p_file_path, "rb") as f:
+            self.html_p_bytes = f.read()
+
     def tearDown(self):
         pass
 
     def test_send_request(self):
         """Test to check if downloading the html code of a website works"""
         regex = re.compile(r'\s')
-        html = geizhals.core.send_request("http://example.com")
+        html = geizhals.core.send_request("http://example.com").decode("utf-8")
         example_path = os.path.join(self.dir_path, "example.html")
 
         with open(example_path, "r") as f:
@@ -62,3 +77,227 @@ class GeizhalsCoreTest(unittest.TestCase):
 
         with self.assertRaises(ValueError):
             geizhals.core.parse_entity_name("Test", None)
+
+    def test_parse_price(self):
+        """Test to check if price strings are converted to floats correctly"""
+        self.assertEqual(199.65, geizhals.core.parse_price("199.65"))
+        self.assertEqual(199.0, geizhals.core.parse_price("199.--"))
+
+        with self.assertRaises(ValueError):
+            geizhals.core.parse_price("")
+
+        with self.assertRaises(ValueError):
+            geizhals.core.parse_price("abc")
+
+    def test_parse_entity(self):
+        """Test to check if name and price of entities are parsed together"""
+        data = geizhals.core.parse_entity(self.html_wl, EntityType.WISHLIST)
+        self.assertEqual("NAS", data.name)
+        self.assertEqual(717.81, data.price)
+
+        # Products without a price are not part of the wishlist products
+        self.assertEqual(6, len(data.products))
+        self.assertNotIn(1368968, [product.entity_id for product in data.products])
+        self.assertEqual(geizhals.core.WishlistProduct(entity_id=1564497, name="be quiet! Pure Power 10 300W ATX 2.4 (BN270)", price=47.90,
+                                                       path="be-quiet-pure-power-10-300w-atx-2-4-bn270-a1564497.html"), data.products[-1])
+
+        data = geizhals.core.parse_entity(self.html_p, EntityType.PRODUCT)
+        self.assertEqual("Samsung SSD 860 EVO 1TB, SATA (MZ-76E1T0B)", data.name)
+        self.assertEqual(199.65, data.price)
+        self.assertIsNone(data.products)
+
+        with self.assertRaises(ValueError):
+            geizhals.core.parse_entity("Test", "WrongEntityType")
+
+        with self.assertRaises(ValueError):
+            geizhals.core.parse_entity("Test", EntityType.PRODUCT)
+
+    def test_parse_entity_malformed_product(self):
+        """Test to check if malformed wishlist items are skipped instead of failing the whole wishlist"""
+        html_str = self.html_wl.replace('data-id="1564497"', 'data-id="abc"', 1)
+        html_str = html_str.replace('a971379.html?hloc=at&amp;hloc=de">\n                                Nanoxia Deep Silence 4 schwarz, schallged&auml;mmt (NXDS4B)',
+                                    'a971379.html?hloc=at&amp;hloc=de">', 1)
+        for fast in [True, False]:
+            data = geizhals.core.parse_entity(html_str, EntityType.WISHLIST, fast=fast)
+            self.assertEqual("NAS", data.name)
+            self.assertEqual(717.81, data.price)
+            self.assertEqual([903248, 1388368, 1329945, 1151336], [product.entity_id for product in data.products])
+
+    def test_parse_entity_parse_pool(self):
+        """Test to check if only pages which the fast path can't handle are parsed in the parse pool"""
+        GeizhalsStateHandler._instance = None
+        GeizhalsStateHandler._initialized = False
+        statehandler = GeizhalsStateHandler()
+        statehandler.parse_pool = mock.Mock()
+        statehandler.parse_pool.run.side_effect = lambda func, *args: func(*args)
+
+        try:
+            data = geizhals.core._parse_entity(self.html_p_bytes, EntityType.PRODUCT)
+            self.assertEqual(199.65, data.price)
+            statehandler.parse_pool.run.assert_not_called()
+
+            html_str = '<div class="variant__header"><h1 itemprop="name">Product</h1></div>' \
+                       '<div id="offer__price-0" class="offer__price"><span data-x="1" class="gh_price">&euro; 12,34</span></div>'
+            data = geizhals.core._parse_entity(html_str, EntityType.PRODUCT)
+            self.assertEqual(("Product", 12.34), (data.name, data.price))
+            statehandler.parse_pool.run.assert_called_once_with(geizhals.core.parse_entity, html_str, EntityType.PRODUCT, False)
+        finally:
+            GeizhalsStateHandler._instance = None
+            GeizhalsStateHandler._initialized = False
+
+    def test_parse_entity_bytes(self):
+        """Test to check if raw page bytes are parsed the same way as decoded strings"""
+        for fast in [True, False]:
+            data = geizhals.core.parse_entity(self.html_wl_bytes, EntityType.WISHLIST, fast=fast)
+            self.assertEqual("NAS", data.name)
+            self.assertEqual(717.81, data.price)
+
+            data = geizhals.core.parse_entity(self.html_p_bytes, EntityType.PRODUCT, fast=fast)
+            self.assertEqual("Samsung SSD 860 EVO 1TB, SATA (MZ-76E1T0B)", data.name)
+            self.assertEqual(199.65, data.price)
+
+        # Non-ascii characters are decoded with the charset declared by the page
+        html_bytes = '<meta http-equiv="Content-Type" content="text/html; charset=iso-8859-1">' \
+                     '<div class="wishlist"><span class="wishlist_title">Gr\xf6\xdfe &amp; Co</span></div>' \
+                     '<div class="wishlist_sum_area"><span class="gh_price"><span class="gh_price">' \
+                     '<span class="gh_price">&euro; 1,--</span></span></span></div>'.encode("iso-8859-1")
+
+        for fast in [True, False]:
+            data = geizhals.core.parse_entity(html_bytes, EntityType.WISHLIST, fast=fast)
+            self.assertEqual("Größe & Co", data.name)
+            self.assertEqual(1.0, data.price)
+
+    def test_get_entity_data_conditional(self):
+        """Test to check if unchanged pages are answered from the response cache without parsing them"""
+        cache_dir = tempfile.mkdtemp()
+        GeizhalsStateHandler._instance = None
+        GeizhalsStateHandler._initialized = False
+        statehandler = GeizhalsStateHandler(cache_dir=cache_dir)
+        url = "https://geizhals.de/?cat=WL-676328"
+
+        ok_response = mock.Mock(status_code=200, content=self.html_wl_bytes, headers={"ETag": '"v1"'})
+        not_modified_response = mock.Mock(status_code=304, content=b"", headers={"ETag": '"v1"'})
+        session = mock.Mock()
+        session.get.side_effect = [ok_response, not_modified_response]
+
+        try:
+            with mock.patch.object(statehandler, "get_session", return_value=session):
+                data = geizhals.core.get_entity_data(url, EntityType.WISHLIST)
+                self.assertEqual(("NAS", 717.81), (data.name, data.price))
+                self.assertNotIn("If-None-Match", session.get.call_args[1].get("headers"))
+
+                with mock.patch("geizhals.core.parse_entity") as parse_entity:
+                    data = geizhals.core.get_entity_data(url, EntityType.WISHLIST)
+                    parse_entity.assert_not_called()
+
+                self.assertEqual(("NAS", 717.81), (data.name, data.price))
+                self.assertEqual(6, len(data.products))
+                self.assertIsInstance(data.products[0], geizhals.core.WishlistProduct)
+                self.assertEqual('"v1"', session.get.call_args[1].get("headers").get("If-None-Match"))
+
+            stats = statehandler.response_cache.get_stats()
+            self.assertEqual(1, stats.get("hits"))
+            self.assertEqual(1, stats.get("misses"))
+            self.assertEqual(len(self.html_wl_bytes), stats.get("bytes_saved"))
+        finally:
+            GeizhalsStateHandler._instance = None
+            GeizhalsStateHandler._initialized = False
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    def test_download_retry_after(self):
+        """Test to check if 429 responses and timeouts are retried after waiting"""
+        GeizhalsStateHandler._instance = None
+        GeizhalsStateHandler._initialized = False
+        statehandler = GeizhalsStateHandler()
+
+        limited_response = mock.Mock(status_code=429, content=b"", headers={"Retry-After": "7"})
+        ok_response = mock.Mock(status_code=200, content=b"<html></html>", headers={})
+        session = mock.Mock()
+
+        try:
+            with mock.patch.object(statehandler, "get_session", return_value=session), mock.patch("geizhals.core.time.sleep") as sleep:
+                session.get.side_effect = [requests.Timeout("timed out"), limited_response, ok_response]
+                self.assertEqual(b"<html></html>", geizhals.core.send_request("https://geizhals.de/a1.html"))
+
+                self.assertEqual(3, session.get.call_count)
+                self.assertEqual(2, sleep.call_count)
+                # The second wait is the rate limiter honoring the Retry-After header
+                self.assertAlmostEqual(7, sleep.call_args_list[1][0][0], places=1)
+
+                # Only network errors - the last error is raised
+                session.get.side_effect = requests.ConnectionError("refused")
+                with self.assertRaises(requests.ConnectionError):
+                    geizhals.core.send_request("https://geizhals.de/a1.html")
+
+                # Only 429 responses
+                session.get.side_effect = None
+                session.get.return_value = limited_response
+                with self.assertRaises(HTTPLimitedException):
+                    geizhals.core.send_request("https://geizhals.de/a1.html")
+        finally:
+            GeizhalsStateHandler._instance = None
+            GeizhalsStateHandler._initialized = False
+
+    def test_download_stop_event(self):
+        """Test to check if a set stop event interrupts the waits of a download instead of sending the request"""
+        GeizhalsStateHandler._instance = None
+        GeizhalsStateHandler._initialized = False
+        statehandler = GeizhalsStateHandler()
+        session = mock.Mock()
+        stop_event = threading.Event()
+
+        try:
+            with mock.patch.object(statehandler, "get_session", return_value=session):
+                # The backoff after a timeout is interrupted
+                session.get.side_effect = requests.Timeout("timed out")
+                timer = threading.Timer(0.1, stop_event.set)
+                timer.start()
+                start = time.monotonic()
+                with self.assertRaises(FetchStoppedException):
+                    geizhals.core._download("https://geizhals.de/a1.html", stop_event=stop_event)
+                self.assertLess(time.monotonic() - start, 0.4)
+                self.assertEqual(1, session.get.call_count)
+                timer.join()
+
+                # A cool-down is not waited for and no request is sent during it
+                statehandler.rate_limiter.report_limited(None, retry_after=120)
+                with self.assertRaises(FetchStoppedException):
+                    geizhals.core._download("https://geizhals.de/a1.html", stop_event=stop_event)
+                self.assertEqual(1, session.get.call_count)
+        finally:
+            GeizhalsStateHandler._instance = None
+            GeizhalsStateHandler._initialized = False
+
+    def test_get_entity_data_coalescing(self):
+        """Test to check if concurrent requests for the same url share a single download"""
+        GeizhalsStateHandler._instance = None
+        GeizhalsStateHandler._initialized = False
+        statehandler = GeizhalsStateHandler()
+
+        def slow_get(*args, **kwargs):
+            time.sleep(0.2)
+            return mock.Mock(status_code=200, content=self.html_wl_bytes, headers={})
+
+        session = mock.Mock()
+        session.get.side_effect = slow_get
+        urls = ["https://geizhals.de/?cat=WL-676328", "https://GEIZHALS.de/?cat=WL-676328#top", "https://geizhals.de/?cat=WL-676328"]
+        results = []
+
+        def fetch(url):
+            results.append(geizhals.core.get_entity_data(url, EntityType.WISHLIST))
+
+        try:
+            with mock.patch.object(statehandler, "get_session", return_value=session):
+                threads = [threading.Thread(target=fetch, args=(url,)) for url in urls]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+
+            self.assertEqual(1, session.get.call_count)
+            self.assertEqual(3, len(results))
+            for data in results:
+                self.assertEqual(("NAS", 717.81), (data.name, data.price))
+        finally:
+            GeizhalsStateHandler._instance = None
+            GeizhalsStateHandler._initialized = False
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+
+import geizhals.core
+from geizhals import fast_extractor
+from geizhals.entities import EntityType
+
+
+class FastExtractorTest(unittest.TestCase):
+    dir_path = os.path.dirname(os.path.abspath(__file__))
+    test_wl_file_path = os.path.join(dir_path, "test_wishlist.html")
+    test_p_file_path = os.path.join(dir_path, "test_product.html")
+
+    def setUp(self):
+        with open(self.test_wl_file_path, "r", encoding='utf8') as f:
+            self.html_wl = f.read()
+
+        with open(self.test_p_file_path, "r", encoding='utf8') as f:
+            self.html_p = f.read()
+
+    def tearDown(self):
+        pass
+
+    def test_extract_price(self):
+        """Test to check if the fast path extracts the same prices as the PyQuery parser"""
+        for html_str, entity_type in [(self.html_wl, EntityType.WISHLIST), (self.html_p, EntityType.PRODUCT)]:
+            self.assertEqual(geizhals.core.parse_entity_price(html_str, entity_type), fast_extractor.extract_price(html_str, entity_type))
+
+        self.assertIsNone(fast_extractor.extract_price("Test", EntityType.PRODUCT))
+        self.assertIsNone(fast_extractor.extract_price("Test", EntityType.WISHLIST))
+
+        with self.assertRaises(ValueError):
+            fast_extractor.extract_price("Test", None)
+
+    def test_extract_price_first_offer_only(self):
+        """Test to check if the price is only taken from the first offer and not from another one"""
+        offer = 'id="offer__price-0"><span class="gh_price">&euro; 199,65</span>'
+        html_str = self.html_p.replace(offer, 'id="offer__price-0"><span class="gh_price"></span>')
+        self.assertNotEqual(html_str, self.html_p)
+        # The other offers still have a price
+        self.assertIn('id="offer__price-1"', html_str)
+
+        self.assertIsNone(fast_extractor.extract_price(html_str, EntityType.PRODUCT))
+        self.assertEqual("", geizhals.core.parse_entity_price(html_str, EntityType.PRODUCT))
+
+        # The first offer must be closed properly
+        html_str = '<div id="offer__price-0"><div></div>'
+        self.assertIsNone(fast_extractor.extract_price(html_str + '<span class="gh_price">&euro; 1,00</span>', EntityType.PRODUCT))
+
+    def test_extract_name(self):
+        """Test to check if the fast path extracts the same names as the PyQuery parser"""
+        for html_str, entity_type in [(self.html_wl, EntityType.WISHLIST), (self.html_p, EntityType.PRODUCT)]:
+            self.assertEqual(geizhals.core.parse_entity_name(html_str, entity_type), fast_extractor.extract_name(html_str, entity_type))
+
+        self.assertIsNone(fast_extractor.extract_name("Test", EntityType.PRODUCT))
+        self.assertIsNone(fast_extractor.extract_name("Test", EntityType.WISHLIST))
+
+        # Names with html entities or surrounding whitespace are cleaned up
+        html_str = '<div class="wishlist"><span class="wishlist_title" data-id="WL-1">\n  Gr&ouml;&szlig;e  </span></div>'
+        self.assertEqual("Größe", fast_extractor.extract_name(html_str, EntityType.WISHLIST))
+
+        with self.assertRaises(ValueError):
+            fast_extractor.extract_name("Test", "WrongEntityType")
+
+    def test_extract_wishlist_products(self):
+        """Test to check if the fast path extracts the same wishlist products as the PyQuery parser"""
+        fast_data = geizhals.core.parse_entity(self.html_wl, EntityType.WISHLIST, fast=True)
+        data = geizhals.core.parse_entity(self.html_wl, EntityType.WISHLIST, fast=False)
+        self.assertEqual(data.products, fast_data.products)
+
+        products = fast_extractor.extract_wishlist_products(self.html_wl)
+        self.assertEqual(6, len(products))
+        self.assertEqual((903248, "Seagate Desktop HDD 4TB, SATA 6Gb/s (ST4000DM000)", "99.99",
+                          "seagate-desktop-hdd-4tb-st4000dm000-a903248.html"), products[0])
+
+        self.assertEqual([], fast_extractor.extract_wishlist_products("Test"))
+
+        # Items without a link to the product can't be parsed by the fast path
+        html_str = '<div class="wishlist__item " data-id="1"><a href="a1.html">Product</a></div>'
+        self.assertIsNone(fast_extractor.extract_wishlist_products(html_str))
+
+    def test_parse_entity_fallback(self):
+        """Test to check if parse_entity falls back to PyQuery when the fast path does not find anything"""
+        # Attribute order differs from what the fast path expects
+        html_str = '<div class="variant__header"><h1 itemprop="name">Product</h1></div>' \
+                   '<div id="offer__price-0" class="offer__price"><span data-x="1" class="gh_price">&euro; 12,34</span></div>'
+
+        self.assertIsNone(fast_extractor.extract_price(html_str, EntityType.PRODUCT))
+
+        data = geizhals.core.parse_entity(html_str, EntityType.PRODUCT)
+        self.assertEqual("Product", data.name)
+        self.assertEqual(12.34, data.price)
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+import unittest
+
+from geizhals.entities import Product
+from geizhals.fetch_engine import FetchEngine
+
+
+class FetchEngineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.entities = [Product(i, "Product {}".format(i), "https://geizhals.de/a{}.html".format(i), 1.0) for i in range(8)]
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def tearDown(self):
+        pass
+
+    def helper_slow_fetch(self, entity):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+
+        time.sleep(0.2)
+
+        with self.lock:
+            self.running -= 1
+
+        return entity.entity_id
+
+    def test_fetch_all(self):
+        """Test to check if all entities are fetched in parallel"""
+        engine = FetchEngine(workers=8, per_host_limit=8)
+
+        start = time.time()
+        results = list(engine.fetch_all(self.entities, self.helper_slow_fetch))
+        duration = time.time() - start
+
+        self.assertEqual(len(self.entities), len(results))
+        self.assertEqual(sorted(e.entity_id for e in self.entities), sorted(r.result for r in results))
+
+        for result in results:
+            self.assertIsNone(result.error)
+            self.assertEqual(result.entity.entity_id, result.result)
+
+        # Sequential fetching would take 8 * 0.2 seconds
+        self.assertLess(duration, 0.8)
+
+    def test_per_host_limit(self):
+        """Test to check if the number of concurrent requests per host is limited"""
+        engine = FetchEngine(workers=8, per_host_limit=2)
+        list(engine.fetch_all(self.entities, self.helper_slow_fetch))
+
+        self.assertEqual(2, self.max_running)
+
+    def test_fetch_all_errors(self):
+        """Test to check if exceptions are returned as part of the result instead of being raised"""
+        engine = FetchEngine(workers=2)
+
+        def failing_fetch(entity):
+            raise ValueError("Price for {} could not be parsed".format(entity.entity_id))
+
+        results = list(engine.fetch_all(self.entities[:3], failing_fetch))
+
+        self.assertEqual(3, len(results))
+        for result in results:
+            self.assertIsNone(result.result)
+            self.assertIsInstance(result.error, ValueError)
+
+        # Empty input must not fail
+        self.assertEqual([], list(engine.fetch_all([], failing_fetch)))
+
+        with self.assertRaises(ValueError):
+            FetchEngine(workers=0)
+
+    def test_fetch_all_stop_event(self):
+        """Test to check if entities which were not started yet are skipped once the stop event is set"""
+        engine = FetchEngine(workers=2, per_host_limit=2)
+        stop_event = threading.Event()
+
+        results = []
+        for result in engine.fetch_all(self.entities, self.helper_slow_fetch, stop_event=stop_event):
+            results.append(result)
+            stop_event.set()
+
+        # Both workers might have picked up the next entities before the event was checked - those are still drained
+        self.assertLessEqual(len(results), 4)
+        self.assertGreaterEqual(len(results), 1)
+        for result in results:
+            self.assertIsNone(result.error)
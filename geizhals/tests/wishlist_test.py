@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
 
+import os
+import re
 import unittest
+from unittest import mock
 
-from geizhals.entities import Wishlist
+import geizhals.core
+from geizhals.entities import EntityType, Product, Wishlist
 from geizhals.exceptions import InvalidWishlistURLException
 
 
@@ -40,6 +44,19 @@ class WishlistTest(unittest.TestCase):
 
     def test_get_wishlist_products(self):
         """Test to check if getting the products of a wishlist works as intended"""
-        # Since this is not implemented yet, there should be a exception
-        with self.assertRaises(NotImplementedError):
-            self.wl.get_wishlist_products()
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_wishlist.html"), "rb") as f:
+            data = geizhals.core.parse_entity(f.read(), EntityType.WISHLIST)
+
+        with mock.patch("geizhals.core.get_entity_data", return_value=data) as get_entity_data:
+            products = self.wl.get_wishlist_products()
+            # Name, price and products are all taken from the same download
+            self.assertEqual(self.wl.get_current_name(), "NAS")
+            get_entity_data.assert_called_once_with(self.wl.url, EntityType.WISHLIST, None)
+
+        self.assertEqual(6, len(products))
+        for product in products:
+            self.assertEqual(type(product), Product)
+            self.assertEqual(product.entity_id, int(re.search(Product.url_pattern, product.url).group(2)))
+
+        self.assertEqual("https://geizhals.de/a903248.html", products[0].url)
+        self.assertEqual(99.99, products[0].price)
@@ -1,4 +1,10 @@
 # -*- coding: utf-8 -*-
 from .ringbuffer import Ringbuffer
+from .sessionpool import SessionPool
+from .responsecache import ResponseCache
+from .proxypool import ProxyPool
+from .ratelimiter import RateLimiter, TokenBucket
+from .singleflight import SingleFlight
+from .parsepool import ParsePool
 
-__all__ = ['Ringbuffer']
+__all__ = ['Ringbuffer', 'SessionPool', 'ResponseCache', 'ProxyPool', 'RateLimiter', 'TokenBucket', 'SingleFlight', 'ParsePool']
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import logging
+import multiprocessing
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+def _noop(_):
+    return None
+
+
+def _get_default_context():
+    """Returns the fork context where it exists. With spawn or forkserver - the default of newer Python versions - every
+    worker would import the main module again, and main.py sets up the whole bot on import."""
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+
+    return None
+
+
+class ParsePool(object):
+    """Runs CPU bound parsing in worker processes, so that it does not hold the GIL of the bot process"""
+
+    def __init__(self, workers, mp_context=None):
+        if workers < 1:
+            raise ValueError("The number of parse workers must be at least 1!")
+
+        self.workers = workers
+        mp_context = mp_context or _get_default_context()
+        # Python 3.6 always forks on Linux and does not take a context yet
+        if mp_context is not None and sys.version_info >= (3, 7):
+            self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=mp_context)
+        else:
+            self._executor = ProcessPoolExecutor(max_workers=workers)
+
+        # Start all worker processes right away - the later the processes get forked, the more threads are running
+        list(self._executor.map(_noop, range(workers)))
+        logger.info("Started {} parse worker processes".format(workers))
+
+    def run(self, func, *args):
+        """Run a module level function in one of the worker processes and return its result.
+        Arguments and result are pickled, so they should be small - e.g. raw page bytes in and parsed fields out."""
+        return self._executor.submit(func, *args).result()
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
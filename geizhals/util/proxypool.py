@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ProxyStats(object):
+    """Health statistics of a single proxy"""
+
+    def __init__(self, proxy):
+        self.proxy = proxy
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.latency = None
+        self.quarantined_until = 0
+        # Used by the smooth weighted round robin selection
+        self.current_weight = 0.0
+
+    @property
+    def success_rate(self):
+        # Laplace smoothing, so that new proxies start with a rate of 0.5 instead of 0 or 1
+        return (self.successes + 1) / (self.successes + self.failures + 2)
+
+    @property
+    def weight(self):
+        """Health score of the proxy - higher success rates and lower latencies lead to a higher weight"""
+        latency = self.latency if self.latency is not None else 0
+        return self.success_rate / (1 + latency)
+
+    def is_quarantined(self, now):
+        return self.quarantined_until > now
+
+    def to_dict(self, now):
+        return dict(proxy=self.proxy, successes=self.successes, failures=self.failures,
+                    consecutive_failures=self.consecutive_failures, success_rate=self.success_rate,
+                    latency=self.latency, quarantined=self.is_quarantined(now))
+
+
+class ProxyPool(object):
+    """Selects proxies weighted by their health and quarantines proxies which fail repeatedly"""
+
+    def __init__(self, proxies, max_failures=3, base_cooldown=30, max_cooldown=1800, ewma_alpha=0.3):
+        self.max_failures = max_failures
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self.ewma_alpha = ewma_alpha
+        self._stats = [ProxyStats(proxy) for proxy in proxies]
+        self._stats_by_proxy = {stats.proxy: stats for stats in self._stats}
+        self._lock = threading.Lock()
+
+    def next(self):
+        """Returns the next proxy to use or None if the pool is empty"""
+        now = time.monotonic()
+
+        with self._lock:
+            if not self._stats:
+                logger.error("Proxy pool is empty. Returning None!")
+                return None
+
+            candidates = [stats for stats in self._stats if not stats.is_quarantined(now)]
+            if not candidates:
+                stats = min(self._stats, key=lambda s: s.quarantined_until)
+                logger.warning("All proxies are quarantined, using '{}' which is released first!".format(stats.proxy))
+                return stats.proxy
+
+            # Smooth weighted round robin - with equal weights this is a plain round robin
+            total_weight = 0.0
+            best = None
+            for stats in candidates:
+                stats.current_weight += stats.weight
+                total_weight += stats.weight
+                if best is None or stats.current_weight > best.current_weight:
+                    best = stats
+
+            best.current_weight -= total_weight
+            return best.proxy
+
+    def report_success(self, proxy, latency):
+        """Mark a request over a proxy as successful and update its latency average"""
+        with self._lock:
+            stats = self._stats_by_proxy.get(proxy)
+            if stats is None:
+                return
+
+            stats.successes += 1
+            stats.consecutive_failures = 0
+            stats.quarantined_until = 0
+
+            if stats.latency is None:
+                stats.latency = latency
+            else:
+                stats.latency = self.ewma_alpha * latency + (1 - self.ewma_alpha) * stats.latency
+
+    def report_failure(self, proxy):
+        """Mark a request over a proxy as failed - after too many consecutive failures the proxy gets quarantined"""
+        with self._lock:
+            stats = self._stats_by_proxy.get(proxy)
+            if stats is None:
+                return
+
+            stats.failures += 1
+            stats.consecutive_failures += 1
+
+            if stats.consecutive_failures >= self.max_failures:
+                exponent = min(stats.consecutive_failures - self.max_failures, 16)
+                cooldown = min(self.base_cooldown * 2 ** exponent, self.max_cooldown)
+                stats.quarantined_until = time.monotonic() + cooldown
+                stats.current_weight = 0.0
+                logger.warning("Proxy '{}' failed {} times in a row, quarantining it for {} seconds".format(proxy, stats.consecutive_failures, cooldown))
+
+    def get_stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return [stats.to_dict(now) for stats in self._stats]
+
+    def __len__(self):
+        return len(self._stats)
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+import logging
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+
+def parse_retry_after(value):
+    """Parse the value of a Retry-After header (seconds or http date) and return the seconds to wait or None"""
+    if not value:
+        return None
+
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+
+    try:
+        retry_date = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+
+    if retry_date is None:
+        return None
+
+    return max(0.0, retry_date.timestamp() - time.time())
+
+
+def _sleep(seconds, stop_event=None):
+    """Sleep for the given seconds - returns False as soon as stop_event gets set"""
+    if stop_event is None:
+        time.sleep(seconds)
+        return True
+
+    return not stop_event.wait(seconds)
+
+
+class TokenBucket(object):
+    """Thread safe token bucket - rate is the number of tokens per second, capacity the max. burst size"""
+
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError("The rate must be greater than 0!")
+
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def get_wait_time(self):
+        """Returns the seconds until a token is available without taking it"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return max(0.0, (1 - self._tokens) / self.rate)
+
+    def is_full(self):
+        """Returns True if the bucket refilled completely - it behaves like a new bucket then"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens >= self.capacity
+
+    def try_acquire(self):
+        """Take a token if one is available - returns the seconds to wait for the next token otherwise"""
+        with self._lock:
+            self._refill(time.monotonic())
+
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self, stop_event=None):
+        """Block until a token is available - returns False without a token if stop_event gets set in the meantime"""
+        while True:
+            wait_time = self.try_acquire()
+            if wait_time <= 0:
+                return True
+            if not _sleep(wait_time, stop_event):
+                return False
+
+
+class RateLimiter(object):
+    """Limits the request rate globally and per proxy and handles the cool-downs after HTTP 429 responses"""
+
+    def __init__(self, global_rate=None, proxy_rate=None, base_backoff=1.0, max_backoff=60.0,
+                 cooldown_threshold=5, cooldown_window=60.0, cooldown_time=120.0):
+        self.proxy_rate = proxy_rate
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.cooldown_threshold = cooldown_threshold
+        self.cooldown_window = cooldown_window
+        self.cooldown_time = cooldown_time
+
+        self._global_bucket = TokenBucket(global_rate) if global_rate else None
+        self._proxy_buckets = {}
+        self._blocked_until = {}
+        self._limited_times = deque()
+        self._cooldown_until = 0
+        self._lock = threading.Lock()
+
+    def _get_proxy_bucket(self, proxy):
+        if not self.proxy_rate:
+            return None
+
+        with self._lock:
+            bucket = self._proxy_buckets.get(proxy)
+            if bucket is None:
+                bucket = TokenBucket(self.proxy_rate)
+                self._proxy_buckets[proxy] = bucket
+            return bucket
+
+    def is_blocked(self, proxy):
+        """Returns True if the proxy sent a Retry-After which did not pass yet"""
+        with self._lock:
+            return self._blocked_until.get(proxy, 0) > time.monotonic()
+
+    def wait(self, proxy=None, stop_event=None):
+        """Block until a request over the given proxy (None for direct connections) is allowed.
+        Returns False if stop_event gets set while waiting - the request must not be sent then."""
+        with self._lock:
+            wait_until = max(self._cooldown_until, self._blocked_until.get(proxy, 0))
+
+        wait_time = wait_until - time.monotonic()
+        if wait_time > 0:
+            logger.info("Waiting {:.1f} seconds before sending the next request over '{}'".format(wait_time, proxy))
+            if not _sleep(wait_time, stop_event):
+                return False
+
+        if self._global_bucket and not self._global_bucket.acquire(stop_event):
+            return False
+
+        proxy_bucket = self._get_proxy_bucket(proxy)
+        if proxy_bucket and not proxy_bucket.acquire(stop_event):
+            return False
+
+        return True
+
+    def report_limited(self, proxy=None, retry_after=None):
+        """Register a HTTP 429 response - many of them in a short time trigger a global cool-down"""
+        now = time.monotonic()
+
+        with self._lock:
+            if retry_after:
+                self._blocked_until[proxy] = now + min(retry_after, self.cooldown_time)
+
+            self._limited_times.append(now)
+            while self._limited_times and self._limited_times[0] < now - self.cooldown_window:
+                self._limited_times.popleft()
+
+            if len(self._limited_times) >= self.cooldown_threshold and self._cooldown_until <= now:
+                logger.warning("Received {} HTTP 429 responses within {} seconds, pausing all requests "
+                               "for {} seconds!".format(len(self._limited_times), self.cooldown_window, self.cooldown_time))
+                self._cooldown_until = now + self.cooldown_time
+                self._limited_times.clear()
+
+    def get_backoff(self, attempt):
+        """Returns the seconds to wait before the next attempt - exponential with jitter"""
+        backoff = min(self.max_backoff, self.base_backoff * 2 ** attempt)
+        return backoff / 2 + random.uniform(0, backoff / 2)
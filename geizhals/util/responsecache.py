@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class CacheEntry(object):
+    """Validators and parsed data of a previously downloaded page"""
+
+    def __init__(self, url, etag=None, last_modified=None, size=0, data=None):
+        self.url = url
+        self.etag = etag
+        self.last_modified = last_modified
+        self.size = size
+        self.data = data
+
+    @property
+    def validators(self):
+        """Returns the headers for a conditional GET request of the cached page"""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache(object):
+    """On disk cache for the ETag/Last-Modified validators and the parsed data of pages"""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self._entries = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+    def _get_path(self, url, extension):
+        file_name = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, "{}.{}".format(file_name, extension))
+
+    @staticmethod
+    def _write_file(path, content):
+        """Write a file atomically, so that a crash never leaves a half written cache file behind"""
+        tmp_path = "{}.{}.tmp".format(path, threading.get_ident())
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def get(self, url):
+        """Returns the cache entry for an url or None if the url is not cached"""
+        with self._lock:
+            entry = self._entries.get(url)
+
+        if entry is not None:
+            return entry
+
+        try:
+            with open(self._get_path(url, "json"), "r", encoding="utf-8") as f:
+                entry = CacheEntry(url=url, **json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+
+        with self._lock:
+            self._entries[url] = entry
+        return entry
+
+    def store(self, url, headers, body, data=None):
+        """Store the validators of a response - responses without validators can't be revalidated and are dropped"""
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+
+        if not etag and not last_modified:
+            self.remove(url)
+            return
+
+        entry = CacheEntry(url=url, etag=etag, last_modified=last_modified, size=len(body), data=data)
+        metadata = dict(etag=entry.etag, last_modified=entry.last_modified, size=entry.size, data=entry.data)
+
+        try:
+            self._write_file(self._get_path(url, "json"), json.dumps(metadata).encode("utf-8"))
+        except OSError as e:
+            logger.error("Could not write cache entry for '{}': {}".format(url, e))
+            return
+
+        with self._lock:
+            self._entries[url] = entry
+
+    def remove(self, url):
+        with self._lock:
+            self._entries.pop(url, None)
+
+        try:
+            os.remove(self._get_path(url, "json"))
+        except OSError:
+            pass
+
+    def prune(self, urls):
+        """Remove the entries of all urls except the given ones - e.g. of entities which are not tracked anymore.
+        Bodies stored by older versions are removed as well. Returns the number of removed files."""
+        urls = set(urls)
+        keep_files = {os.path.basename(self._get_path(url, "json")) for url in urls}
+        with self._lock:
+            self._entries = {url: entry for url, entry in self._entries.items() if url in urls}
+
+        removed = 0
+        try:
+            file_names = os.listdir(self.cache_dir)
+        except OSError as e:
+            logger.error("Could not list the cache directory: {}".format(e))
+            return removed
+
+        for file_name in file_names:
+            # Temporary files of running writes are left alone
+            if file_name in keep_files or file_name.endswith(".tmp"):
+                continue
+
+            try:
+                os.remove(os.path.join(self.cache_dir, file_name))
+                removed += 1
+            except OSError:
+                pass
+
+        if removed > 0:
+            logger.info("Removed {} files of untracked urls from the response cache".format(removed))
+        return removed
+
+    def record_hit(self, entry):
+        """Count a 304 response for a cached entry"""
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += entry.size
+
+    def record_miss(self):
+        """Count a full download"""
+        with self._lock:
+            self.misses += 1
+
+    def get_stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            hit_rate = self.hits / total if total > 0 else 0.0
+            return dict(hits=self.hits, misses=self.misses, hit_rate=hit_rate, bytes_saved=self.bytes_saved)
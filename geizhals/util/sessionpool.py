@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class SessionPool(object):
+    """Keeps one keep-alive requests.Session per proxy, so that consecutive requests reuse their connections"""
+
+    def __init__(self, pool_size=10, idle_timeout=300):
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        # Maps a proxy (or None for direct connections) to a list of [session, last_used]
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _create_session(self, proxy):
+        logger.debug("Creating new session for proxy '{}'".format(proxy))
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _evict_idle(self, now):
+        """Close and remove all the sessions which were not used within the idle timeout"""
+        for proxy, (session, last_used) in list(self._sessions.items()):
+            if now - last_used > self.idle_timeout:
+                logger.debug("Evicting idle session for proxy '{}'".format(proxy))
+                session.close()
+                del self._sessions[proxy]
+
+    def get(self, proxy=None):
+        """Returns the session for the given proxy and creates it if there is none yet"""
+        now = time.monotonic()
+
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._sessions.get(proxy)
+
+            if entry is None:
+                entry = [self._create_session(proxy), now]
+                self._sessions[proxy] = entry
+
+            entry[1] = now
+
+        return entry[0]
+
+    def close(self):
+        """Close all the sessions of the pool"""
+        with self._lock:
+            for session, _ in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+    def __len__(self):
+        return len(self._sessions)
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class _Call(object):
+    """A function call which is currently in flight"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight(object):
+    """Coalesces concurrent calls with the same key, so that the function runs only once and all callers share its result"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, *args, **kwargs):
+        """Call func for the given key - if a call for the key is already running, wait for it and return its result"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                call.waiters += 1
+
+        if not leader:
+            logger.debug("Joining in-flight call for '{}'".format(key))
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def __len__(self):
+        return len(self._calls)
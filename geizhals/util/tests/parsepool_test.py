@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+import multiprocessing
+import os
+import sys
+import unittest
+
+import geizhals.core
+from geizhals.entities import EntityType
+from geizhals.util.parsepool import ParsePool
+
+
+class ParsePoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = ParsePool(workers=2)
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def test_invalid_workers(self):
+        """Test to check if pools without workers are rejected"""
+        with self.assertRaises(ValueError):
+            ParsePool(workers=0)
+
+    def test_run(self):
+        """Test to check if functions are run in the worker processes and their results are returned"""
+        self.assertNotEqual(os.getpid(), self.pool.run(os.getpid))
+        self.assertEqual(1024, self.pool.run(pow, 2, 10))
+
+    def test_run_parse_entity(self):
+        """Test to check if pages are parsed the same way in the worker processes"""
+        test_wl_file_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "tests", "test_wishlist.html")
+        with open(test_wl_file_path, "rb") as f:
+            html_wl_bytes = f.read()
+
+        data = self.pool.run(geizhals.core.parse_entity, html_wl_bytes, EntityType.WISHLIST, False)
+        self.assertEqual(geizhals.core.parse_entity(html_wl_bytes, EntityType.WISHLIST), data)
+
+    def test_run_exception(self):
+        """Test to check if exceptions of the worker processes are raised in the caller"""
+        with self.assertRaises(ValueError):
+            self.pool.run(geizhals.core.parse_entity, b"Test", EntityType.PRODUCT, False)
+
+    @unittest.skipIf(sys.version_info < (3, 7), "Python 3.6 does not take a multiprocessing context")
+    def test_run_spawn_context(self):
+        """Test to check if the pool works with worker processes which are not forked"""
+        pool = ParsePool(workers=1, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            self.assertEqual("123.45", pool.run(geizhals.core.parse_entity_price,
+                                                '<div id="offer__price-0"><span class="gh_price">&euro; 123,45</span></div>', EntityType.PRODUCT))
+        finally:
+            pool.shutdown()
+
+    @unittest.skipIf(sys.version_info < (3, 7), "Python 3.6 does not take a multiprocessing context")
+    def test_default_context(self):
+        """Test to check if the worker processes are forked by default where it is possible"""
+        if "fork" in multiprocessing.get_all_start_methods():
+            self.assertEqual("fork", self.pool._executor._mp_context.get_start_method())
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+
+import time
+import unittest
+
+from geizhals.util.proxypool import ProxyPool
+
+
+class ProxyPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.proxies = ['http://proxy1.net', 'http://proxy2.net', 'http://proxy3.net']
+        self.pool = ProxyPool(self.proxies, max_failures=2, base_cooldown=0.1, max_cooldown=0.4)
+
+    def tearDown(self):
+        pass
+
+    def test_next_round_robin(self):
+        """Test to check if proxies with equal health are used in a round robin fashion"""
+        self.assertEqual(len(self.proxies), len(self.pool))
+
+        selected = [self.pool.next() for _ in range(6)]
+        self.assertEqual(self.proxies + self.proxies, selected)
+
+        self.assertIsNone(ProxyPool([]).next())
+
+    def test_next_weighted(self):
+        """Test to check if healthy proxies are chosen more often than slow or failing ones"""
+        self.pool.report_success('http://proxy1.net', 0.1)
+        self.pool.report_success('http://proxy2.net', 3.0)
+        self.pool.report_failure('http://proxy3.net')
+
+        counts = {proxy: 0 for proxy in self.proxies}
+        for _ in range(100):
+            counts[self.pool.next()] += 1
+
+        self.assertGreater(counts['http://proxy1.net'], counts['http://proxy2.net'])
+        self.assertGreater(counts['http://proxy1.net'], counts['http://proxy3.net'])
+        # Unhealthy proxies are still used from time to time
+        self.assertGreater(counts['http://proxy2.net'], 0)
+        self.assertGreater(counts['http://proxy3.net'], 0)
+
+    def test_quarantine(self):
+        """Test to check if failing proxies are quarantined with an exponential cool-down"""
+        proxy = 'http://proxy1.net'
+        self.pool.report_failure(proxy)
+        self.assertIn(proxy, [self.pool.next() for _ in range(3)])
+
+        self.pool.report_failure(proxy)
+        self.assertNotIn(proxy, [self.pool.next() for _ in range(6)])
+
+        time.sleep(0.15)
+        self.assertIn(proxy, [self.pool.next() for _ in range(3)])
+
+        # The next failure doubles the cool-down
+        self.pool.report_failure(proxy)
+        time.sleep(0.15)
+        self.assertNotIn(proxy, [self.pool.next() for _ in range(6)])
+
+        # A success releases the proxy again
+        self.pool.report_success(proxy, 0.1)
+        self.assertIn(proxy, [self.pool.next() for _ in range(3)])
+
+    def test_all_quarantined(self):
+        """Test to check if the proxy which is released first is used when all proxies are quarantined"""
+        for proxy in self.proxies:
+            self.pool.report_failure(proxy)
+            self.pool.report_failure(proxy)
+
+        self.assertEqual('http://proxy1.net', self.pool.next())
+
+    def test_get_stats(self):
+        """Test to check if the health statistics are exposed"""
+        self.pool.report_success('http://proxy1.net', 1.0)
+        self.pool.report_success('http://proxy1.net', 2.0)
+        self.pool.report_failure('http://proxy2.net')
+        self.pool.report_failure('http://proxy2.net')
+        # Unknown proxies are ignored
+        self.pool.report_failure('http://unknown.net')
+
+        stats = {s.get("proxy"): s for s in self.pool.get_stats()}
+        self.assertEqual(3, len(stats))
+
+        self.assertEqual(2, stats['http://proxy1.net'].get("successes"))
+        self.assertAlmostEqual(1.3, stats['http://proxy1.net'].get("latency"))
+        self.assertEqual(0.75, stats['http://proxy1.net'].get("success_rate"))
+        self.assertFalse(stats['http://proxy1.net'].get("quarantined"))
+
+        self.assertEqual(2, stats['http://proxy2.net'].get("consecutive_failures"))
+        self.assertTrue(stats['http://proxy2.net'].get("quarantined"))
+
+        self.assertIsNone(stats['http://proxy3.net'].get("latency"))
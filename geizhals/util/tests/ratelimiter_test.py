@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+
+import threading
+import time
+import unittest
+from email.utils import formatdate
+
+from geizhals.util.ratelimiter import RateLimiter, TokenBucket, parse_retry_after
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_parse_retry_after(self):
+        """Test to check if both formats of the Retry-After header are parsed"""
+        self.assertEqual(120, parse_retry_after("120"))
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after(""))
+        self.assertIsNone(parse_retry_after("soon"))
+
+        retry_after = parse_retry_after(formatdate(time.time() + 60, usegmt=True))
+        self.assertAlmostEqual(60, retry_after, delta=2)
+
+        # Dates in the past mean that we can retry immediately
+        self.assertEqual(0, parse_retry_after(formatdate(time.time() - 60, usegmt=True)))
+
+    def test_token_bucket(self):
+        """Test to check if the token bucket limits the rate after the initial burst"""
+        bucket = TokenBucket(rate=20, capacity=2)
+        self.assertEqual(0, bucket.try_acquire())
+        self.assertEqual(0, bucket.try_acquire())
+        self.assertGreater(bucket.try_acquire(), 0)
+
+        start = time.monotonic()
+        for _ in range(4):
+            bucket.acquire()
+        duration = time.monotonic() - start
+
+        self.assertGreater(duration, 0.15)
+
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=0)
+
+    def test_token_bucket_wait_time(self):
+        """Test to check if peeking at the wait time does not take a token"""
+        bucket = TokenBucket(rate=1, capacity=1)
+        self.assertEqual(0, bucket.get_wait_time())
+        self.assertEqual(0, bucket.get_wait_time())
+
+        self.assertEqual(0, bucket.try_acquire())
+        self.assertAlmostEqual(1, bucket.get_wait_time(), delta=0.1)
+
+    def test_wait_rate(self):
+        """Test to check if wait respects the global and the per proxy rate"""
+        limiter = RateLimiter(global_rate=100, proxy_rate=10)
+
+        start = time.monotonic()
+        for _ in range(13):
+            limiter.wait("http://proxy1.net")
+        self.assertGreater(time.monotonic() - start, 0.25)
+
+        # Another proxy has its own bucket
+        start = time.monotonic()
+        limiter.wait("http://proxy2.net")
+        self.assertLess(time.monotonic() - start, 0.05)
+
+        # No limits configured
+        limiter = RateLimiter()
+        start = time.monotonic()
+        for _ in range(100):
+            limiter.wait()
+        self.assertLess(time.monotonic() - start, 0.05)
+
+    def test_retry_after_block(self):
+        """Test to check if a Retry-After blocks only the proxy which received it"""
+        limiter = RateLimiter()
+        limiter.report_limited("http://proxy1.net", retry_after=0.2)
+
+        self.assertTrue(limiter.is_blocked("http://proxy1.net"))
+        self.assertFalse(limiter.is_blocked("http://proxy2.net"))
+
+        start = time.monotonic()
+        limiter.wait("http://proxy1.net")
+        self.assertGreater(time.monotonic() - start, 0.15)
+        self.assertFalse(limiter.is_blocked("http://proxy1.net"))
+
+    def test_global_cooldown(self):
+        """Test to check if many 429 responses in a short time pause all requests"""
+        limiter = RateLimiter(cooldown_threshold=3, cooldown_window=10, cooldown_time=0.2)
+        limiter.report_limited("http://proxy1.net")
+        limiter.report_limited("http://proxy2.net")
+
+        start = time.monotonic()
+        limiter.wait("http://proxy3.net")
+        self.assertLess(time.monotonic() - start, 0.05)
+
+        limiter.report_limited("http://proxy3.net")
+        start = time.monotonic()
+        limiter.wait("http://proxy3.net")
+        self.assertGreater(time.monotonic() - start, 0.15)
+
+    def test_wait_stop_event(self):
+        """Test to check if a set stop event ends the cool-down and the token wait early"""
+        limiter = RateLimiter(cooldown_threshold=1, cooldown_time=120)
+        limiter.report_limited("http://proxy1.net")
+        stop_event = threading.Event()
+        timer = threading.Timer(0.1, stop_event.set)
+        timer.start()
+
+        start = time.monotonic()
+        self.assertFalse(limiter.wait("http://proxy1.net", stop_event=stop_event))
+        self.assertLess(time.monotonic() - start, 1)
+        timer.join()
+
+        bucket = TokenBucket(rate=0.01, capacity=1)
+        self.assertTrue(bucket.acquire(stop_event))
+        start = time.monotonic()
+        self.assertFalse(bucket.acquire(stop_event))
+        self.assertLess(time.monotonic() - start, 0.05)
+
+        # Without a cool-down the request is allowed
+        self.assertTrue(RateLimiter().wait(stop_event=stop_event))
+
+    def test_get_backoff(self):
+        """Test to check if the backoff grows exponentially and has jitter"""
+        limiter = RateLimiter(base_backoff=1, max_backoff=10)
+
+        for attempt, upper in [(0, 1), (1, 2), (2, 4), (3, 8), (10, 10)]:
+            backoff = limiter.get_backoff(attempt)
+            self.assertGreaterEqual(backoff, upper / 2)
+            self.assertLessEqual(backoff, upper)
+
+        # The Retry-After block is capped by the cooldown time
+        limiter = RateLimiter(cooldown_time=0.1)
+        limiter.report_limited(None, retry_after=3600)
+        start = time.monotonic()
+        limiter.wait()
+        self.assertLess(time.monotonic() - start, 0.5)
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from geizhals.util.responsecache import ResponseCache
+
+
+class ResponseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = ResponseCache(self.cache_dir)
+        self.url = "https://geizhals.de/?cat=WL-676328"
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_store(self):
+        """Test to check if validators and data are stored and loaded again"""
+        self.assertIsNone(self.cache.get(self.url))
+
+        headers = {"ETag": '"abc"', "Last-Modified": "Wed, 21 Oct 2015 07:28:00 GMT"}
+        self.cache.store(self.url, headers, b"<html>NAS</html>", data=["NAS", 717.81])
+
+        entry = self.cache.get(self.url)
+        self.assertEqual({"If-None-Match": '"abc"', "If-Modified-Since": "Wed, 21 Oct 2015 07:28:00 GMT"}, entry.validators)
+        self.assertEqual(["NAS", 717.81], entry.data)
+        self.assertEqual(16, entry.size)
+
+        # A new cache instance must find the entries on disk
+        cache = ResponseCache(self.cache_dir)
+        entry = cache.get(self.url)
+        self.assertEqual('"abc"', entry.etag)
+        self.assertEqual(["NAS", 717.81], entry.data)
+
+    def test_store_without_validators(self):
+        """Test to check if responses without validators are not cached and remove older entries"""
+        self.cache.store(self.url, {"ETag": '"abc"'}, b"old")
+        self.assertIsNotNone(self.cache.get(self.url))
+
+        self.cache.store(self.url, {}, b"new")
+        self.assertIsNone(self.cache.get(self.url))
+
+    def test_prune(self):
+        """Test to check if the entries of untracked urls and old bodies are removed from memory and disk"""
+        other_url = "https://geizhals.de/a1.html"
+        self.cache.store(self.url, {"ETag": '"abc"'}, b"body")
+        self.cache.store(other_url, {"ETag": '"def"'}, b"body")
+        # Body of an older version
+        with open(os.path.join(self.cache_dir, "0123.gz"), "wb") as f:
+            f.write(b"body")
+
+        self.assertEqual(2, self.cache.prune([self.url]))
+        self.assertEqual(1, len(os.listdir(self.cache_dir)))
+        self.assertIsNotNone(self.cache.get(self.url))
+        self.assertIsNone(self.cache.get(other_url))
+        self.assertEqual([self.url], list(self.cache._entries))
+
+    def test_stats(self):
+        """Test to check if hits, misses and the saved bandwidth are counted"""
+        self.assertEqual(dict(hits=0, misses=0, hit_rate=0.0, bytes_saved=0), self.cache.get_stats())
+
+        self.cache.store(self.url, {"ETag": '"abc"'}, b"0123456789")
+        self.cache.record_miss()
+        self.cache.record_hit(self.cache.get(self.url))
+        self.cache.record_hit(self.cache.get(self.url))
+        self.cache.record_hit(self.cache.get(self.url))
+
+        stats = self.cache.get_stats()
+        self.assertEqual(3, stats.get("hits"))
+        self.assertEqual(1, stats.get("misses"))
+        self.assertEqual(0.75, stats.get("hit_rate"))
+        self.assertEqual(30, stats.get("bytes_saved"))
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+
+import time
+import unittest
+
+from geizhals.util.sessionpool import SessionPool
+
+
+class SessionPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = SessionPool(pool_size=5, idle_timeout=300)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_get(self):
+        """Test to check if sessions are reused per proxy"""
+        s1 = self.pool.get("http://proxy1.example.com:8080")
+        s2 = self.pool.get("http://proxy2.example.com:8080")
+        s3 = self.pool.get(None)
+
+        self.assertEqual(3, len(self.pool))
+        self.assertIsNot(s1, s2)
+        self.assertIsNot(s1, s3)
+
+        self.assertIs(s1, self.pool.get("http://proxy1.example.com:8080"))
+        self.assertIs(s2, self.pool.get("http://proxy2.example.com:8080"))
+        self.assertIs(s3, self.pool.get(None))
+        self.assertEqual(3, len(self.pool))
+
+        # Make sure the configured pool size is used for the adapters
+        adapter = s1.get_adapter("https://geizhals.de")
+        self.assertEqual(5, adapter._pool_maxsize)
+
+    def test_idle_eviction(self):
+        """Test to check if unused sessions get evicted after the idle timeout"""
+        pool = SessionPool(idle_timeout=0.05)
+        s1 = pool.get("http://proxy1.example.com:8080")
+        time.sleep(0.1)
+
+        s2 = pool.get("http://proxy2.example.com:8080")
+        self.assertEqual(1, len(pool))
+        self.assertIsNot(s1, pool.get("http://proxy1.example.com:8080"))
+        self.assertIs(s2, pool.get("http://proxy2.example.com:8080"))
+
+        pool.close()
+        self.assertEqual(0, len(pool))
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+
+import threading
+import time
+import unittest
+
+from geizhals.util.singleflight import SingleFlight
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def setUp(self):
+        self.flight = SingleFlight()
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def tearDown(self):
+        pass
+
+    def helper_run_concurrently(self, func, count=5):
+        results = []
+        errors = []
+
+        def run():
+            try:
+                results.append(func())
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return results, errors
+
+    def helper_slow_call(self, value):
+        with self.lock:
+            self.calls += 1
+        time.sleep(0.2)
+        return value
+
+    def test_do(self):
+        """Test to check if concurrent calls with the same key are coalesced"""
+        results, errors = self.helper_run_concurrently(lambda: self.flight.do("key", self.helper_slow_call, "result"))
+
+        self.assertEqual([], errors)
+        self.assertEqual(["result"] * 5, results)
+        self.assertEqual(1, self.calls)
+        self.assertEqual(0, len(self.flight))
+
+        # After the call finished, a new call runs the function again
+        self.assertEqual("second", self.flight.do("key", self.helper_slow_call, "second"))
+        self.assertEqual(2, self.calls)
+
+    def test_do_different_keys(self):
+        """Test to check if calls with different keys are not coalesced"""
+        keys = iter(range(5))
+        lock = threading.Lock()
+
+        def call():
+            with lock:
+                key = next(keys)
+            return self.flight.do(key, self.helper_slow_call, key)
+
+        results, errors = self.helper_run_concurrently(call)
+        self.assertEqual([0, 1, 2, 3, 4], sorted(results))
+        self.assertEqual(5, self.calls)
+
+    def test_do_error(self):
+        """Test to check if exceptions are raised for every waiting caller"""
+        def failing_call():
+            self.helper_slow_call(None)
+            raise ValueError("Name cannot be parsed!")
+
+        results, errors = self.helper_run_concurrently(lambda: self.flight.do("key", failing_call))
+
+        self.assertEqual([], results)
+        self.assertEqual(5, len(errors))
+        self.assertEqual(1, self.calls)
+        for error in errors:
+            self.assertIsInstance(error, ValueError)
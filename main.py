@@ -4,6 +4,10 @@ import datetime
 import logging.handlers
 import re
 import io
+import os
+import socket
+import threading
+from collections import OrderedDict
 
 from requests.exceptions import HTTPError
 from telegram import InlineKeyboardMarkup, InlineKeyboardButton
@@ -11,14 +15,23 @@ from telegram.error import (TelegramError, Unauthorized, BadRequest,
                             TimedOut, ChatMigrated, NetworkError)
 from telegram.ext import Updater, CommandHandler, CallbackQueryHandler, MessageHandler, Filters
 from telegram.parsemode import ParseMode
+from telegram.utils.request import Request
 
 import bot.core as core
 import config
 from bot.menus import MainMenu, NewPriceAgentMenu, ShowPriceAgentsMenu, ShowWLPriceAgentsMenu, ShowPPriceAgentsMenu
 from bot.menus.util import cancel_button, get_entities_keyboard, get_entity_keyboard
+from bot.notifications import build_messages
+from bot.scheduler import AdaptiveScheduler, SlottedScheduler
+from bot.send_queue import QueuedBot, SendPriority, SendQueue
+from bot.shutdown import wait_for_shutdown
+from bot.sweep_supervisor import SweepSupervisor
 from bot.user import User
-from geizhals import GeizhalsStateHandler
+from geizhals import GeizhalsStateHandler, FetchEngine
+from geizhals.core import EntityData
+from geizhals.fetch_engine import FetchResult
 from geizhals.entities import EntityType, Wishlist, Product
+from geizhals.exceptions import FetchStoppedException
 from state import State
 from util.exceptions import AlreadySubscribedException, InvalidURLException
 from util.formatter import bold, link, price
@@ -50,8 +63,24 @@ if not re.match(r"[0-9]+:[a-zA-Z0-9\-_]+", config.BOT_TOKEN):
     logger.error("Bot token not correct - please check.")
     exit(1)
 
-updater = Updater(token=config.BOT_TOKEN, use_context=True)
+# Set on SIGINT/SIGTERM - the running sweep stops at the next entity boundary and drains the running fetches
+shutdown_event = threading.Event()
+
+# All messages are sent through the send queue, which keeps the bot below the flood limits of Telegram.
+# Its threads are started after the state handler was set up.
+send_queue = SendQueue(global_rate=config.SEND_GLOBAL_RATE, chat_rate=config.SEND_CHAT_RATE, workers=config.SEND_WORKERS)
+# The dispatcher workers and the send workers share the connection pool
+queued_bot = QueuedBot(config.BOT_TOKEN, send_queue, request=Request(con_pool_size=8 + config.SEND_WORKERS))
+
+updater = Updater(bot=queued_bot, use_context=True)
 dp = updater.dispatcher
+worker_id = config.WORKER_ID or "{}-{}".format(socket.gethostname(), os.getpid())
+fetch_engine = FetchEngine(workers=config.FETCH_WORKERS, per_host_limit=config.FETCH_PER_HOST_LIMIT)
+if config.SCHEDULER_MODE == "slotted":
+    scheduler = SlottedScheduler(interval=config.SLOTTED_INTERVAL_MINUTES * 60, tick=config.SCHEDULER_TICK_SECONDS)
+else:
+    scheduler = AdaptiveScheduler(min_interval=config.CHECK_INTERVAL_MIN_MINUTES * 60, max_interval=config.CHECK_INTERVAL_MAX_MINUTES * 60)
+sweep_supervisor = SweepSupervisor(time_budget=config.SWEEP_TIME_BUDGET_SECONDS)
 
 
 def admin_method(func):
@@ -105,10 +134,12 @@ def broadcast(update, context):
     final_message = message_with_prefix.replace("/broadcast ", "")
     users = core.get_all_subscribers()
     logger.info("Sending message broadcast to all ({}) users! Requested by admin '{}'".format(len(users), user_id))
-    for user in users:
+    # Broadcasts are sent after all replies and notifications
+    queued_messages = [(user, bot.queue_message(user, final_message, priority=SendPriority.BROADCAST)) for user in users]
+    for user, future in queued_messages:
         try:
             logger.debug("Sending broadcast to user '{}'".format(user))
-            bot.send_message(chat_id=user, text=final_message)
+            future.result()
         except Unauthorized:
             logger.info("User '{}' blocked the bot!".format(user))
             core.delete_user(user)
@@ -127,16 +158,31 @@ def get_usage_info(update, context):
     all_entites = len(core.get_all_entities())
     price_count = core.get_price_count()
     total_users = len(core.get_all_users())
-    update.message.reply_text("<b>Current statistics for</b> @{}\n\n"
-                              "Subscriber count: {}\n\n"
-                              "Subscribed products: {}\n"
-                              "Subscribed wishlists: {}\n"
-                              "<b>Subscribed entities total: {}</b>\n\n"
-                              "Number of entities in db: {}\n\n"
-                              "Number of stored prices in db: {}\n\n"
-                              "Total users: {}"
-                              "".format(context.bot.username, subs, products, wishlists, all_subbed, all_entites, price_count, total_users),
-                              parse_mode=ParseMode.HTML)
+    text = "<b>Current statistics for</b> @{}\n\n" \
+           "Subscriber count: {}\n\n" \
+           "Subscribed products: {}\n" \
+           "Subscribed wishlists: {}\n" \
+           "<b>Subscribed entities total: {}</b>\n\n" \
+           "Number of entities in db: {}\n\n" \
+           "Number of stored prices in db: {}\n\n" \
+           "Total users: {}" \
+           "".format(context.bot.username, subs, products, wishlists, all_subbed, all_entites, price_count, total_users)
+
+    statehandler = GeizhalsStateHandler()
+    proxy_stats = statehandler.get_proxy_stats()
+    if proxy_stats:
+        healthy_proxies = len([stats for stats in proxy_stats if not stats.get("quarantined")])
+        text += "\n\nHealthy proxies: {}/{}".format(healthy_proxies, len(proxy_stats))
+
+    response_cache = statehandler.response_cache
+    if response_cache:
+        cache_stats = response_cache.get_stats()
+        text += "\n\nResponse cache hits: {} ({:.1%})\n" \
+                "Response cache misses: {}\n" \
+                "Bandwidth saved: {:.2f} MB".format(cache_stats.get("hits"), cache_stats.get("hit_rate"),
+                                                    cache_stats.get("misses"), cache_stats.get("bytes_saved") / 1024 / 1024)
+
+    update.message.reply_text(text, parse_mode=ParseMode.HTML)
 
 
 # Inline menus
@@ -182,7 +228,11 @@ def add_entity(update, context):
         return
 
     try:
-        if entity_type == EntityType.WISHLIST:
+        # Popular entities are checked regularly anyway, so there is no need to download them again
+        entity = core.get_fresh_entity(core.get_entity_id(url, entity_type), entity_type, max_age=config.ENTITY_FRESHNESS_MINUTES * 60)
+        if entity is not None:
+            logger.info("Using stored data for entity '{}'".format(entity.url))
+        elif entity_type == EntityType.WISHLIST:
             entity = Wishlist.from_url(url)
         elif entity_type == EntityType.PRODUCT:
             entity = Product.from_url(url)
@@ -218,83 +268,258 @@ def add_entity(update, context):
                            reply_markup=InlineKeyboardMarkup([[cancel_button]]))
 
 
+def handle_fetch_result(bot, fetch_result, subscribers, writer):
+    """Store the fetched name and price of an entity with the BatchWriter and notify its subscribers (User objects)
+    about price changes"""
+    entity = fetch_result.entity
+    logger.debug("URL is '{}'".format(entity.url))
+    old_price = entity.price
+    old_name = entity.name
+    try:
+        if fetch_result.error is not None:
+            raise fetch_result.error
+        new_name, new_price = fetch_result.result.name, fetch_result.result.price
+    except HTTPError as e:
+        if e.response.status_code == 403:
+            logger.error("Entity is not public!")
+            entity_type_data = EntityType.get_type_article_name(entity.TYPE)
+            entity_hidden = "{article} {type} {link_name} ist leider nicht mehr einsehbar. " \
+                            "Ich entferne diesen Preisagenten!".format(article=entity_type_data.get("article").capitalize(),
+                                                                       type=entity_type_data.get("name"), link_name=link(entity.url, entity.name))
+
+            # Queued without waiting in between, so that the sweep is not held up by the rate limit of each chat
+            futures = [(user, bot.queue_message(user.user_id, entity_hidden, priority=SendPriority.NOTIFICATION, parse_mode=ParseMode.HTML))
+                       for user in subscribers]
+            for user, _ in futures:
+                core.unsubscribe_entity(user, entity)
+            core.rm_entity(entity)
+
+            for user, future in futures:
+                try:
+                    future.result()
+                except TelegramError as e:
+                    logger.warning("Could not notify user {} about the removed price agent: {}".format(user.user_id, e.message))
+    except (ValueError, Exception) as e:
+        logger.error("Exception while checking for price updates! {}".format(e))
+    else:
+        if old_name != new_name:
+            writer.update_name(entity.TYPE, entity.entity_id, new_name)
+
+        # Make sure to update the price no matter if it changed. Helps for generating charts
+        entity.price = new_price
+        writer.update_price(entity.TYPE, entity.entity_id, new_price)
+
+        if old_price == new_price:
+            return
+
+        # The notifications are stored first, so that they are not lost if the bot restarts before sending them
+        writer.add_notifications([user.user_id for user in subscribers], entity.TYPE, entity.entity_id, old_price, new_price)
+
+
+def send_pending_notifications(bot):
+    """Notify the subscribers of entities about their price changes - all changes of a user are combined"""
+    user_notifications = OrderedDict()
+    # Other workers send the notifications they claimed themselves
+    for notification_id, user_id, entity, old_price in core.claim_pending_notifications(worker_id, claim_time=config.LEASE_SECONDS):
+        user_notifications.setdefault(user_id, []).append((notification_id, entity, old_price))
+
+    # All messages are queued first, so that the send queue can send them in parallel
+    queued_messages = []
+    for user_id, notifications in user_notifications.items():
+        for message, notification_ids in build_messages(notifications):
+            future = notify_user(bot, user_id, message) if message else None
+            queued_messages.append((user_id, future, notification_ids))
+
+    deleted_user_ids = set()
+    for user_id, future, notification_ids in queued_messages:
+        if user_id in deleted_user_ids:
+            continue
+
+        try:
+            if future is not None:
+                future.result()
+        except Unauthorized as e:
+            if e.message == "Forbidden: user is deactivated":
+                logger.info("Removing user from db, because account was deleted.")
+            elif e.message == "Forbidden: bot was blocked by the user":
+                logger.info("Removing user from db, because they blocked the bot.")
+            # Removes the pending notifications of the user as well
+            core.delete_user(user_id)
+            deleted_user_ids.add(user_id)
+            continue
+        except BadRequest as e:
+            logger.error("Could not notify user {}: {}".format(user_id, e.message))
+        except TelegramError as e:
+            # Temporary problems - the notifications are sent on the next tick
+            logger.warning("Could not notify user {}, retrying later: {}".format(user_id, e.message))
+            continue
+
+        for notification_id in notification_ids:
+            core.rm_pending_notification(notification_id)
+
+
+def check_entities(bot, wishlists, products, tracked_products=None, claim_products=None, sweep_id=None, stop_event=None):
+    """Check the given wishlists and products for price updates. Tracked products listed on one of the fetched wishlist
+    pages are updated without an extra request, even if they were not passed. claim_products takes a list of those
+    extra products and returns the keys of the ones which may be updated. Returns all entities which were updated.
+    The progress is stored for the given sweep. Once stop_event is set, the check stops after the running fetches,
+    which do not wait for the rate limiter any longer."""
+    processed_entities = []
+    # The subscribers are loaded in bulk instead of once per changed entity
+    subscriber_map = core.get_subscriber_map(wishlists + products)
+
+    def handle(fetch_result):
+        entity = fetch_result.entity
+        # Fetches interrupted by the stop event are not processed, so that the entity is checked again
+        if isinstance(fetch_result.error, FetchStoppedException):
+            return
+        handle_fetch_result(bot, fetch_result, subscriber_map.get(core.get_entity_key(entity), []), writer)
+        processed_entities.append(entity)
+        if sweep_id is not None:
+            writer.mark_processed(sweep_id, entity.TYPE, entity.entity_id)
+        writer.flush_if_needed()
+
+    # All results are stored in batches - the pending rows are written when the check ends or fails
+    with core.get_batch_writer() as writer:
+        # Wishlists are fetched first, because their pages already contain the prices of the listed products.
+        # Prices differ between the regions, so only products of the same region are taken from a wishlist.
+        wishlist_products = {}
+        for fetch_result in fetch_engine.fetch_all(wishlists, lambda e: e.get_current_data(stop_event), stop_event=stop_event):
+            handle(fetch_result)
+            if fetch_result.error is None:
+                region = core.get_region(fetch_result.entity.url)
+                for product in fetch_result.result.products or []:
+                    wishlist_products[(product.entity_id, region)] = product
+
+        covered_products = [product for product in (tracked_products if tracked_products is not None else products)
+                            if (product.entity_id, core.get_region(product.url)) in wishlist_products]
+
+        # Products which were not passed might be checked by another worker at the same time
+        product_keys = {core.get_entity_key(product) for product in products}
+        extra_products = [product for product in covered_products if core.get_entity_key(product) not in product_keys]
+        if claim_products is not None and extra_products:
+            claimed_keys = set(claim_products(extra_products))
+            covered_products = [product for product in covered_products
+                                if core.get_entity_key(product) in product_keys or core.get_entity_key(product) in claimed_keys]
+
+        covered_data = []
+        for product in covered_products:
+            product_data = wishlist_products[(product.entity_id, core.get_region(product.url))]
+            covered_data.append(EntityData(name=product_data.name, price=product_data.price))
+
+        # Tracked products which were not due need their subscribers as well - again in a single query
+        subscriber_map.update(core.get_subscriber_map(product for product in covered_products
+                                                      if core.get_entity_key(product) not in subscriber_map))
+        for product, data in zip(covered_products, covered_data):
+            handle(FetchResult(entity=product, result=data, error=None))
+
+        if stop_event is not None and stop_event.is_set():
+            return processed_entities
+
+        covered_ids = {product.entity_id for product in covered_products}
+        remaining_products = [product for product in products if product.entity_id not in covered_ids]
+        logger.info("Updated {} products from wishlist pages, fetching {} products".format(len(covered_products), len(remaining_products)))
+
+        # Fetch all remaining entities in parallel, but handle the results one after another in this thread
+        for fetch_result in fetch_engine.fetch_all(remaining_products, lambda e: e.get_current_data(stop_event), stop_event=stop_event):
+            handle(fetch_result)
+
+    return processed_entities
+
+
 def check_for_price_update(context):
-    """Check if the price of any subscribed wishlist or product was updated"""
-    bot = context.bot
-    logger.debug("Checking for updates!")
+    """Check if the price of any subscribed wishlist or product, which is due according to the scheduler, was updated"""
     bot = context.bot
+    sweep = sweep_supervisor.start()
+    if sweep is None:
+        return
 
-    entities = core.get_all_entities_with_subscribers()
+    unfinished_keys = []
+    try:
+        # Notifications which could not be sent before, e.g. because the bot was stopped
+        send_pending_notifications(bot)
+        unfinished_keys = run_sweep(bot, sweep)
+    finally:
+        sweep_supervisor.finish(sweep, unfinished_keys)
+
+    response_cache = GeizhalsStateHandler().response_cache
+    if response_cache:
+        logger.info("Response cache stats after sweep: {}".format(response_cache.get_stats()))
+    logger.info("Send queue stats after sweep: {}".format(send_queue.get_stats()))
+
+
+def run_sweep(bot, sweep):
+    """Check the due entities until the time budget of the sweep is used up. Returns the keys of the due entities which
+    were not checked, the most overdue ones first."""
+    # Same time base as the timestamps in the database
+    now = int(datetime.datetime.utcnow().timestamp())
+
+    entity_stats = core.get_entities_check_stats(volatility_window=config.VOLATILITY_WINDOW_DAYS * 86400)
+    # The cached pages of entities without subscribers are never requested again
+    response_cache = GeizhalsStateHandler().response_cache
+    if response_cache:
+        response_cache.prune(entity.url for entity, _ in entity_stats.values())
+    added = scheduler.sync({key: stats for key, (entity, stats) in entity_stats.items()}, now)
+    if added > 0:
+        logger.info("Added {} entities to the scheduler".format(added))
+
+    # Sweeps interrupted by a restart are resumed on every tick. The default worker id changes with every restart, so
+    # the sweeps of the previous process are only taken over once they are older than a lease.
+    sweep_supervisor.defer(core.resume_sweeps(worker_id, max_age=config.LEASE_SECONDS))
+
+    # Entities which were not checked by the previous sweeps are checked first
+    deferred_keys = [key for key in sweep_supervisor.take_deferred() if key in entity_stats]
+    due_keys = deferred_keys + [key for key in scheduler.pop_due(now) if key not in deferred_keys]
+    if not due_keys:
+        return []
+
+    # Other workers might check the same entities. Only the claimed ones are checked, the others get synced
+    # with the state in the database on the next tick.
+    claimed_keys = core.claim_entities(worker_id, {key: entity_stats[key][1] for key in due_keys}, lease_time=config.LEASE_SECONDS)
+    if not claimed_keys:
+        return []
+
+    logger.debug("Checking {} of {} due entities for updates!".format(len(claimed_keys), len(due_keys)))
+    sweep_id = core.start_sweep(worker_id, claimed_keys)
+    # Tracked products which are updated from the wishlist pages are claimed as well
+    extra_keys = []
+
+    def claim_products(products_to_claim):
+        keys = core.claim_entities(worker_id, {core.get_entity_key(product): entity_stats[core.get_entity_key(product)][1]
+                                               for product in products_to_claim}, lease_time=config.LEASE_SECONDS)
+        extra_keys.extend(keys)
+        return keys
 
-    # Check all entities for price updates
-    for entity in entities:
-        logger.debug("URL is '{}'".format(entity.url))
-        old_price = entity.price
-        old_name = entity.name
-        try:
-            new_price = entity.get_current_price()
-            new_name = entity.get_current_name()
-        except HTTPError as e:
-            if e.response.status_code == 403:
-                logger.error("Entity is not public!")
-                entity_type_data = EntityType.get_type_article_name(entity.TYPE)
-                entity_hidden = "{article} {type} {link_name} ist leider nicht mehr einsehbar. " \
-                                "Ich entferne diesen Preisagenten!".format(article=entity_type_data.get("article").capitalize(),
-                                                                           type=entity_type_data.get("name"), link_name=link(entity.url, entity.name))
-
-                for user_id in core.get_entity_subscribers(entity):
-                    user = core.get_user_by_id(user_id)
-                    bot.send_message(user_id, entity_hidden, parse_mode=ParseMode.HTML)
-                    core.unsubscribe_entity(user, entity)
-
-                core.rm_entity(entity)
-        except (ValueError, Exception) as e:
-            logger.error("Exception while checking for price updates! {}".format(e))
-        else:
-            if old_name != new_name:
-                core.update_entity_name(entity, new_name)
+    try:
+        claimed_entities = [entity_stats[key][0] for key in claimed_keys]
+        wishlists = [entity for entity in claimed_entities if entity.TYPE == EntityType.WISHLIST]
+        products = [entity for entity in claimed_entities if entity.TYPE == EntityType.PRODUCT]
+        tracked_products = [entity for entity, _ in entity_stats.values() if entity.TYPE == EntityType.PRODUCT]
 
-            # Make sure to update the price no matter if it changed. Helps for generating charts
-            entity.price = new_price
-            core.update_entity_price(entity, new_price)
+        processed_entities = check_entities(bot, wishlists, products, tracked_products, claim_products=claim_products,
+                                            sweep_id=sweep_id, stop_event=sweep.stop_event)
 
-            if old_price == new_price:
-                continue
+        processed_keys = set()
+        for entity in processed_entities:
+            key = core.get_entity_key(entity)
+            processed_keys.add(key)
+            scheduler.schedule_next(key, entity_stats[key][1], now)
+    finally:
+        core.release_entities(worker_id, claimed_keys + extra_keys)
+        # Interrupted sweeps are kept, so that their remaining entities are checked first after the restart
+        if not shutdown_event.is_set():
+            core.finish_sweep(sweep_id)
 
-            entity_subscribers = core.get_entity_subscribers(entity)
+    send_pending_notifications(bot)
 
-            for user_id in entity_subscribers:
-                # Notify each subscriber
-                try:
-                    notify_user(bot, user_id, entity, old_price)
-                except Unauthorized as e:
-                    if e.message == "Forbidden: user is deactivated":
-                        logger.info("Removing user from db, because account was deleted.")
-                    elif e.message == "Forbidden: bot was blocked by the user":
-                        logger.info("Removing user from db, because they blocked the bot.")
-                    core.delete_user(user_id)
-
-
-def notify_user(bot, user_id, entity, old_price):
-    """Notify a user of price changes"""
-    diff = entity.price - old_price
-
-    if diff > 0:
-        emoji = "📈"
-        change = "teurer"
-    else:
-        emoji = "📉"
-        change = "billiger"
+    # Due entities which were not claimed are checked by other workers
+    return [key for key in claimed_keys if key not in processed_keys]
 
-    logger.info("Notifying user {}!".format(user_id))
 
-    message = "Der Preis von {link_name} hat sich geändert: {price}\n\n" \
-              "{emoji} {diff} {change}".format(link_name=link(entity.url, entity.name),
-                                               price=bold(price(entity.price, signed=False)),
-                                               emoji=emoji,
-                                               diff=bold(price(diff)),
-                                               change=change)
-    bot.sendMessage(user_id, message, parse_mode=ParseMode.HTML, disable_web_page_preview=True)
+def notify_user(bot, user_id, message):
+    """Queue the notification of a user about price changes - returns a Future of the sent message"""
+    logger.info("Notifying user {}!".format(user_id))
+    return bot.queue_message(user_id, message, priority=SendPriority.NOTIFICATION, parse_mode=ParseMode.HTML, disable_web_page_preview=True)
 
 
 def entity_price_history(update, _):
@@ -545,21 +770,11 @@ dp.add_handler(MessageHandler(Filters.text, handle_text))
 dp.add_handler(MessageHandler(Filters.command, unknown))
 dp.add_error_handler(error_callback)
 
-# Scheduling the check for updates
-dt = datetime.datetime.today()
-seconds = int(dt.timestamp())
-repeat_in_minutes = 30
-repeat_in_seconds = 60 * repeat_in_minutes
-delta_t = repeat_in_seconds - (seconds % repeat_in_seconds)
-
-updater.job_queue.run_repeating(callback=check_for_price_update, interval=repeat_in_seconds, first=delta_t)
-updater.job_queue.start()
-
-if config.USE_WEBHOOK:
-    updater.start_webhook(listen=config.WEBHOOK_IP, port=config.WEBHOOK_PORT, url_path=config.BOT_TOKEN, cert=config.CERTPATH, webhook_url=config.WEBHOOK_URL)
-    updater.bot.set_webhook(config.WEBHOOK_URL)
-else:
-    updater.start_polling()
+# The state handler is set up before any threads are started, because it might fork the parse worker processes
+cache_dir = str(project_path / config.RESPONSE_CACHE_DIR) if config.RESPONSE_CACHE_DIR else None
+statehandler_settings = dict(session_pool_size=config.SESSION_POOL_SIZE, session_idle_timeout=config.SESSION_IDLE_TIMEOUT,
+                             cache_dir=cache_dir, rate_limit=config.RATE_LIMIT, proxy_rate_limit=config.PROXY_RATE_LIMIT,
+                             parse_workers=config.PARSE_WORKERS)
 
 if config.USE_PROXIES:
     proxy_path = project_path / config.PROXY_LIST
@@ -570,12 +785,31 @@ if config.USE_PROXIES:
         proxies[:] = [x for x in proxies if not x.startswith('#') and not x == '']
     if proxies is not None and isinstance(proxies, list):
         logger.info("Using proxies!")
-        GeizhalsStateHandler(use_proxies=config.USE_PROXIES, proxies=proxies)
+        GeizhalsStateHandler(use_proxies=config.USE_PROXIES, proxies=proxies, **statehandler_settings)
     else:
         logger.error("Proxies list is either empty or has mismatching type!")
         exit(1)
 else:
-    GeizhalsStateHandler(use_proxies=config.USE_PROXIES, proxies=None)
+    GeizhalsStateHandler(use_proxies=config.USE_PROXIES, proxies=None, **statehandler_settings)
+
+send_queue.start()
+
+# Scheduling the check for updates - on each tick the scheduler decides which entities are due
+updater.job_queue.run_repeating(callback=check_for_price_update, interval=config.SCHEDULER_TICK_SECONDS, first=config.SCHEDULER_TICK_SECONDS)
+updater.job_queue.start()
+
+if config.WORKER_ONLY:
+    logger.info("Running as sweep worker '{}' - not handling any updates".format(worker_id))
+elif config.USE_WEBHOOK:
+    updater.start_webhook(listen=config.WEBHOOK_IP, port=config.WEBHOOK_PORT, url_path=config.BOT_TOKEN, cert=config.CERTPATH, webhook_url=config.WEBHOOK_URL)
+    updater.bot.set_webhook(config.WEBHOOK_URL)
+else:
+    updater.start_polling()
+
+if not config.WORKER_ONLY:
+    logger.info("Bot started as @{}".format(updater.bot.username))
+
+# Not Updater.idle() - it stops the updater and waits for the running sweep before anyone could stop the sweep
+wait_for_shutdown(shutdown_event, sweep_supervisor, updater)
 
-logger.info("Bot started as @{}".format(updater.bot.username))
-updater.idle()
+send_queue.stop()